@@ -0,0 +1,334 @@
+import argparse
+import io
+import json
+import platform
+import sys
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from deploy.fake_docker import FakeDockerClient
+from deploy.transport import DockerTransport
+from deploy_gns import deploy_config
+from models.clos import TwoTierClos
+from instrumentation.metrics import metrics
+from render.frr_render import FrrRenderer, render_devices
+
+
+BENCHMARK_VERSION = 1
+INTERNAL_SUPERNET = "10.0.0.0/8"
+LOOPBACK_SUPERNET = "172.16.0.0/12"
+# Benchmark phases and the instrumentation timings they are made of
+PHASES = {
+    "allocation": ("model.initialize_devices",),
+    "wiring": ("model.add_internal_connections",),
+    "bgp_peers": ("model.add_bgp_peers",),
+    "external_networks": ("model.add_external_networks",),
+    "render": ("render.frr", "render.zebra", "render.ospfd", "render.bgpd"),
+    "write": ("render.write",),
+    "deploy_connect": ("deploy.connect",),
+    "deploy_stage": ("deploy.stage",),
+}
+
+
+def parse_args() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-w",
+        "--widths",
+        default="8,16,32,64,128",
+        help="Comma separated Clos widths to benchmark",
+    )
+    parser.add_argument(
+        "-p",
+        "--ports",
+        help="Comma separated device interface counts, defaults to twice each width",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=1,
+        help="Run every case this many times and keep the fastest time of each phase",
+    )
+    parser.add_argument(
+        "-mp",
+        "--max_parallel",
+        type=int,
+        default=16,
+        help="Routers staged concurrently by the fake deployment",
+    )
+    parser.add_argument(
+        "-dh",
+        "--docker_hosts",
+        type=int,
+        default=1,
+        help="Fake Docker daemons the routers are spread across",
+    )
+    parser.add_argument(
+        "-mi",
+        "--max_in_flight",
+        type=int,
+        default=8,
+        help="Maximum concurrent requests per fake Docker daemon",
+    )
+    parser.add_argument(
+        "-l",
+        "--latency",
+        type=float,
+        default=0,
+        help="Seconds every fake Docker request takes",
+    )
+    parser.add_argument(
+        "--skip_deploy",
+        action="store_true",
+        help="Do not benchmark deployment against the fake Docker client",
+    )
+    parser.add_argument(
+        "--skip_memory",
+        action="store_true",
+        help="Do not run the extra pass that measures peak memory with tracemalloc",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write JSON results to this file",
+    )
+    parser.add_argument(
+        "-c",
+        "--compare",
+        help="JSON results of a previous run, phases slower than --threshold times are reported",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="Slowdown ratio reported as a regression when comparing results",
+    )
+
+    return parser.parse_args()
+
+
+def build_model(width: int, ports: int) -> TwoTierClos:
+    return TwoTierClos(
+        width=width,
+        device_interface_count=ports,
+        internal_supernet=INTERNAL_SUPERNET,
+        loopback_supernet=LOOPBACK_SUPERNET,
+        external_networks={"192.168.1.0/24": ["t1-r1"]},
+    )
+
+
+def deploy_to_fake_client(
+    model: TwoTierClos,
+    config_dir: str,
+    max_parallel: int,
+    docker_hosts: int = 1,
+    max_in_flight: int = 8,
+    latency: float = 0,
+) -> None:
+    """Deploy through a transport spreading routers round-robin across fake Docker daemons"""
+    clients = {
+        f"fake://host{host}": FakeDockerClient(latency=latency)
+        for host in range(max(1, docker_hosts))
+    }
+    endpoints = list(clients)
+    router_endpoints = {}
+    for index, device in enumerate(model.devices):
+        endpoint = endpoints[index % len(endpoints)]
+        clients[endpoint].add_router(device.hostname)
+        router_endpoints[device.hostname] = endpoint
+    transport = DockerTransport(
+        clients=clients,
+        router_endpoints=router_endpoints,
+        max_in_flight=max_in_flight,
+    )
+    router_container_map = {
+        router: container_id
+        for client in clients.values()
+        for router, container_id in client.router_container_map.items()
+    }
+
+    with metrics.phase("deploy.connect"):
+        handles, _ = transport.connect(router_container_map=router_container_map)
+
+    with metrics.phase("deploy.stage"):
+        deploy_config(
+            router_container_map=router_container_map,
+            transport=transport,
+            config_dir=config_dir,
+            wave_size="100%",
+            max_parallel=max_parallel,
+            container_handles=handles,
+        )
+
+
+def run_case(
+    width: int,
+    ports: int,
+    renderer: FrrRenderer,
+    max_parallel: int,
+    deploy: bool = True,
+    transport_options: Dict = None,
+) -> Dict[str, float]:
+    """Build, render and optionally deploy one fabric
+    Return the time spent in each benchmark phase, taken from the instrumentation metrics"""
+    metrics.clear()
+    with tempfile.TemporaryDirectory() as output_dir, redirect_stdout(io.StringIO()):
+        model = build_model(width, ports)
+        render_devices(devices=model.devices, output_dir=output_dir, renderer=renderer)
+        if deploy:
+            deploy_to_fake_client(
+                model, output_dir, max_parallel, **(transport_options or {})
+            )
+
+    timings = {
+        phase: sum(metrics.timings.get(name, 0) for name in names)
+        for phase, names in PHASES.items()
+        if deploy or not phase.startswith("deploy")
+    }
+    timings["total"] = sum(timings.values())
+
+    return timings
+
+
+def measure_peak_memory(width: int, ports: int, renderer: FrrRenderer) -> int:
+    """Peak traced memory of building and rendering a model
+    Measured in its own pass as tracing slows down every allocation"""
+    tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir, redirect_stdout(
+            io.StringIO()
+        ):
+            model = build_model(width, ports)
+            render_devices(
+                devices=model.devices, output_dir=output_dir, renderer=renderer
+            )
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(
+    widths: List[int],
+    port_counts: Optional[List[int]],
+    repeat: int = 1,
+    max_parallel: int = 16,
+    deploy: bool = True,
+    memory: bool = True,
+    transport_options: Dict = None,
+) -> List[Dict]:
+    renderer = FrrRenderer()
+    results = []
+    for width in widths:
+        for ports in port_counts or [width * 2]:
+            if ports < width * 2:
+                print(f"Skipping width {width} with {ports} ports, {width * 2} needed")
+                continue
+
+            runs = [
+                run_case(
+                    width, ports, renderer, max_parallel, deploy, transport_options
+                )
+                for _ in range(max(1, repeat))
+            ]
+            phases = {phase: min(run[phase] for run in runs) for phase in runs[0]}
+            result = {
+                "width": width,
+                "ports": ports,
+                "devices": width * 2,
+                "links": width * width,
+                "phases": phases,
+            }
+            if memory:
+                result["peak_memory_bytes"] = measure_peak_memory(
+                    width, ports, renderer
+                )
+            results.append(result)
+            print(format_result(result))
+
+    return results
+
+
+def format_result(result: Dict) -> str:
+    phases = " ".join(
+        f"{phase}={seconds:.3f}s" for phase, seconds in result["phases"].items()
+    )
+    memory = result.get("peak_memory_bytes")
+    memory = f" peak={memory / 2 ** 20:.1f}MB" if memory is not None else ""
+    return f"width={result['width']} ports={result['ports']} {phases}{memory}"
+
+
+def compare_results(
+    results: List[Dict], baseline: List[Dict], threshold: float
+) -> List[str]:
+    """Return a description of every phase or peak memory that grew by more than threshold
+    Phases under a millisecond are ignored as they are dominated by timer noise"""
+    previous = {(result["width"], result["ports"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["width"], result["ports"]))
+        if not before:
+            continue
+
+        case = f"width={result['width']} ports={result['ports']}"
+        for phase, seconds in result["phases"].items():
+            old = before["phases"].get(phase)
+            if old and old >= 0.001 and seconds / old > threshold:
+                regressions.append(
+                    f"{case} {phase}: {old:.3f}s -> {seconds:.3f}s ({seconds / old:.2f}x)"
+                )
+
+        old_memory = before.get("peak_memory_bytes")
+        memory = result.get("peak_memory_bytes")
+        if old_memory and memory and memory / old_memory > threshold:
+            regressions.append(
+                f"{case} peak memory: {old_memory} -> {memory} bytes ({memory / old_memory:.2f}x)"
+            )
+
+    return regressions
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    results = run_benchmarks(
+        widths=[int(width) for width in args.widths.split(",")],
+        port_counts=[int(ports) for ports in args.ports.split(",")]
+        if args.ports
+        else None,
+        repeat=args.repeat,
+        max_parallel=args.max_parallel,
+        deploy=not args.skip_deploy,
+        memory=not args.skip_memory,
+        transport_options={
+            "docker_hosts": args.docker_hosts,
+            "max_in_flight": args.max_in_flight,
+            "latency": args.latency,
+        },
+    )
+    report = {
+        "version": BENCHMARK_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare_results(
+                results, json.load(f)["results"], args.threshold
+            )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold}x compared to {args.compare}")
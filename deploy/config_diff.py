@@ -0,0 +1,109 @@
+import re
+from typing import Dict, List, NamedTuple, Set
+
+
+# Lines FRR adds to show running-config that carry no configuration
+IGNORED_LINES = {
+    "!",
+    "end",
+    "exit",
+    "exit-address-family",
+    "exit-vrf",
+    "Building configuration...",
+}
+IGNORED_PREFIXES = ("Current configuration", "frr version", "frr defaults")
+# Top-level stanzas FRR writes with its defaults, they are never generated
+IGNORED_STANZAS = {
+    "line vty",
+    "log syslog informational",
+    "service integrated-vtysh-config",
+    "no ipv6 forwarding",
+}
+# Prefix-list entries, with or without a sequence number
+PREFIX_LIST_ENTRY = re.compile(
+    r"^(?P<family>ip|ipv6) prefix-list (?P<name>\S+) (?:seq (?P<seq>\d+) )?(?P<rule>.+)$"
+)
+# FRR numbers entries added without a sequence number in steps of five
+PREFIX_LIST_SEQ_STEP = 5
+
+
+class ConfigDelta(NamedTuple):
+    """Top-level stanzas that differ between a running and a generated config, by header line"""
+
+    added: List[str]
+    removed: List[str]
+    changed: List[str]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed stanzas"
+
+
+def number_prefix_lists(lines: List[str]) -> List[str]:
+    """Give every prefix-list entry the sequence number FRR shows for it in its running config
+    FRR numbers an entry added without one after the highest number already in its list, rounded to a step of five
+    """
+    highest: Dict[str, int] = {}
+    numbered = []
+    for line in lines:
+        match = PREFIX_LIST_ENTRY.match(line)
+        if match:
+            key = f"{match['family']} prefix-list {match['name']}"
+            seq = match["seq"]
+            if seq is None:
+                seq = (
+                    highest.get(key, 0) // PREFIX_LIST_SEQ_STEP + 1
+                ) * PREFIX_LIST_SEQ_STEP
+            seq = int(seq)
+            highest[key] = max(highest.get(key, 0), seq)
+            line = f"{key} seq {seq} {match['rule']}"
+        numbered.append(line)
+
+    return numbered
+
+
+def parse_stanzas(config: str) -> Dict[str, Set[str]]:
+    """Split an FRR config into top-level stanzas keyed by their header line
+    Child lines are compared without indentation or order and nested blocks such as
+    address-family are flattened into their stanza, as FRR reorders them in its running config"""
+    stanzas: Dict[str, Set[str]] = {}
+    children = None
+    for line in number_prefix_lists(config.splitlines()):
+        stripped = line.strip()
+        if (
+            not stripped
+            or stripped in IGNORED_LINES
+            or stripped.startswith(IGNORED_PREFIXES)
+        ):
+            continue
+
+        if line[0].isspace() and children is not None:
+            if not stripped.startswith("address-family"):
+                children.add(stripped)
+        elif stripped in IGNORED_STANZAS:
+            # Children of an ignored stanza are dropped with it
+            children = set()
+        else:
+            children = stanzas.setdefault(stripped, set())
+
+    return stanzas
+
+
+def diff_configs(running: str, generated: str) -> ConfigDelta:
+    """Compare a device's running config with its generated config stanza by stanza"""
+    running_stanzas = parse_stanzas(running)
+    generated_stanzas = parse_stanzas(generated)
+
+    return ConfigDelta(
+        added=[header for header in generated_stanzas if header not in running_stanzas],
+        removed=[
+            header for header in running_stanzas if header not in generated_stanzas
+        ],
+        changed=[
+            header
+            for header, children in generated_stanzas.items()
+            if header in running_stanzas and running_stanzas[header] != children
+        ],
+    )
@@ -0,0 +1,145 @@
+import io
+import json
+import tarfile
+from contextlib import contextmanager
+from threading import Lock
+from time import sleep
+from typing import Dict, List, NamedTuple, Optional, Union
+
+from docker.errors import NotFound
+
+
+class FakeExecResult(NamedTuple):
+    exit_code: int
+    output: bytes
+
+
+class FakeContainer:
+    """This class stands in for a docker Container running FRR
+    Archives are extracted into an in-memory file map, commands are recorded and answered with canned output
+    """
+
+    def __init__(
+        self,
+        container_id: str,
+        name: str,
+        status: str = "running",
+        latency: float = 0,
+        daemon: "FakeDockerClient" = None,
+    ) -> None:
+        self.id = container_id
+        self.name = name
+        self.status = status
+        self.latency = latency
+        self.files: Dict[str, bytes] = {}
+        self.modes: Dict[str, int] = {}
+        self.commands: List = []
+        # Canned output for commands containing a key, eg. {"show bgp summary json": {...}}
+        # Dicts are returned as JSON, strings as they are and FakeExecResults with their exit code
+        self.responses: Dict[str, Union[Dict, str, FakeExecResult]] = {}
+        self.daemon = daemon
+        self.__lock = Lock()
+
+    def exec_run(self, cmd, **kwargs) -> FakeExecResult:
+        self.__wait()
+        with self.__lock:
+            self.commands.append(cmd)
+
+        command = cmd if isinstance(cmd, str) else " ".join(cmd)
+        for pattern, response in self.responses.items():
+            if pattern in command:
+                if isinstance(response, FakeExecResult):
+                    return response
+                if isinstance(response, str):
+                    return FakeExecResult(0, response.encode("utf-8"))
+                return FakeExecResult(0, json.dumps(response).encode("utf-8"))
+
+        return FakeExecResult(0, b"")
+
+    def put_archive(self, path: str, data: bytes) -> bool:
+        self.__wait()
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r") as tar:
+            for member in tar.getmembers():
+                content = tar.extractfile(member).read() if member.isfile() else b""
+                name = f"{path.rstrip('/')}/{member.name}"
+                with self.__lock:
+                    self.files[name] = content
+                    self.modes[name] = member.mode
+
+        return True
+
+    def __wait(self) -> None:
+        if self.daemon:
+            with self.daemon.request():
+                sleep(self.latency)
+        else:
+            sleep(self.latency)
+
+
+class FakeContainerCollection:
+    def __init__(self, latency: float = 0) -> None:
+        self.latency = latency
+        self.containers: Dict[str, FakeContainer] = {}
+
+    def list(
+        self, all: bool = False, sparse: bool = False, filters: Dict = None
+    ) -> List[FakeContainer]:
+        sleep(self.latency)
+        ids = (filters or {}).get("id")
+        return [
+            container
+            for container in self.containers.values()
+            if (all or container.status == "running")
+            and (ids is None or container.id in ids)
+        ]
+
+    def get(self, container_id: str) -> FakeContainer:
+        sleep(self.latency)
+        try:
+            return self.containers[container_id]
+        except KeyError:
+            raise NotFound(f"No such container: {container_id}")
+
+
+class FakeDockerClient:
+    """This class is an in-process replacement for docker.DockerClient
+    It lets deployment code run against any number of routers without GNS3 or a Docker daemon"""
+
+    def __init__(self, routers: List[str] = None, latency: float = 0) -> None:
+        self.latency = latency
+        self.containers = FakeContainerCollection(latency=latency)
+        # Concurrent container requests, used to check per daemon in-flight limits
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.__lock = Lock()
+        for router in routers or []:
+            self.add_router(router)
+
+    def add_router(
+        self, router: str, container_id: Optional[str] = None
+    ) -> FakeContainer:
+        container_id = container_id or f"fake-{router}"
+        container = FakeContainer(
+            container_id=container_id, name=router, latency=self.latency, daemon=self
+        )
+        self.containers.containers[container_id] = container
+
+        return container
+
+    @contextmanager
+    def request(self):
+        with self.__lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.in_flight -= 1
+
+    @property
+    def router_container_map(self) -> Dict[str, str]:
+        return {
+            container.name: container.id
+            for container in self.containers.containers.values()
+        }
@@ -0,0 +1,192 @@
+import json
+from threading import Lock
+from time import monotonic, sleep
+from typing import Dict, Optional, Tuple
+
+
+class ConvergenceTimeout(Exception):
+    """This exception is raised when a device does not converge before its timeout"""
+
+
+def run_vtysh_json(container, command: str) -> Dict:
+    """Run a vtysh show command ending in 'json' and return the parsed output
+    An empty dict is returned while FRR is still starting up"""
+    result = container.exec_run(cmd=["vtysh", "-c", command])
+    try:
+        return json.loads(result.output.decode("utf-8") or "{}")
+    except ValueError:
+        return {}
+
+
+def ospf_neighbor_state(container) -> Tuple[int, int, int]:
+    """Return total neighbors, neighbors in Full state and LSAs awaiting acknowledgement"""
+    output = run_vtysh_json(container, "show ip ospf neighbor json")
+    total = full = pending = 0
+    for adjacencies in output.get("neighbors", {}).values():
+        for adjacency in adjacencies:
+            total += 1
+            state = adjacency.get("state") or adjacency.get("nbrState", "")
+            if state.startswith("Full"):
+                full += 1
+            pending += adjacency.get(
+                "retransmitCounter",
+                adjacency.get("linkStateRetransmissionListCounter", 0),
+            )
+
+    return total, full, pending
+
+
+def bgp_peer_state(container) -> Tuple[int, int]:
+    """Return total configured BGP peers and peers in Established state"""
+    output = run_vtysh_json(container, "show bgp summary json")
+    peers: Dict[str, str] = {}
+    for address_family in output.values():
+        if isinstance(address_family, dict):
+            for peer, details in address_family.get("peers", {}).items():
+                peers[peer] = details.get("state", "")
+
+    established = sum(1 for state in peers.values() if state == "Established")
+    return len(peers), established
+
+
+def ospf_startup_max_metric(container) -> bool:
+    """Return True while any OSPF area still originates the max-metric router LSA of
+    max-metric router-lsa on-startup. An administrative max-metric is ignored, it never clears by itself"""
+    output = run_vtysh_json(container, "show ip ospf json")
+    return any(
+        area.get("originStubMaxDistRouterLsa") and not area.get("indefiniteActiveAdmin")
+        for area in output.get("areas", {}).values()
+        if isinstance(area, dict)
+    )
+
+
+def expected_counts_from_config(config: str) -> Tuple[int, int]:
+    """Derive the OSPF and BGP neighbor counts a device should reach from its frr.conf
+    Every point-to-point OSPF interface forms one adjacency and every neighbor assigned to a peer group
+    is one BGP session. Dynamic neighbors accepted through a listen range are not counted"""
+    ospf = bgp = 0
+    for line in config.splitlines():
+        words = line.split()
+        if words == ["ip", "ospf", "network", "point-to-point"]:
+            ospf += 1
+        elif len(words) >= 4 and words[0] == "neighbor" and words[-2] == "peer-group":
+            bgp += 1
+
+    return ospf, bgp
+
+
+def expected_neighbor_counts(model) -> Dict[str, Tuple[int, int]]:
+    """Derive the OSPF and BGP neighbor counts each device should reach from the model
+    Every internal link in the model's link table forms one OSPF adjacency"""
+    return {
+        device.hostname: (
+            model.links.degree(device.hostname),
+            device.bgp.session_count,
+        )
+        for device in model.devices
+    }
+
+
+class ConvergenceProbe:
+    """This class polls FRR on a device with exponential backoff until it has converged
+    Time taken by every device and phase is recorded for reporting"""
+
+    def __init__(
+        self,
+        expected_counts: Dict[str, Tuple[int, int]] = None,
+        timeout: float = 300,
+        initial_interval: float = 1,
+        max_interval: float = 10,
+        drain_hold: float = 10,
+    ) -> None:
+        self.expected_counts = expected_counts or {}
+        self.timeout = timeout
+        # Seconds a drained device keeps its traffic shifted away before it is restarted
+        self.drain_hold = drain_hold
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.durations: Dict[str, Dict[str, float]] = {}
+        self.__lock = Lock()
+
+    def wait_until(self, router: str, phase: str, check) -> float:
+        """Poll check() until it returns True, return the elapsed seconds"""
+        start = monotonic()
+        interval = self.initial_interval
+        while not check():
+            elapsed = monotonic() - start
+            if elapsed >= self.timeout:
+                raise ConvergenceTimeout(
+                    f"{router} did not reach {phase} convergence within {self.timeout} seconds"
+                )
+            sleep(min(interval, self.timeout - elapsed))
+            interval = min(interval * 2, self.max_interval)
+
+        elapsed = monotonic() - start
+        with self.__lock:
+            self.durations.setdefault(router, {})[phase] = elapsed
+        print(f"{router} reached {phase} convergence in {elapsed:.1f} seconds")
+
+        return elapsed
+
+    def expect(self, router: str, counts: Tuple[int, int]) -> None:
+        """Set the neighbor counts of a device the model did not provide counts for"""
+        with self.__lock:
+            self.expected_counts.setdefault(router, counts)
+
+    def wait_for_drain(self, router: str, container) -> float:
+        """Wait until every OSPF neighbor is Full with no LSA awaiting acknowledgement, then hold for drain_hold seconds
+        The drain is signalled by the hold time. An empty retransmit list says nothing about neighbors having
+        recomputed their routes, and FRR may take up to 5 seconds to originate the max-metric LSA and
+        another 5 seconds to run SPF with its default throttle timers"""
+        start = monotonic()
+
+        def flooded() -> bool:
+            total, full, pending = ospf_neighbor_state(container)
+            return total == full and pending == 0
+
+        self.wait_until(router, "flooding", flooded)
+        print(f"Holding {router} drained for {self.drain_hold} seconds")
+        sleep(self.drain_hold)
+        elapsed = monotonic() - start
+        with self.__lock:
+            self.durations.setdefault(router, {})["drain"] = elapsed
+
+        return elapsed
+
+    def wait_for_convergence(
+        self, router: str, container, phase: str = "routing"
+    ) -> float:
+        """Wait until OSPF and BGP neighbor counts reach the values expected by the model
+        Without a model every neighbor FRR knows about must be Full/Established
+        The device must also have stopped advertising its on-startup max-metric, until then
+        neighbors route around it and the next wave would drain the only remaining paths"""
+        expected_ospf, expected_bgp = self.expected_counts.get(router, (None, None))
+
+        def converged() -> bool:
+            total, full, _ = ospf_neighbor_state(container)
+            if not self.__reached(full, total, expected_ospf):
+                return False
+
+            total, established = bgp_peer_state(container)
+            if not self.__reached(established, total, expected_bgp):
+                return False
+
+            return not ospf_startup_max_metric(container)
+
+        return self.wait_until(router, phase, converged)
+
+    def report(self) -> None:
+        print("#### Convergence Times ####")
+        for router, phases in sorted(self.durations.items()):
+            times = " ".join(
+                f"{phase}={seconds:.1f}s" for phase, seconds in phases.items()
+            )
+            print(f"{router}: {times}")
+
+    @staticmethod
+    def __reached(up: int, total: int, expected: Optional[int]) -> bool:
+        # Without an expected count, a device with no neighbors at all has converged
+        if expected is None:
+            return up == total
+
+        return up >= expected
@@ -0,0 +1,132 @@
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Deque, Dict, List, Optional
+
+
+class RolloutAborted(Exception):
+    """This exception is raised when a rollout exceeds its failure threshold or a wave fails to converge"""
+
+
+def router_tier(router: str) -> str:
+    """Eg. t1-r5 and t1-p2-r5 both belong to tier t1"""
+    return router.split("-")[0]
+
+
+def router_pod(router: str) -> Optional[str]:
+    """Eg. t1-p2-r5 belongs to pod p2, routers without a pod segment return None"""
+    match = re.search(r"-(p\d+)-", router)
+    return match.group(1) if match else None
+
+
+def parse_wave_size(wave_size: str, tier_size: int) -> int:
+    """Convert a wave size such as "25%" or "4" into a router count for a tier"""
+    wave_size = str(wave_size)
+    if wave_size.endswith("%"):
+        count = tier_size * float(wave_size[:-1]) // 100
+    else:
+        count = int(wave_size)
+
+    return max(1, int(count))
+
+
+def plan_waves(
+    routers: List[str],
+    wave_size: str = "1",
+    tier_order: List[str] = None,
+    max_per_pod: int = 1,
+    allow_full_tier: bool = True,
+) -> List[List[str]]:
+    """Split routers into deployment waves
+    Tiers are deployed one after another following tier_order, each tier is split into waves of wave_size
+    A wave never contains more than max_per_pod routers from the same pod,
+    each wave continues with the pod after the last one the previous wave drew from"""
+    tiers: Dict[str, List[str]] = {}
+    for router in routers:
+        tiers.setdefault(router_tier(router), []).append(router)
+
+    ordered_tiers = [tier for tier in tier_order or [] if tier in tiers]
+    ordered_tiers += [tier for tier in tiers if tier not in ordered_tiers]
+
+    max_per_pod = max(1, max_per_pod)
+    waves = []
+    for tier in ordered_tiers:
+        tier_routers = tiers[tier]
+        size = parse_wave_size(wave_size, len(tier_routers))
+        if not allow_full_tier and size >= len(tier_routers) > 1:
+            raise ValueError(
+                f"Wave size {wave_size} would drain every {tier} router at once"
+            )
+
+        # One queue per pod, served round-robin so every router is visited once
+        pods: Dict[Optional[str], Deque[str]] = {}
+        for router in tier_routers:
+            pods.setdefault(router_pod(router), deque()).append(router)
+        queues = deque(pods.items())
+        position = {router: index for index, router in enumerate(tier_routers)}
+
+        while queues:
+            wave: List[str] = []
+            for _ in range(len(queues)):
+                if len(wave) == size:
+                    break
+                pod, queue = queues.popleft()
+                # Routers without a pod are not limited
+                quota = min(max_per_pod if pod else size, size - len(wave))
+                for _ in range(min(quota, len(queue))):
+                    wave.append(queue.popleft())
+                if queue:
+                    queues.append((pod, queue))
+            waves.append(sorted(wave, key=position.__getitem__))
+
+    return waves
+
+
+class RolloutScheduler:
+    """This class deploys routers wave by wave, running each wave on a thread pool
+    Every wave must pass its convergence gate before the next one starts"""
+
+    def __init__(
+        self,
+        waves: List[List[str]],
+        deploy_router: Callable[[str], None],
+        max_parallel: int = 1,
+        max_failures: int = 0,
+        convergence_gate: Callable[[List[str]], bool] = None,
+    ) -> None:
+        self.waves = waves
+        self.deploy_router = deploy_router
+        self.max_parallel = max(1, max_parallel)
+        self.max_failures = max_failures
+        self.convergence_gate = convergence_gate
+        self.succeeded: List[str] = []
+        self.failed: Dict[str, Exception] = {}
+
+    def run(self) -> None:
+        for number, wave in enumerate(self.waves, start=1):
+            print(f"## Wave {number}/{len(self.waves)}: {' '.join(wave)} ##\n")
+            self.run_wave(wave)
+
+            if len(self.failed) > self.max_failures:
+                raise RolloutAborted(
+                    f"Aborting rollout after wave {number}, {len(self.failed)} devices failed: {' '.join(self.failed)}"
+                )
+
+            if self.convergence_gate and not self.convergence_gate(wave):
+                raise RolloutAborted(
+                    f"Wave {number} did not converge: {' '.join(wave)}"
+                )
+
+    def run_wave(self, wave: List[str]) -> None:
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(wave))) as pool:
+            futures = {
+                pool.submit(self.deploy_router, router): router for router in wave
+            }
+            for future in as_completed(futures):
+                router = futures[future]
+                try:
+                    future.result()
+                    self.succeeded.append(router)
+                except Exception as e:
+                    print(f"Deployment to {router} FAILED: {e}")
+                    self.failed[router] = e
@@ -0,0 +1,54 @@
+import json
+import os
+from typing import Dict
+
+
+DEPLOYED_STATE_FILENAME = ".closbuilder_deployed.json"
+DEPLOYED_STATE_VERSION = 1
+
+
+def deployed_state_path(config_dir: str) -> str:
+    """The state of a config directory is kept inside it, the state of an archive next to it"""
+    if os.path.isfile(config_dir):
+        return f"{config_dir}.deployed.json"
+
+    return os.path.join(config_dir, DEPLOYED_STATE_FILENAME)
+
+
+class DeployedState:
+    """This class records the sha256 of the config last deployed successfully to every router
+    A router stays pending until a deployment has pushed its current config, however many times configs are generated
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.digests: Dict[str, str] = self.load()
+
+    def load(self) -> Dict[str, str]:
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if state.get("version") != DEPLOYED_STATE_VERSION:
+            return {}
+
+        return state.get("routers", {})
+
+    def is_deployed(self, router: str, digest: str) -> bool:
+        return self.digests.get(router) == digest
+
+    def record(self, digests: Dict[str, str]) -> None:
+        """Mark configs as deployed and save the state
+        Written to a temporary file first so an interrupted save never loses earlier deployments"""
+        self.digests.update(digests)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(
+                {"version": DEPLOYED_STATE_VERSION, "routers": self.digests},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(temporary_path, self.path)
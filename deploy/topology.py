@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+from typing import Dict, IO, Iterator, List, NamedTuple, Optional, Tuple
+
+
+# Bump when the pickled GnsTopology state changes
+TOPOLOGY_CACHE_VERSION = 1
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# (node name, interface name)
+Interface = Tuple[str, str]
+
+
+class JsonStream:
+    """This class reads a JSON document from a file in chunks and decodes one value at a time
+    Objects and arrays can be walked member by member, so only the member being decoded is held in memory
+    """
+
+    def __init__(self, f: IO[str], chunk_size: int = 1 << 20) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        """Append the next chunk to the unread part of the buffer, False at the end of the file"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it, empty at the end"""
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(
+                f"Expected {char!r} in GNS3 project, found {self.peek()!r}"
+            )
+        self.position += 1
+
+    def decode(self):
+        """Decode the next complete value, reading more chunks while it is cut off by the buffer end"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number ending with the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield the keys of the object at the current position
+        The caller consumes each member's value before asking for the next key"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.decode()
+            self.expect(":")
+            yield key
+            if self.peek() == "}":
+                self.position += 1
+                return
+            self.expect(",")
+
+    def iter_array(self) -> Iterator:
+        """Yield the elements of the array at the current position, decoded one at a time"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self.decode()
+            if self.peek() == "]":
+                self.position += 1
+                return
+            self.expect(",")
+
+
+class GnsNode(NamedTuple):
+    """The fields of a GNS3 node used for deployment"""
+
+    name: str
+    node_id: str
+    node_type: str
+    image: str
+    container_id: Optional[str]
+    compute_id: str
+
+    @property
+    def is_router(self) -> bool:
+        return "frr" in self.image
+
+
+class GnsTopology:
+    """This class indexes the nodes, computes and wiring of a GNS3 project
+    Nodes are keyed by name and every wired interface by (node, interface), so lookups are constant time
+    """
+
+    def __init__(self) -> None:
+        self.nodes: Dict[str, GnsNode] = {}
+        self.compute_hosts: Dict[str, Optional[str]] = {}
+        self.links: List[Tuple[Interface, Interface]] = []
+        self.interfaces: Dict[Interface, Interface] = {}
+        # Interfaces used by more than one link
+        self.conflicts: List[Interface] = []
+        self.__node_names: Dict[str, str] = {}
+        self.__port_names: Dict[str, Dict[Tuple[int, int], str]] = {}
+        # Links can precede nodes in a project, their (node_id, adapter, port) ends are named once parsing is done
+        self.__link_ends: List[Tuple[Tuple[str, int, int], ...]] = []
+
+    def add_node(self, node: Dict) -> None:
+        properties = node.get("properties", {})
+        gns_node = GnsNode(
+            name=node["name"],
+            node_id=node["node_id"],
+            node_type=node.get("node_type", ""),
+            image=properties.get("image", ""),
+            container_id=properties.get("container_id"),
+            compute_id=node.get("compute_id", "local"),
+        )
+        self.nodes[gns_node.name] = gns_node
+        self.__node_names[gns_node.node_id] = gns_node.name
+        self.__port_names[gns_node.node_id] = {
+            (port.get("adapter_number", 0), port.get("port_number", 0)): port["name"]
+            for port in node.get("ports", [])
+            if "name" in port
+        }
+
+    def add_link(self, link: Dict) -> None:
+        ends = link.get("nodes", [])
+        if len(ends) == 2:
+            self.__link_ends.append(
+                tuple(
+                    (
+                        end.get("node_id"),
+                        end.get("adapter_number", 0),
+                        end.get("port_number", 0),
+                    )
+                    for end in ends
+                )
+            )
+
+    def add_compute(self, compute: Dict) -> None:
+        self.compute_hosts[compute["compute_id"]] = compute.get("host")
+
+    def interface_name(
+        self, node_id: str, adapter: int, port: int
+    ) -> Optional[Interface]:
+        """Name a link end after its node's port, docker nodes use ethN for adapter N"""
+        name = self.__node_names.get(node_id)
+        if name is None:
+            return None
+        interface = self.__port_names[node_id].get((adapter, port))
+        if interface is None:
+            docker = self.nodes[name].node_type == "docker"
+            interface = f"eth{adapter}" if docker else f"{adapter}/{port}"
+
+        return name, interface
+
+    def index_links(self) -> None:
+        for ends in self.__link_ends:
+            end_a, end_b = (self.interface_name(*end) for end in ends)
+            if end_a is None or end_b is None:
+                continue
+            self.links.append((end_a, end_b))
+            for interface, peer in ((end_a, end_b), (end_b, end_a)):
+                if interface in self.interfaces:
+                    self.conflicts.append(interface)
+                self.interfaces[interface] = peer
+        self.__link_ends = []
+
+    def peer(self, name: str, interface: str) -> Optional[Interface]:
+        """Return the node and interface wired to a node's interface"""
+        return self.interfaces.get((name, interface))
+
+    @property
+    def routers(self) -> Dict[str, GnsNode]:
+        return {name: node for name, node in self.nodes.items() if node.is_router}
+
+    @property
+    def router_container_map(self) -> Dict[str, str]:
+        return {name: node.container_id for name, node in self.routers.items()}
+
+    @property
+    def router_computes(self) -> Dict[str, str]:
+        return {name: node.compute_id for name, node in self.routers.items()}
+
+
+def read_topology(path: str, chunk_size: int = 1 << 20) -> GnsTopology:
+    """Stream a GNS3 project file into a GnsTopology
+    Nodes, links and computes are decoded one object at a time and drawings are discarded as they are read
+    """
+    topology = GnsTopology()
+    sections = {
+        "nodes": topology.add_node,
+        "links": topology.add_link,
+        "computes": topology.add_compute,
+    }
+    with open(path, "r", encoding="utf-8") as f:
+        stream = JsonStream(f, chunk_size=chunk_size)
+        for key in stream.iter_object():
+            if key != "topology":
+                stream.decode()
+                continue
+            for section in stream.iter_object():
+                if stream.peek() != "[":
+                    stream.decode()
+                    continue
+                add = sections.get(section)
+                for item in stream.iter_array():
+                    if add:
+                        add(item)
+    topology.index_links()
+
+    return topology
+
+
+# Topologies parsed by this process, keyed by path
+loaded_topologies: Dict[str, Tuple[Tuple, GnsTopology]] = {}
+
+
+def load_topology(path: str, cache_dir: str = None) -> GnsTopology:
+    """Return the indexed topology of a GNS3 project, parsed again only when the file's mtime or size changed
+    Topologies are kept for the life of the process and, with cache_dir, pickled between runs"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (TOPOLOGY_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    loaded = loaded_topologies.get(path)
+    if loaded and loaded[0] == signature:
+        return loaded[1]
+
+    cache_path = None
+    topology = None
+    if cache_dir:
+        key = hashlib.sha256(path.encode("utf-8")).hexdigest()
+        cache_path = os.path.join(cache_dir, f"topology_{key}.pickle")
+        try:
+            with open(cache_path, "rb") as f:
+                cached_signature, cached = pickle.load(f)
+            if cached_signature == signature:
+                topology = cached
+                print(f"Loaded GNS3 topology from {cache_path}")
+        except (OSError, EOFError, ValueError, AttributeError, pickle.PickleError):
+            pass
+
+    if topology is None:
+        topology = read_topology(path)
+        if cache_path:
+            # Written to a temporary file first so readers never see a partial topology
+            os.makedirs(cache_dir, exist_ok=True)
+            temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as f:
+                pickle.dump((signature, topology), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, cache_path)
+
+    loaded_topologies[path] = (signature, topology)
+
+    return topology
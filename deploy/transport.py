@@ -0,0 +1,228 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from time import monotonic
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import docker
+from docker.client import DockerClient
+from docker.models.containers import Container
+
+
+class ThrottledContainer:
+    """This class wraps a container handle so calls to its Docker daemon respect the daemon's in-flight limit
+    Every other attribute is read from the wrapped container"""
+
+    def __init__(self, container, limiter: BoundedSemaphore) -> None:
+        self.container = container
+        self.__limiter = limiter
+
+    def __getattr__(self, name: str):
+        return getattr(self.container, name)
+
+    def exec_run(self, *args, **kwargs):
+        with self.__limiter:
+            return self.container.exec_run(*args, **kwargs)
+
+    def put_archive(self, *args, **kwargs):
+        with self.__limiter:
+            return self.container.put_archive(*args, **kwargs)
+
+
+def parse_endpoints(docker_clients: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    """Split --docker_client values into compute_id=url assignments and plain URLs
+    Eg. ["vm1=tcp://10.0.0.3:2375", "tcp://10.0.0.4:2375"]"""
+    assigned, urls = {}, []
+    for value in docker_clients:
+        compute_id, separator, url = value.partition("=")
+        if separator and "://" not in compute_id:
+            assigned[compute_id] = url
+        else:
+            urls.append(value)
+
+    return assigned, urls
+
+
+def connect_to_routers(
+    client: DockerClient, router_container_map: Dict, max_workers: int = 16
+) -> Tuple[Dict[str, Container], List[str]]:
+    """Fetch a running Container handle for every router
+    All containers are listed with a single API call, only routers missing from the listing
+    are looked up individually on a bounded thread pool
+    Return the handles keyed by router and the routers that failed verification"""
+    print("Verifying connection to Docker containers for all network devices")
+    start = monotonic()
+    listed = {
+        container.id: container
+        for container in client.containers.list(
+            all=True,
+            sparse=True,
+            filters={"id": list(router_container_map.values())},
+        )
+    }
+    list_latency = monotonic() - start
+
+    def lookup(container_id: str) -> Tuple[Optional[Container], float]:
+        start = monotonic()
+        try:
+            container = listed.get(container_id) or client.containers.get(
+                container_id=container_id
+            )
+        except Exception:
+            container = None
+        return container, monotonic() - start
+
+    missing = [
+        router
+        for router, container_id in router_container_map.items()
+        if container_id not in listed
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as pool:
+        lookups = dict(
+            zip(
+                missing,
+                pool.map(lookup, [router_container_map[router] for router in missing]),
+            )
+        )
+
+    handles, failed = {}, []
+    for router, container_id in router_container_map.items():
+        container, latency = lookups.get(
+            router, (listed.get(container_id), list_latency)
+        )
+        if container is not None and container.status == "running":
+            handles[router] = container
+            print(
+                f"Connection verification for {router} SUCCEEDED ({latency * 1000:.0f} ms)"
+            )
+        else:
+            failed.append(router)
+            print(
+                f"Connection verification for {router} FAILED ({latency * 1000:.0f} ms)"
+            )
+
+    return handles, failed
+
+
+class DockerTransport:
+    """This class routes every router to the Docker daemon of the GNS3 compute hosting it
+    One client is kept per daemon so HTTP connections are pooled and reused,
+    and in-flight requests are capped per daemon rather than for the whole deployment"""
+
+    def __init__(
+        self,
+        clients: Dict[str, object],
+        router_endpoints: Dict[str, str] = None,
+        max_in_flight: int = 8,
+        unresolved: Dict[str, str] = None,
+    ) -> None:
+        self.clients = clients
+        self.router_endpoints = router_endpoints or {}
+        # Routers whose compute has no client, they fail on their own when they are used
+        self.unresolved = unresolved or {}
+        self.max_in_flight = max(1, max_in_flight)
+        self.limiters = {
+            endpoint: BoundedSemaphore(self.max_in_flight) for endpoint in clients
+        }
+
+    @classmethod
+    def from_urls(
+        cls,
+        docker_clients: List[str],
+        router_computes: Dict[str, str] = None,
+        compute_hosts: Dict[str, str] = None,
+        max_in_flight: int = 8,
+        client_factory: Callable[[str, int], object] = None,
+    ) -> "DockerTransport":
+        """Create one client per URL and assign every router to one of them
+        A router's compute is matched with an explicit compute_id=url value first, then with
+        the URL whose host is the compute's host. With a single URL every router uses it
+        Routers whose compute matches no URL are only reported once they are used"""
+        assigned, urls = parse_endpoints(docker_clients)
+        endpoints = list(dict.fromkeys(list(assigned.values()) + urls))
+        client_factory = client_factory or (
+            lambda url, pool_size: docker.DockerClient(
+                base_url=url, max_pool_size=pool_size
+            )
+        )
+        clients = {url: client_factory(url, max_in_flight) for url in endpoints}
+
+        hosts = {urlparse(url).hostname: url for url in urls}
+        router_endpoints, unresolved = {}, {}
+        for router, compute_id in (router_computes or {}).items():
+            endpoint = assigned.get(compute_id) or hosts.get(
+                (compute_hosts or {}).get(compute_id)
+            )
+            if endpoint is None and len(endpoints) == 1:
+                endpoint = endpoints[0]
+            if endpoint is None:
+                unresolved[router] = compute_id
+            else:
+                router_endpoints[router] = endpoint
+
+        return cls(
+            clients=clients,
+            router_endpoints=router_endpoints,
+            max_in_flight=max_in_flight,
+            unresolved=unresolved,
+        )
+
+    def endpoint_for(self, router: str) -> str:
+        """Raise ValueError for a router no client is assigned to"""
+        endpoint = self.router_endpoints.get(router)
+        if endpoint is None:
+            compute_id = self.unresolved.get(router)
+            if compute_id is not None:
+                raise ValueError(
+                    f"No Docker client for {router} on GNS3 compute {compute_id}, "
+                    f"pass it as {compute_id}=<url>"
+                )
+            if len(self.clients) != 1:
+                raise ValueError(f"No Docker client is assigned to {router}")
+            endpoint = next(iter(self.clients))
+
+        return endpoint
+
+    def container(self, router: str, container_id: str) -> ThrottledContainer:
+        endpoint = self.endpoint_for(router)
+        with self.limiters[endpoint]:
+            container = self.clients[endpoint].containers.get(container_id=container_id)
+
+        return ThrottledContainer(container, self.limiters[endpoint])
+
+    def connect(
+        self, router_container_map: Dict[str, str]
+    ) -> Tuple[Dict[str, ThrottledContainer], List[str]]:
+        """Verify the routers of every daemon concurrently, see connect_to_routers
+        Return throttled handles keyed by router and the routers that failed verification"""
+        groups: Dict[str, Dict[str, str]] = {}
+        unassigned: List[str] = []
+        for router, container_id in router_container_map.items():
+            try:
+                endpoint = self.endpoint_for(router)
+            except ValueError as e:
+                print(f"Connection verification for {router} FAILED: {e}")
+                unassigned.append(router)
+                continue
+            groups.setdefault(endpoint, {})[router] = container_id
+
+        def verify(endpoint: str) -> Tuple[Dict, List[str]]:
+            return connect_to_routers(
+                client=self.clients[endpoint],
+                router_container_map=groups[endpoint],
+                max_workers=self.max_in_flight,
+            )
+
+        handles: Dict[str, ThrottledContainer] = {}
+        failed: List[str] = list(unassigned)
+        with ThreadPoolExecutor(max_workers=max(1, len(groups))) as pool:
+            for endpoint, (endpoint_handles, endpoint_failed) in zip(
+                groups, pool.map(verify, groups)
+            ):
+                for router, container in endpoint_handles.items():
+                    handles[router] = ThrottledContainer(
+                        container, self.limiters[endpoint]
+                    )
+                failed.extend(endpoint_failed)
+
+        return handles, failed
@@ -1,11 +1,41 @@
 import argparse
-import docker
-import json
+import io
+import os
 import sys
-from time import sleep
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
 from typing import Dict, List
 
 from docker.client import DockerClient
+from docker.models.containers import Container
+from deploy.config_diff import diff_configs
+from deploy.probes import (
+    ConvergenceProbe,
+    ConvergenceTimeout,
+    expected_counts_from_config,
+    expected_neighbor_counts,
+)
+from deploy.rollout import RolloutScheduler, plan_waves
+from deploy.state import DeployedState, deployed_state_path
+from deploy.topology import load_topology
+from deploy.transport import DockerTransport, connect_to_routers
+from generate_configurations import build_model, parse_input_yaml
+from render.archive import ConfigBundle, archive_format
+from render.manifest import config_digest
+from validation.validator import FabricValidator
+
+
+STAGING_DIR = "/tmp/closbuilder"
+FRR_RELOAD = "/usr/lib/frr/frr-reload.py"
+
+
+class ConfigStagingFailed(Exception):
+    """This exception is raised when configs could not be staged on a network device"""
+
+
+class ConfigReloadFailed(Exception):
+    """This exception is raised when frr-reload.py could not apply a config delta on a network device"""
 
 
 def parse_args() -> argparse.ArgumentParser:
@@ -19,14 +49,22 @@ def parse_args() -> argparse.ArgumentParser:
     parser.add_argument(
         "-dc",
         "--docker_client",
+        nargs="+",
         required=True,
-        help="Docker client URL (Eg. tcp://10.0.0.3:2375)",
+        help="Docker client URLs, one per GNS3 compute (Eg. tcp://10.0.0.3:2375 or vm1=tcp://10.0.0.4:2375)",
+    )
+    parser.add_argument(
+        "-mi",
+        "--max_in_flight",
+        type=int,
+        default=8,
+        help="Maximum concurrent requests and pooled connections per Docker client",
     )
     parser.add_argument(
         "-c",
         "--config_dir",
         required=True,
-        help="Absolute path to directory containing network device configurations",
+        help="Absolute path to directory or tar/zip archive containing network device configurations",
     )
     parser.add_argument(
         "-s",
@@ -49,71 +87,234 @@ def parse_args() -> argparse.ArgumentParser:
         default=[],
         help="List of validation commands to execute after configuration push",
     )
+    parser.add_argument(
+        "-dp",
+        "--diff_push",
+        action="store_true",
+        default=False,
+        help="Apply only the config delta with frr-reload.py instead of restarting FRR, skip routers already up to date",
+    )
+    parser.add_argument(
+        "-co",
+        "--changed_only",
+        action="store_true",
+        default=False,
+        help="Only deploy to devices whose current config has not been deployed successfully yet",
+    )
+    parser.add_argument(
+        "-w",
+        "--wave_size",
+        default="1",
+        help="Devices deployed per wave, as a count or a percentage of each tier (Eg. 4 or 25%%)",
+    )
+    parser.add_argument(
+        "-to",
+        "--tier_order",
+        nargs="+",
+        default=None,
+        help="Order in which tiers are deployed (Eg. t2 t1)",
+    )
+    parser.add_argument(
+        "-p",
+        "--max_parallel",
+        type=int,
+        default=1,
+        help="Maximum number of devices deployed concurrently within a wave",
+    )
+    parser.add_argument(
+        "-mf",
+        "--max_failures",
+        type=int,
+        default=0,
+        help="Abort the rollout once more than this many devices have failed",
+    )
+    parser.add_argument(
+        "-wp",
+        "--wave_pause",
+        type=int,
+        default=0,
+        help="Seconds to wait for convergence after each wave",
+    )
+    parser.add_argument(
+        "-mpp",
+        "--max_per_pod",
+        type=int,
+        default=1,
+        help="Maximum routers from the same pod in a wave",
+    )
+    parser.add_argument(
+        "-tc",
+        "--topology_cache_dir",
+        help="Directory used to cache the parsed GNS3 project, reused while the project file is unchanged",
+    )
+    parser.add_argument(
+        "-y",
+        "--input_yaml",
+        help="Input YAML used to generate the configs, expected neighbor counts are derived from it",
+    )
+    parser.add_argument(
+        "-mc",
+        "--model_cache_dir",
+        help="Directory with models cached by generate_configurations.py, used with -y",
+    )
+    parser.add_argument(
+        "-va",
+        "--validate",
+        action="store_true",
+        default=False,
+        help="Statically check the model from -y, its GNS3 wiring and the configs before deploying, abort on any issue",
+    )
+    parser.add_argument(
+        "-ct",
+        "--convergence_timeout",
+        type=int,
+        default=300,
+        help="Seconds to wait for a device to converge before marking it failed",
+    )
+    parser.add_argument(
+        "-dh",
+        "--drain_hold",
+        type=int,
+        default=10,
+        help="Seconds a device stays drained after its max-metric LSA is acknowledged, used with -s",
+    )
 
-    return parser.parse_args()
-
+    args = parser.parse_args()
+    if args.validate and not args.input_yaml:
+        parser.error("--validate needs the input YAML passed with -y")
 
-def generate_router_container_map(gns_json: str) -> Dict:
-    with open(gns_json, "r") as f:
-        topology = json.load(f)
+    return args
 
-        nodes = [node for node in topology["topology"]["nodes"]]
-        router_container_map = {
-            router["name"]: router["properties"]["container_id"]
-            for router in nodes
-            if "frr" in router["properties"]["image"]
-        }
 
-    return router_container_map
+def generate_router_container_map(gns_json: str, cache_dir: str = None) -> Dict:
+    return load_topology(path=gns_json, cache_dir=cache_dir).router_container_map
 
 
-def shift_ospf(router: str, direction: str, container_client: DockerClient) -> None:
+def shift_ospf(
+    router: str,
+    direction: str,
+    container_client: DockerClient,
+    probe: ConvergenceProbe = None,
+) -> None:
     if direction == "away":
         shift_config = "vtysh -c 'conf t' -c 'router ospf' -c 'max-metric router-lsa administrative' -c 'end' -c 'write file'"
-        message = f"Applying OSPF max-metric to shift traffic away from {router} and pausing for 90 seconds for convergence"
+        message = f"Applying OSPF max-metric to shift traffic away from {router}"
     else:
         shift_config = "vtysh -c 'conf t' -c 'router ospf' -c 'no max-metric router-lsa administrative' -c 'end' -c 'write file'"
-        message = f"Removing OSPF max-metric to shift traffic back to {router} and pausing for 90 seconds for convergence"
+        message = f"Removing OSPF max-metric to shift traffic back to {router}"
 
     print(message)
     container_client.exec_run(cmd=["sh", "-c", shift_config])
-    sleep(90)
+    if probe:
+        probe.wait_for_drain(router=router, container=container_client)
+    else:
+        print(f"Pausing 90 seconds for convergence on {router}")
+        sleep(90)
+
+
+def build_config_archive(files: Dict[str, bytes], directory: str) -> bytes:
+    """Pack files into an in-memory tar archive under the given directory name
+    The archive can be extracted in a container with a single put_archive call"""
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        for filename, content in files.items():
+            member = tarfile.TarInfo(name=f"{directory}/{filename}")
+            member.size = len(content)
+            member.mode = 0o640
+            member.mtime = int(time())
+            tar.addfile(member, io.BytesIO(content))
+
+    return archive.getvalue()
+
+
+def read_frr_config(
+    router: str, config_dir: str, config_bundle: ConfigBundle = None
+) -> bytes:
+    """Read a router's integrated frr.conf from the config directory or archive"""
+    filename = f"{router}_frr.conf"
+    if config_bundle:
+        return config_bundle.read(filename)
+
+    with open(os.path.join(config_dir, filename), "rb") as f:
+        return f.read()
+
+
+def config_digests(
+    routers: List[str], config_dir: str, config_bundle: ConfigBundle = None
+) -> Dict[str, str]:
+    """Return the sha256 of every router's frr.conf, routers without a config are left out"""
+    digests = {}
+    for router in routers:
+        try:
+            config = read_frr_config(
+                router=router, config_dir=config_dir, config_bundle=config_bundle
+            )
+        except (OSError, KeyError):
+            continue
+        digests[router] = config_digest(config.decode("utf-8"))
+
+    return digests
 
 
-def stage_frr_configs(router: str, frr_config, container_client: DockerClient) -> None:
+def stage_frr_configs(
+    router: str,
+    frr_config: bytes,
+    container_client: DockerClient,
+    initial_push: bool = False,
+) -> None:
+    """Copy frr.conf (and an empty vtysh.conf on initial push) into the container in one archive
+    A single exec then backs up the current config, moves the new files in place and fixes ownership"""
     print(f"Staging frr.conf on {router}")
-    with open(frr_config, "r") as f:
-        configs = f.read().splitlines()
-        for line in configs:
-            container_client.exec_run(
-                cmd=["sh", "-c", f"echo {line} >> /etc/frr/frr.conf"]
-            )
+    files = {"frr.conf": frr_config}
 
+    if initial_push:
+        print(f"Overwriting vtysh.conf on {router}")
+        files["vtysh.conf"] = b""
 
-def overwrite_vtysh_configs(router: str, countainer_client: DockerClient) -> None:
-    print(f"Overwriting vtysh.conf on {router}")
-    countainer_client.exec_run(
-        cmd=[
-            "sh",
-            "-c",
-            "rm /etc/frr/vtysh.conf && touch /etc/frr/vtysh.conf && chown frr:frr /etc/frr/vtysh.conf",
-        ]
+    container_client.put_archive(
+        path=os.path.dirname(STAGING_DIR),
+        data=build_config_archive(files=files, directory=os.path.basename(STAGING_DIR)),
     )
 
+    print(f"Backing up frr.conf on {router} as frr.conf.backup")
+    commands = [
+        "{ mv /etc/frr/frr.conf /etc/frr/frr.conf.backup || true; }",
+    ]
+    for filename in files:
+        commands.append(f"mv {STAGING_DIR}/{filename} /etc/frr/{filename}")
+        commands.append(f"chown frr:frr /etc/frr/{filename}")
+
+    result = container_client.exec_run(cmd=["sh", "-c", " && ".join(commands)])
+    if result.exit_code != 0:
+        raise ConfigStagingFailed(
+            f"Staging configs on {router} failed: {result.output.decode('utf-8')}"
+        )
+
+
+def fetch_running_config(container_client: DockerClient) -> str:
+    result = container_client.exec_run(cmd=["vtysh", "-c", "show running-config"])
+    return result.output.decode("utf-8")
+
+
+def reload_frr_config(router: str, container_client: DockerClient) -> None:
+    """Apply the staged frr.conf to the running daemons in a single frr-reload.py call
+    Only lines that differ from the running config are changed, adjacencies are not reset"""
+    print(f"Reloading FRR config on {router}")
+    result = container_client.exec_run(
+        cmd=["sh", "-c", f"{FRR_RELOAD} --reload /etc/frr/frr.conf"]
+    )
+    if result.exit_code != 0:
+        raise ConfigReloadFailed(
+            f"Reloading config on {router} failed: {result.output.decode('utf-8')}"
+        )
+
 
 def verify_router_connections(client: DockerClient, router_container_map: Dict) -> bool:
-    print(f"Verifying connection to Docker containers for all network devices")
-    verification_succeeded = True
-    for router, container in router_container_map.items():
-        try:
-            connection_status = client.containers.get(container_id=container).status
-            assert connection_status == "running"
-            print(f"Connection verification for {router} SUCCEEDED")
-        except Exception as e:
-            print(f"Connection verification for {router} FAILED")
-            verification_succeeded = False
+    _, failed = connect_to_routers(
+        client=client, router_container_map=router_container_map
+    )
 
-    return verification_succeeded
+    return not failed
 
 
 def run_check(container: DockerClient, check_command: str) -> None:
@@ -124,79 +325,282 @@ def run_check(container: DockerClient, check_command: str) -> None:
     print(results)
 
 
-def deploy_config(
-    router_container_map: Dict,
-    docker_client: docker.DockerClient,
+def deploy_router(
+    router: str,
+    container,
+    config_dir: str = "/tmp/output",
     shift_traffic: bool = False,
     initial_push: bool = False,
     check_commands: List[str] = None,
-):
-    print(f"## Starting deployment to {len(router_container_map)} devices ## \n")
-    for router, container_id in router_container_map.items():
-        container = docker_client.containers.get(container_id=container_id)
-
-        if initial_push:
-            overwrite_vtysh_configs(router=router, countainer_client=container)
-
-        if shift_traffic:
-            shift_ospf(router=router, direction="away", container_client=container)
+    probe: ConvergenceProbe = None,
+    config_bundle: ConfigBundle = None,
+    diff_push: bool = False,
+) -> None:
+    """Drain, stage, restart and verify a single network device
+    With a probe, convergence is polled instead of waiting fixed amounts of time
+    With diff_push, the running config is compared first and only the delta is reloaded"""
+    frr_config = read_frr_config(
+        router=router, config_dir=config_dir, config_bundle=config_bundle
+    )
 
-        # Backup current FRR config
-        print(f"Backing up frr.conf on {router} as frr.conf.backup")
-        container.exec_run(
-            cmd=["sh", "-c", "mv /etc/frr/frr.conf /etc/frr/frr.conf.backup"]
+    # An initial push also replaces vtysh.conf, which needs a restart
+    diff_push = diff_push and not initial_push
+    if diff_push:
+        delta = diff_configs(
+            running=fetch_running_config(container_client=container),
+            generated=frr_config.decode("utf-8"),
         )
-
-        # Write new configs
-        frr_config = f"/tmp/output/{router}_frr.conf"
-        stage_frr_configs(
-            router=router, frr_config=frr_config, container_client=container
+        if not delta:
+            print(f"{router} already runs the generated config, nothing to deploy\n")
+            return
+        print(f"Config delta on {router}: {delta}")
+
+    if shift_traffic:
+        shift_ospf(
+            router=router,
+            direction="away",
+            container_client=container,
+            probe=probe,
         )
 
-        # Update permissions
-        container.exec_run(cmd=["sh", "-c", "chown frr:frr /etc/frr/frr.conf"])
+    # Backup current FRR config and write new configs
+    stage_frr_configs(
+        router=router,
+        frr_config=frr_config,
+        container_client=container,
+        initial_push=initial_push,
+    )
 
+    if diff_push:
+        reload_frr_config(router=router, container_client=container)
+    else:
         # Restart FRR service
         print(f"Restarting FRR service on {router}")
         container.exec_run(cmd=["sh", "-c", "service frr restart"])
 
-        # Run verification check
-        if check_commands:
+    # Wait for OSPF and BGP to converge, counts come from the config unless the model provided them
+    if probe:
+        probe.expect(
+            router=router,
+            counts=expected_counts_from_config(config=frr_config.decode("utf-8")),
+        )
+        probe.wait_for_convergence(router=router, container=container)
+
+    # Run verification check
+    if check_commands:
+        if not probe:
             sleep(10)  # Allow some time for FRR service to stabilize
-            for command in check_commands:
-                run_check(container=container, check_command=command)
+        for command in check_commands:
+            run_check(container=container, check_command=command)
+
+    # Pause for convergence if shifting is enabled
+    if shift_traffic and not probe:
+        print("Pausing 90 seconds for convergence")
+        sleep(90)
 
-        # Pause for convergence if shifting is enabled
-        if shift_traffic:
-            print("Pausing 90 seconds for convergence")
-            sleep(90)
+    print(f"Deployment to {router} completed successfully\n")
 
-        print(f"Deployment to {router} completed successfully\n")
+
+def deploy_config(
+    router_container_map: Dict,
+    transport: DockerTransport,
+    config_dir: str = "/tmp/output",
+    shift_traffic: bool = False,
+    initial_push: bool = False,
+    check_commands: List[str] = None,
+    wave_size: str = "1",
+    tier_order: List[str] = None,
+    max_parallel: int = 1,
+    max_failures: int = 0,
+    wave_pause: int = 0,
+    probe: ConvergenceProbe = None,
+    container_handles: Dict[str, Container] = None,
+    config_bundle: ConfigBundle = None,
+    diff_push: bool = False,
+    max_per_pod: int = 1,
+    deployed_state: DeployedState = None,
+):
+    """Deploy configs in waves, see deploy.rollout for how waves are planned
+    With a probe, every router of a wave must still be converged before the next wave starts
+    With deployed_state, the configs of routers deployed successfully are recorded, even if the rollout aborts"""
+    print(f"## Starting deployment to {len(router_container_map)} devices ## \n")
+    waves = plan_waves(
+        routers=list(router_container_map),
+        wave_size=wave_size,
+        tier_order=tier_order,
+        max_per_pod=max_per_pod,
+        allow_full_tier=not shift_traffic,
+    )
+
+    def container_for(router: str):
+        container = container_handles.get(router) if container_handles else None
+        if container is None:
+            container = transport.container(
+                router=router, container_id=router_container_map[router]
+            )
+        return container
+
+    def deploy(router: str) -> None:
+        deploy_router(
+            router=router,
+            container=container_for(router),
+            config_dir=config_dir,
+            shift_traffic=shift_traffic,
+            initial_push=initial_push,
+            check_commands=check_commands,
+            probe=probe,
+            config_bundle=config_bundle,
+            diff_push=diff_push,
+        )
+
+    def convergence_gate(wave: List[str]) -> bool:
+        if wave_pause:
+            print(f"Pausing {wave_pause} seconds after wave for convergence")
+            sleep(wave_pause)
+        if not probe:
+            return True
+
+        # Failed routers are already counted against max_failures
+        deployed = [router for router in wave if router not in scheduler.failed]
+
+        def converged(router: str) -> bool:
+            try:
+                probe.wait_for_convergence(
+                    router=router, container=container_for(router), phase="wave"
+                )
+                return True
+            except ConvergenceTimeout as e:
+                print(f"Wave convergence check FAILED: {e}")
+                return False
+
+        if not deployed:
+            return True
+        with ThreadPoolExecutor(
+            max_workers=min(max(1, max_parallel), len(deployed))
+        ) as pool:
+            return all(list(pool.map(converged, deployed)))
+
+    scheduler = RolloutScheduler(
+        waves=waves,
+        deploy_router=deploy,
+        max_parallel=max_parallel,
+        max_failures=max_failures,
+        convergence_gate=convergence_gate,
+    )
+    try:
+        scheduler.run()
+    finally:
+        if deployed_state and scheduler.succeeded:
+            deployed_state.record(
+                config_digests(
+                    routers=scheduler.succeeded,
+                    config_dir=config_dir,
+                    config_bundle=config_bundle,
+                )
+            )
+        if probe:
+            probe.report()
 
 
 if __name__ == "__main__":
     args = parse_args()
 
-    # Generate router to container_id map
-    router_container_map = generate_router_container_map(gns_json=args.input_json)
+    # Index the GNS3 project and generate the router to container_id map
+    topology = load_topology(path=args.input_json, cache_dir=args.topology_cache_dir)
+    router_container_map = topology.router_container_map
+
+    # Configs can be read straight from an archive written by generate_configurations.py
+    config_bundle = None
+    if os.path.isfile(args.config_dir) and archive_format(args.config_dir):
+        config_bundle = ConfigBundle(path=args.config_dir)
+
+    # Limit deployment to devices whose current config has not been deployed yet
+    deployed_state = DeployedState(path=deployed_state_path(args.config_dir))
+    if args.changed_only:
+        digests = config_digests(
+            routers=list(router_container_map),
+            config_dir=args.config_dir,
+            config_bundle=config_bundle,
+        )
+        router_container_map = {
+            router: container
+            for router, container in router_container_map.items()
+            if router in digests
+            and not deployed_state.is_deployed(router, digests[router])
+        }
+
+    # Build the model before connecting so validation failures abort early
+    model = None
+    if args.input_yaml:
+        model = build_model(
+            network_details=parse_input_yaml(filename=args.input_yaml),
+            cache_dir=args.model_cache_dir,
+        )
 
-    # Establish connection to Docker client
-    docker_client = docker.DockerClient(base_url=args.docker_client)
+    # Cabling mismatches between GNS3 and the model are reported before anything is pushed
+    if model:
+        validator = FabricValidator(model=model)
+        validator.check_topology(topology=topology)
+        if args.validate:
+            validator.validate_model()
+            validator.validate_configs(
+                config_dir=args.config_dir, config_bundle=config_bundle
+            )
+        validator.report()
+        if validator.issues and args.validate:
+            print("Static validation failed. Aborting deployment")
+            sys.exit(1)
+
+    # Establish a pooled connection to the Docker client of every GNS3 compute,
+    # only the computes of routers being deployed need one
+    transport = DockerTransport.from_urls(
+        docker_clients=args.docker_client,
+        router_computes={
+            router: compute_id
+            for router, compute_id in topology.router_computes.items()
+            if router in router_container_map
+        },
+        compute_hosts=topology.compute_hosts,
+        max_in_flight=args.max_in_flight,
+    )
 
-    # Verify connection to each docker container
-    if not verify_router_connections(
-        client=docker_client, router_container_map=router_container_map
-    ):
+    # Verify connection to each docker container, handles are reused for deployment
+    container_handles, failed_routers = transport.connect(
+        router_container_map=router_container_map
+    )
+    if failed_routers:
         print(
             "Please verify all network devices are running in GNS3. Aborting deployment"
         )
         sys.exit(1)
 
+    # Derive expected neighbor counts from the model when its input YAML is provided
+    expected_counts = None
+    if model:
+        expected_counts = expected_neighbor_counts(model=model)
+    probe = ConvergenceProbe(
+        expected_counts=expected_counts,
+        timeout=args.convergence_timeout,
+        drain_hold=args.drain_hold,
+    )
+
     # Deploy configurations
     deploy_config(
         router_container_map=router_container_map,
         shift_traffic=args.shift_traffic,
         initial_push=args.initial_push,
-        docker_client=docker_client,
+        transport=transport,
+        config_dir=args.config_dir,
         check_commands=args.check_commands,
+        wave_size=args.wave_size,
+        tier_order=args.tier_order,
+        max_parallel=args.max_parallel,
+        max_failures=args.max_failures,
+        wave_pause=args.wave_pause,
+        max_per_pod=args.max_per_pod,
+        probe=probe,
+        container_handles=container_handles,
+        config_bundle=config_bundle,
+        diff_push=args.diff_push,
+        deployed_state=deployed_state,
     )
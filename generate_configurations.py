@@ -3,10 +3,24 @@ import os
 import sys
 import yaml
 from typing import Dict
-from models.clos import TwoTierClos, InvalidArchitecture
+from instrumentation.metrics import metrics, profiled, timed
+from models.cache import ModelCache, model_cache_key
+from models.clos import ThreeTierClos, TwoTierClos, InvalidArchitecture
+from models.streaming import StreamingThreeTierClos, StreamingTwoTierClos
+from render.archive import ARCHIVE_FORMATS, ConfigArchive, ConfigBundle, archive_path
+from render.frr_render import FrrRenderer
+from render.manifest import RenderManifest
+from validation.validator import FabricValidator
 
 
-MODEL_INVOCATION_MAP = {"TwoTierClos": TwoTierClos}
+# The C loader is much faster when PyYAML was built against libyaml
+# Only plain YAML is accepted, Python tags such as !!python/tuple are rejected
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+MODEL_INVOCATION_MAP = {"TwoTierClos": TwoTierClos, "ThreeTierClos": ThreeTierClos}
+STREAMING_MODEL_INVOCATION_MAP = {
+    "TwoTierClos": StreamingTwoTierClos,
+    "ThreeTierClos": StreamingThreeTierClos,
+}
 
 
 def parse_args() -> argparse.ArgumentParser:
@@ -27,50 +41,216 @@ def parse_args() -> argparse.ArgumentParser:
     parser.add_argument(
         "-o",
         "--output_dir",
-        help="Absolute path to directory where configurations will be written",
+        help="Absolute path to directory where configurations will be written, or to the archive with --output_format tar|zip",
         required=False,
     )
+    parser.add_argument(
+        "--output_format",
+        choices=["dir", *ARCHIVE_FORMATS],
+        default="dir",
+        help="Write configurations as loose files in a directory or as a single archive with a manifest",
+        required=False,
+    )
+    parser.add_argument(
+        "-t",
+        "--template_dir",
+        help="Directory with Jinja2 templates that override the bundled FRR templates",
+        required=False,
+    )
+    parser.add_argument(
+        "--template_cache_dir",
+        help="Directory used to cache compiled template bytecode between runs",
+        required=False,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to render device configurations",
+        required=False,
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Rewrite every configuration file even if its content is unchanged",
+        required=False,
+    )
+    parser.add_argument(
+        "-s",
+        "--stream",
+        action="store_true",
+        help="Build and render one device at a time instead of modeling the whole fabric in memory",
+        required=False,
+    )
+    parser.add_argument(
+        "-c",
+        "--model_cache_dir",
+        help="Directory used to cache built models, a model is reused while its input and version are unchanged",
+        required=False,
+    )
+    parser.add_argument(
+        "--split_configs",
+        action="store_true",
+        help="Also write separate zebra, ospfd and bgpd configs next to each integrated frr.conf",
+        required=False,
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Statically check the model and generated configs, exit with an error if any check fails",
+        required=False,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Print every configuration file as it is written",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics_json",
+        help="Write phase timings, counters and architecture stats to this JSON file",
+        required=False,
+    )
+    parser.add_argument(
+        "--profile",
+        help="Run under cProfile, dump the stats to this file and print the top functions",
+        required=False,
+    )
+    parser.add_argument(
+        "--trace_memory",
+        action="store_true",
+        help="Trace memory allocations with tracemalloc and record the peak in the metrics",
+        required=False,
+    )
+
+    args = parser.parse_args()
+    if args.validate and args.stream:
+        parser.error(
+            "--validate needs the in-memory model and cannot be used with --stream"
+        )
 
-    return parser.parse_args()
+    return args
 
 
+@timed("input.parse_yaml")
 def parse_input_yaml(filename: str) -> Dict:
     """Parse input YAML for network architecture details
     Return dictionary that will be used for model creation"""
     with open(filename, "r") as f:
-        network_details = yaml.load(f, Loader=yaml.Loader)
+        network_details = yaml.load(f, Loader=YAML_LOADER)
 
     return network_details
 
 
+@timed("model.build")
+def build_model(network_details: Dict, streaming: bool = False, cache_dir: str = None):
+    """Instantiate the modeling class selected by the input YAML's architecture
+    Streaming models generate devices on demand, memory use stays flat as the fabric grows
+    With cache_dir, a model built from the same parameters is loaded instead of rebuilt"""
+    # Determine modeling class
+    architecture = network_details.get("architecture")
+    model_map = STREAMING_MODEL_INVOCATION_MAP if streaming else MODEL_INVOCATION_MAP
+    model_class = model_map.get(architecture)
+
+    if not model_class:
+        raise InvalidArchitecture(
+            f"Architecture unsupported: {architecture}. Please choose from: {list(model_map)}"
+        )
+
+    # Every other key in the input YAML is passed to the modeling class
+    parameters = {
+        key: value for key, value in network_details.items() if key != "architecture"
+    }
+    # Streaming models hold no state worth caching
+    cache = ModelCache(cache_dir=cache_dir) if cache_dir and not streaming else None
+    if cache:
+        cache_key = model_cache_key(architecture=architecture, parameters=parameters)
+        model = cache.load(key=cache_key)
+        if model is not None:
+            print(f"Loaded model from {cache.path(key=cache_key)}")
+            model.show_architecture_statistics()
+            return model
+
+    try:
+        model = model_class(**parameters)
+    except TypeError as e:
+        raise InvalidArchitecture(f"Invalid parameters for {architecture}: {e}")
+
+    if cache:
+        cache.save(key=cache_key, model=model)
+
+    return model
+
+
 if __name__ == "__main__":
     args = parse_args()
 
-    # Parse input YAML
-    network_details = parse_input_yaml(filename=args.input_file)
+    with profiled(profile_file=args.profile, trace_memory=args.trace_memory):
+        # Parse input YAML
+        network_details = parse_input_yaml(filename=args.input_file)
 
-    # Determine modeling class
-    architecture = network_details.get("architecture")
+        # Generate modeling datastructure based on input YAML info
+        architecture_model = build_model(
+            network_details=network_details,
+            streaming=args.stream,
+            cache_dir=args.model_cache_dir,
+        )
 
-    # Generate modeling datastructure based on input YAML info
-    model_class = MODEL_INVOCATION_MAP.get(architecture)
+        # Generate configuration files based on model
+        if args.generate:
+            renderer = FrrRenderer(
+                template_dir=args.template_dir,
+                bytecode_cache_dir=args.template_cache_dir,
+                verbose=args.verbose,
+                split_configs=args.split_configs,
+            )
+            if args.output_format == "dir":
+                if not os.path.exists(args.output_dir):
+                    os.mkdir(args.output_dir)
 
-    if model_class:
-        architecture_model = model_class(
-            width=network_details.get("width"),
-            device_interface_count=network_details.get("device_interface_count"),
-            internal_supernet=network_details.get("internal_supernet"),
-            loopback_supernet=network_details.get("loopback_supernet"),
-            external_networks=network_details.get("external_networks"),
-        )
-    else:
-        raise InvalidArchitecture(
-            f"Architecture unsupported: {architecture}. Please choose from: {list(MODEL_INVOCATION_MAP)}"
-        )
+                manifest = RenderManifest(
+                    output_dir=args.output_dir, entries={} if args.force else None
+                )
+                changed_devices = architecture_model.render(
+                    output_dir=args.output_dir,
+                    renderer=renderer,
+                    jobs=args.jobs,
+                    manifest=manifest,
+                )
+                config_bundle = None
+            else:
+                path = archive_path(args.output_dir, args.output_format)
+                with ConfigArchive(
+                    path=path, output_format=args.output_format, force=args.force
+                ) as archive:
+                    changed_devices = architecture_model.render(
+                        output_dir=os.path.dirname(path),
+                        renderer=renderer,
+                        jobs=args.jobs,
+                        archive=archive,
+                    )
+                print(f"\nConfigurations written to {path}")
+                config_bundle = ConfigBundle(path=path)
+            print(
+                f"\n{len(changed_devices)} devices changed: {' '.join(changed_devices)}"
+            )
 
-    # Generate configuration files based on model
-    if args.generate:
-        if not os.path.exists(args.output_dir):
-            os.mkdir(args.output_dir)
+        # Catch addressing and peering mistakes before anything is deployed
+        validator = None
+        if args.validate:
+            validator = FabricValidator(model=architecture_model)
+            validator.validate_model()
+            if args.generate:
+                validator.validate_configs(
+                    config_dir=args.output_dir, config_bundle=config_bundle
+                )
+            validator.report()
 
-        architecture_model.render(output_dir=args.output_dir)
+    metrics.report()
+    if args.metrics_json:
+        metrics.write_json(filename=args.metrics_json)
+    if validator and validator.issues:
+        sys.exit(1)
@@ -0,0 +1,110 @@
+import cProfile
+import io
+import json
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from typing import Dict, Union
+
+
+class Metrics:
+    """This class collects phase timings, counters and gauges for one run
+    Timings and counters accumulate, gauges keep the last value set"""
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, Union[int, float]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + perf_counter() - start
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name: str, value: Union[int, float]) -> None:
+        self.gauges[name] = value
+
+    def clear(self) -> None:
+        self.timings.clear()
+        self.counters.clear()
+        self.gauges.clear()
+
+    def as_dict(self) -> Dict[str, Dict]:
+        return {
+            "timings": dict(self.timings),
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+        }
+
+    def merge(self, snapshot: Dict[str, Dict]) -> None:
+        """Add a snapshot taken with as_dict, eg. one returned by a worker process"""
+        for name, seconds in snapshot["timings"].items():
+            self.timings[name] = self.timings.get(name, 0) + seconds
+        for name, amount in snapshot["counters"].items():
+            self.count(name, amount)
+        self.gauges.update(snapshot["gauges"])
+
+    def write_json(self, filename: str) -> None:
+        with open(filename, "w") as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+
+    def report(self) -> None:
+        print()
+        print("#### Phase Timings ####")
+        for name, seconds in self.timings.items():
+            print(f"{name}: {seconds:.3f}s")
+        for name, amount in self.counters.items():
+            print(f"{name}: {amount}")
+        print()
+
+
+# Module-wide collector shared by models and renderers, each process has its own
+metrics = Metrics()
+
+
+def timed(name: str):
+    """Decorator recording the time spent in a function under the given phase name"""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with metrics.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def profiled(profile_file: str = None, trace_memory: bool = False):
+    """Optionally run the enclosed block under cProfile and/or tracemalloc
+    Profile stats are dumped to profile_file and the peak traced memory is recorded as a gauge"""
+    profiler = cProfile.Profile() if profile_file else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(
+                15
+            )
+            print(output.getvalue())
+        if trace_memory:
+            metrics.set("peak_memory_bytes", tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Dict, Optional
+
+
+# Bump when a model change is not visible in the model sources, eg. a change in pickled state
+MODEL_CACHE_VERSION = 1
+MODEL_SOURCES = ("clos.py", "links.py", "ip_allocator.py", "exceptions.py")
+# Globals a snapshot may reference, anything else is refused when loading
+SNAPSHOT_MODULES = frozenset(
+    ("models.clos", "models.links", "models.ip_allocator", "ipaddress", "array")
+)
+SNAPSHOT_BUILTINS = frozenset(("range", "set", "frozenset", "slice"))
+
+
+def model_cache_key(architecture: str, parameters: Dict) -> str:
+    """Hash the model parameters together with the model version and sources
+    Only top-level keys are sorted, the order of nested values such as external_networks is significant
+    """
+    digest = hashlib.sha256(f"{MODEL_CACHE_VERSION}:{architecture}".encode("utf-8"))
+    normalized = {key: parameters[key] for key in sorted(parameters)}
+    digest.update(json.dumps(normalized, default=str).encode("utf-8"))
+
+    models_dir = os.path.dirname(__file__)
+    for source in MODEL_SOURCES:
+        with open(os.path.join(models_dir, source), "rb") as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+    """This class only resolves the model classes, ip networks and arrays a snapshot is made of
+    Any other global, eg. os.system, raises an UnpicklingError instead of being imported"""
+
+    def find_class(self, module: str, name: str):
+        if module == "builtins" and name in SNAPSHOT_BUILTINS:
+            return super().find_class(module, name)
+        if module in SNAPSHOT_MODULES:
+            value = super().find_class(module, name)
+            if isinstance(value, type) or (module, name) == (
+                "array",
+                "_array_reconstructor",
+            ):
+                return value
+        raise pickle.UnpicklingError(
+            f"{module}.{name} is not allowed in a model snapshot"
+        )
+
+
+class ModelCache:
+    """This class persists built models in a directory, one binary snapshot per cache key
+    A snapshot is only ever reused for the exact parameters and model version it was built from
+    Snapshots are pickles, only point the cache at a directory that other users can not write to.
+    Loading is restricted to the model classes, so a tampered snapshot is discarded rather than run"""
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"model_{key}.pickle")
+
+    def load(self, key: str) -> Optional[object]:
+        """Return the cached model or None if it is missing or unreadable"""
+        try:
+            with open(self.path(key), "rb") as f:
+                return SnapshotUnpickler(f).load()
+        except (OSError, EOFError, AttributeError, ImportError, pickle.PickleError):
+            return None
+
+    def save(self, key: str, model) -> None:
+        """Write the snapshot to a temporary file first so readers never see a partial model"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
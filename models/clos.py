@@ -1,18 +1,138 @@
-from render.frr_render import generate_frr_configs
-from ipaddress import ip_network
-from typing import Dict, List
+from render.frr_render import FrrRenderer, render_devices
+from render.archive import ConfigArchive
+from render.manifest import RenderManifest
 
+# InsufficientIpSubnets used to be defined here and is still importable from models.clos
+from models.exceptions import (
+    InsufficientInterfaces,
+    InsufficientIpSubnets,
+    InvalidArchitecture,
+)
+from models.ip_allocator import LazyPrefix, SubnetAllocator
+from instrumentation.metrics import metrics, timed
+from models.links import Link, LinkTable
+from abc import ABC, ABCMeta, abstractmethod
+from ipaddress import collapse_addresses, ip_network
+from typing import Dict, List, Optional, Sequence, Tuple
+import warnings
 
-class InsufficientIpSubnets(Exception):
-    """This exception is raised when subnets have been exhausted from a given supernet"""
 
+class InterfaceTable:
+    """This class stores a Device's per-port fields as columns instead of one object per port
+    The loopback is stored as the last row, InterfaceView objects are created on access"""
 
-class InvalidArchitecture(Exception):
-    """This exception is raised when an unsupported architecture is defined in an input YAML"""
+    __slots__ = ("ip_address", "description", "allocated", "ospf_enabled")
 
+    def __init__(self, interface_count: int) -> None:
+        rows = interface_count + 1
+        self.ip_address: List = [""] * rows
+        self.description: List[str] = [""] * rows
+        self.allocated = bytearray(rows)
+        self.ospf_enabled = bytearray(rows)
 
-class Interface:
-    """This class represents an interface on a nework device"""
+    def __len__(self) -> int:
+        return len(self.allocated)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [InterfaceView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("interface index out of range")
+
+        return InterfaceView(self, index)
+
+    def __iter__(self):
+        return (InterfaceView(self, index) for index in range(len(self)))
+
+    def index_of(self, name: str) -> int:
+        """Return the row of an interface name, raise KeyError for names that are not on the device"""
+        if name == "lo":
+            return len(self) - 1
+        port = name[3:]
+        if name.startswith("eth") and port.isdecimal() and int(port) < len(self) - 1:
+            return int(port)
+
+        raise KeyError(name)
+
+    def allocated_rows(self):
+        """Yield views for allocated interfaces only, skipping untouched ports"""
+        index = self.allocated.find(1)
+        while index != -1:
+            yield InterfaceView(self, index)
+            index = self.allocated.find(1, index + 1)
+
+
+class InterfaceView:
+    """This class is a lightweight view of one row in an InterfaceTable
+    It exposes an interface's attributes, writes go straight to the table"""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: InterfaceTable, index: int) -> None:
+        self._table = table
+        self._index = index
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, InterfaceView)
+            and self._table is other._table
+            and self._index == other._index
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self._table), self._index))
+
+    @property
+    def interface(self) -> str:
+        if self._index == len(self._table) - 1:
+            return "lo"
+
+        return f"eth{self._index}"
+
+    @property
+    def port(self) -> int:
+        return self._index
+
+    @property
+    def ip_address(self):
+        return self._table.ip_address[self._index]
+
+    @ip_address.setter
+    def ip_address(self, value) -> None:
+        self._table.ip_address[self._index] = value
+
+    @property
+    def description(self) -> str:
+        return self._table.description[self._index]
+
+    @description.setter
+    def description(self, value: str) -> None:
+        self._table.description[self._index] = value
+
+    @property
+    def allocated(self) -> bool:
+        return bool(self._table.allocated[self._index])
+
+    @allocated.setter
+    def allocated(self, value: bool) -> None:
+        self._table.allocated[self._index] = bool(value)
+
+    @property
+    def ospf_enabled(self) -> bool:
+        return bool(self._table.ospf_enabled[self._index])
+
+    @ospf_enabled.setter
+    def ospf_enabled(self, value: bool) -> None:
+        self._table.ospf_enabled[self._index] = bool(value)
+
+
+class Interface(metaclass=ABCMeta):
+    """Deprecated, devices store interfaces in an InterfaceTable and hand out InterfaceView objects
+    Kept for one release so existing constructors and isinstance checks keep working"""
+
+    __slots__ = ("interface", "ip_address", "description", "allocated", "ospf_enabled")
 
     def __init__(
         self,
@@ -21,6 +141,11 @@ class Interface:
         description: str = "",
         allocated: bool = False,
     ) -> None:
+        warnings.warn(
+            "Interface is deprecated, use Device.get_interface() or InterfaceView",
+            DeprecationWarning,
+            stacklevel=2,
+        )
         self.interface = interface
         self.ip_address = ip_address
         self.description = description
@@ -28,54 +153,201 @@ class Interface:
         self.ospf_enabled = False
 
 
+Interface.register(InterfaceView)
+
+
+def parse_port_range(port_range: str) -> List[int]:
+    """Expand a port range expression into interface indexes
+    Eg. "eth0-3,eth8" returns [0, 1, 2, 3, 8]"""
+    ports = []
+    for block in str(port_range).split(","):
+        start, _, end = block.strip().replace("eth", "").partition("-")
+        ports.extend(range(int(start), int(end or start) + 1))
+
+    return ports
+
+
+def resolve_port_map(
+    interface_count: int, port_map: Dict[str, str], hostname: str = ""
+) -> Dict[str, Sequence[int]]:
+    """Return the northbound and southbound interface indexes for a device
+    By default the first half of the interfaces are northbound and the second half southbound"""
+    midpoint = interface_count // 2
+    default_ports = {
+        "northbound": range(0, midpoint),
+        "southbound": range(midpoint, interface_count),
+    }
+
+    resolved = {}
+    for direction, ports in default_ports.items():
+        if isinstance(port_map.get(direction), range):
+            ports = port_map[direction]
+        elif direction in port_map:
+            ports = parse_port_range(port_map[direction])
+        if any(port >= interface_count for port in ports):
+            raise ValueError(
+                f"{direction} ports {port_map[direction]} exceed interface count on {hostname}"
+            )
+        resolved[direction] = ports
+
+    overlap = set(resolved["northbound"]) & set(resolved["southbound"])
+    if overlap:
+        raise ValueError(
+            f"Ports {sorted(overlap)} are both northbound and southbound on {hostname}"
+        )
+
+    return resolved
+
+
+class PortPool:
+    """This class hands out interface indexes for one direction of a Device in constant time
+    Ports are allocated in order, released ports are reused before the cursor advances"""
+
+    __slots__ = ("ports", "__members", "__cursor", "__released")
+
+    def __init__(self, ports: List[int]) -> None:
+        self.ports = ports
+        self.__members = ports if isinstance(ports, range) else set(ports)
+        self.__cursor = 0
+        self.__released: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+    def __contains__(self, port: int) -> bool:
+        return port in self.__members
+
+    @property
+    def available(self) -> int:
+        return len(self.ports) - self.__cursor + len(self.__released)
+
+    def allocate(self) -> Optional[int]:
+        if self.__released:
+            return self.__released.pop()
+        if self.__cursor < len(self.ports):
+            self.__cursor += 1
+            return self.ports[self.__cursor - 1]
+
+        return None
+
+    def release(self, port: int) -> None:
+        self.__released.append(port)
+
+
 class Device:
     """This class represents a network router with interfaces and routing protocol attributes"""
 
-    def __init__(self, hostname: str, interface_count: int, loopback: str) -> None:
+    __slots__ = (
+        "hostname",
+        "router_id",
+        "interface_count",
+        "interfaces",
+        "ports",
+        "ospf",
+        "bgp",
+    )
+
+    def __init__(
+        self,
+        hostname: str,
+        interface_count: int,
+        loopback: LazyPrefix,
+        port_map: Dict[str, str] = None,
+    ) -> None:
         self.hostname = hostname
-        self.router_id = str(loopback.hosts()[0])
+        self.router_id = loopback.address
         self.interface_count = interface_count
-        self.__interface_names = [f"eth{i}" for i in range(interface_count)]
-        self.interfaces = [
-            Interface(interface=interface) for interface in self.__interface_names
-        ]
-        self.interfaces.append(
-            Interface(
-                interface="lo",
-                ip_address=loopback,
-                allocated=True,
-                description="loopback used for RID",
-            )
-        )
+        self.interfaces = InterfaceTable(interface_count=interface_count)
+
+        loopback_interface = self.interfaces[-1]
+        loopback_interface.ip_address = loopback
+        loopback_interface.allocated = True
+        loopback_interface.description = "loopback used for RID"
+
+        self.ports: Dict[str, PortPool] = self.build_port_pools(port_map or {})
         self.ospf = OspfInstance(instance_id=0, networks=[loopback])
         self.bgp = BgpInstance(asn=65000, neighbors=[], networks=[])
 
+    def build_port_pools(self, port_map: Dict[str, str]) -> Dict[str, PortPool]:
+        """Build northbound and southbound port pools"""
+        return {
+            direction: PortPool(ports=ports)
+            for direction, ports in resolve_port_map(
+                interface_count=self.interface_count,
+                port_map=port_map,
+                hostname=self.hostname,
+            ).items()
+        }
+
     @property
-    def northbound_interfaces(self) -> List[Interface]:
+    def northbound_interfaces(self) -> List[InterfaceView]:
         """Northbound interfaces are used for upstream connectivity
         Eg. On a T1 device, the first half of its interfaces are used for T2 connections"""
-        end_index = self.interface_count // 2
-        return self.interfaces[:end_index]
+        return [self.interfaces[port] for port in self.ports["northbound"].ports]
 
     @property
-    def southbound_interfaces(self) -> List[Interface]:
+    def southbound_interfaces(self) -> List[InterfaceView]:
         """Southbound interfaces are used for downstream connectivity
         Eg. On a T1 device, the second half of its interfaces are used for client connections"""
-        start_index = self.interface_count // 2
-        return self.interfaces[start_index : self.interface_count]
+        return [self.interfaces[port] for port in self.ports["southbound"].ports]
 
-    def next_available_interface(self, interfaces: List[Interface]) -> Interface:
-        """Iterate through each interface until an unallocated interface is found
-        Set allocated to True and return Interface object"""
-        for interface in interfaces:
-            if not interface.allocated:
-                interface.allocated = True
-                return interface
+    @property
+    def allocated_interfaces(self) -> List[InterfaceView]:
+        return list(self.interfaces.allocated_rows())
+
+    def get_interface(self, name: str) -> InterfaceView:
+        """Look up an interface by name, eg. eth3 or lo
+        Raise KeyError for names that are not on the device"""
+        return self.interfaces[self.interfaces.index_of(name)]
+
+    def allocate_interface(self, direction: str) -> InterfaceView:
+        """Take the next free port from the northbound or southbound pool
+        Set allocated to True and return its InterfaceView"""
+        port = self.ports[direction].allocate()
+        if port is None:
+            raise InsufficientInterfaces(
+                f"Could not allocate a {direction} interface on {self.hostname}"
+            )
+
+        interface = self.interfaces[port]
+        interface.allocated = True
+        return interface
+
+    def next_available_interface(
+        self, interfaces: List[InterfaceView]
+    ) -> InterfaceView:
+        """Allocate from the pool of the given northbound_interfaces or southbound_interfaces
+        Kept for existing callers, see allocate_interface"""
+        for direction, pool in self.ports.items():
+            if interfaces and interfaces[0].port in pool:
+                return self.allocate_interface(direction=direction)
+
+        raise InsufficientInterfaces(
+            f"Could not allocate an interface on {self.hostname}"
+        )
+
+    def release_interface(self, name: str) -> None:
+        """Return an interface to its pool and clear its allocation
+        The loopback holds the router ID and is never released"""
+        port = self.interfaces.index_of(name)
+        if not any(port in pool for pool in self.ports.values()):
+            raise ValueError(f"{name} is not a port of {self.hostname}")
+        interface = self.interfaces[port]
+        for pool in self.ports.values():
+            if interface.allocated and port in pool:
+                pool.release(port)
+
+        interface.allocated = False
+        interface.ip_address = ""
+        interface.description = ""
+        interface.ospf_enabled = False
 
 
 class StaticRoute:
     """This class represents a static route that can be added to a Device"""
 
+    __slots__ = ("cidr", "next_hop", "description")
+
     def __init__(self, cidr: str, next_hop: str, description: str) -> None:
         self.cidr = cidr
         self.next_hop = next_hop
@@ -86,18 +358,143 @@ class OspfInstance:
     """This class represents an OSPF instance
     Each network and its corresponding area ID will be added to the OSPF LSDB"""
 
+    __slots__ = ("instance_id", "networks")
+
     def __init__(self, instance_id: int, networks: List[str]) -> None:
         self.instance_id = instance_id
         self.networks = networks
 
 
+class BgpPeerGroup:
+    """This class represents a BGP peer group and the policy applied to its members
+    remote_as defaults to the device's own ASN, listen_ranges accept dynamic neighbors"""
+
+    __slots__ = (
+        "name",
+        "description",
+        "route_reflector_client",
+        "export_prefix_list",
+        "remote_as",
+        "update_source",
+        "listen_ranges",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        route_reflector_client: bool = False,
+        export_prefix_list: str = "ANY",
+        remote_as: Optional[str] = None,
+        update_source: Optional[str] = "lo",
+        listen_ranges: Sequence[str] = (),
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.route_reflector_client = route_reflector_client
+        self.export_prefix_list = export_prefix_list
+        self.remote_as = remote_as
+        self.update_source = update_source
+        self.listen_ranges = tuple(listen_ranges)
+
+
 class BgpInstance:
     """This class represents a BGP routing instance on a network Device"""
 
-    def __init__(self, asn: int, neighbors: List[dict], networks: List[str]) -> None:
+    __slots__ = (
+        "asn",
+        "neighbors",
+        "networks",
+        "peer_groups",
+        "aggregated_networks",
+        "dynamic_peers",
+    )
+
+    def __init__(
+        self,
+        asn: int,
+        neighbors: List[dict],
+        networks: List[str],
+        peer_groups: List[BgpPeerGroup] = None,
+    ) -> None:
         self.asn = asn
         self.neighbors = neighbors
         self.networks = networks
+        self.peer_groups = peer_groups or []
+        self.aggregated_networks: Optional[List[str]] = None
+        # Neighbors accepted through a peer group's listen range, not listed in neighbors
+        self.dynamic_peers = 0
+
+    @property
+    def export_networks(self) -> List[str]:
+        """Networks matched by the EXTERNAL-NETWORKS prefix-list, aggregated if enabled"""
+        if self.aggregated_networks is not None:
+            return self.aggregated_networks
+
+        return self.networks
+
+    @property
+    def session_count(self) -> int:
+        return len(self.neighbors) + self.dynamic_peers
+
+    def add_peers(self, peer_group: BgpPeerGroup, devices: List["Device"]) -> None:
+        """Add a peer group and a neighbor in it for every device's loopback"""
+        self.add_peer_addresses(
+            peer_group=peer_group, addresses=[device.router_id for device in devices]
+        )
+
+    def add_peer_addresses(
+        self, peer_group: BgpPeerGroup, addresses: Sequence[str]
+    ) -> None:
+        self.peer_groups.append(peer_group)
+        for address in addresses:
+            self.neighbors.append(
+                {"ip_address": address, "peer_group": peer_group.name}
+            )
+
+    def add_interface_peers(
+        self, peer_group: BgpPeerGroup, interfaces: Sequence[str]
+    ) -> None:
+        """Add a peer group and an unnumbered neighbor on every interface"""
+        self.peer_groups.append(peer_group)
+        for interface in interfaces:
+            self.neighbors.append(
+                {"interface": interface, "peer_group": peer_group.name}
+            )
+
+    def add_dynamic_peers(self, peer_group: BgpPeerGroup, count: int) -> None:
+        """Add a peer group whose count members connect from its listen range"""
+        self.peer_groups.append(peer_group)
+        self.dynamic_peers += count
+
+
+# Peer groups are shared by every device using them, they are never modified after creation
+T1_CLIENTS = BgpPeerGroup(
+    name="T1", description="T1 Route-Reflector Clients", route_reflector_client=True
+)
+T2_CLIENTS = BgpPeerGroup(
+    name="T2", description="T2 Route-Reflector Clients", route_reflector_client=True
+)
+T2_PEERS = BgpPeerGroup(
+    name="T2",
+    description="T2 Route-Reflector Peers",
+    export_prefix_list="EXTERNAL-NETWORKS",
+)
+T3_PEERS = BgpPeerGroup(name="T3", description="T3 Route-Reflector Peers")
+T1_EBGP_PEERS = BgpPeerGroup(
+    name="T1", description="T1 eBGP Peers", remote_as="external", update_source=None
+)
+T2_EBGP_PEERS = BgpPeerGroup(
+    name="T2",
+    description="T2 eBGP Peers",
+    export_prefix_list="EXTERNAL-NETWORKS",
+    remote_as="external",
+    update_source=None,
+)
+
+BGP_PEERING_MODES = ("full_mesh", "dynamic", "ebgp_unnumbered")
+# With eBGP, t2 devices keep the default ASN and every t1 device gets its own private 4-byte ASN
+EBGP_T1_ASN_BASE = 4200000000
 
 
 class ClosTier:
@@ -108,39 +505,264 @@ class ClosTier:
         tier_number: int,
         width: int,
         device_interface_count: int,
-        loopback_subnets: List,
+        loopback_allocator: SubnetAllocator,
+        port_map: Dict[str, str] = None,
+        group: str = None,
     ) -> None:
         self.width = width
+        name_prefix = (
+            f"t{str(tier_number)}-{group}" if group else f"t{str(tier_number)}"
+        )
         self.__device_names: List[str] = [
-            f"t{str(tier_number)}-r{i}" for i in range(1, width + 1)
+            f"{name_prefix}-r{i}" for i in range(1, width + 1)
         ]
-        self.__loopback_subnets = loopback_subnets
+        self.__loopback_allocator = loopback_allocator
         self.device_interface_count = device_interface_count
+        self.port_map = port_map
         self.devices: List[Device] = self.initialize_devices()
 
+    @timed("model.initialize_devices")
     def initialize_devices(self) -> List[Device]:
+        """Allocate the loopbacks of the whole tier in one block"""
+        loopbacks = self.__loopback_allocator.allocate_block(len(self.__device_names))
         devices = []
-        for hostname in self.__device_names:
-            loopback_ip = self.allocate_loopback()
-
+        for hostname, loopback in zip(self.__device_names, loopbacks):
             devices.append(
                 Device(
                     hostname=hostname,
                     interface_count=self.device_interface_count,
-                    loopback=loopback_ip,
+                    loopback=self.__loopback_allocator.prefix(loopback),
+                    port_map=self.port_map,
                 )
             )
 
         return devices
 
-    def allocate_loopback(self):
-        try:
-            return self.__loopback_subnets.pop(0)
-        except:
-            raise InsufficientIpSubnets("Could not allocate all loopback IPs required")
 
+def configure_link_interface(
+    device: Device,
+    interface: InterfaceView,
+    peer_hostname: str,
+    peer_interface: str,
+    subnet: LazyPrefix,
+    host_index: int,
+) -> None:
+    """Configure one end of a PTP link and advertise its subnet in OSPF"""
+    # Update interface description
+    interface.description = (
+        f"{device.hostname} {interface.interface} -- {peer_interface} {peer_hostname}"
+    )
+
+    # Update IP address on interface
+    interface.ip_address = subnet.host(host_index)
+
+    # Trigger interface-level OSPF settings
+    interface.ospf_enabled = True
 
-class TwoTierClos:
+    # Advertise PTP subnet in OSPF
+    device.ospf.networks.append(subnet)
+
+
+def aggregate_networks(networks: Sequence[str]) -> List[str]:
+    """Collapse adjacent and overlapping networks, eg. 192.168.0.0/24 and 192.168.1.0/24 become 192.168.0.0/23
+    IPv4 networks are returned before IPv6 networks, each family in ascending order"""
+    parsed = [ip_network(network, strict=False) for network in networks]
+    aggregated = []
+    for version in (4, 6):
+        aggregated.extend(
+            collapse_addresses(
+                network for network in parsed if network.version == version
+            )
+        )
+
+    return [str(network) for network in aggregated]
+
+
+def index_external_networks(external_networks: Dict) -> Dict[str, List[str]]:
+    """Invert the network -> hostnames mapping of the input YAML into hostname -> networks
+    Each device's networks keep the order they are listed in the input"""
+    index: Dict[str, List[str]] = {}
+    for network, hostnames in external_networks.items():
+        for hostname in dict.fromkeys(hostnames):
+            index.setdefault(hostname, []).append(network)
+
+    return index
+
+
+class ClosArchitecture(ABC):
+    """This class holds the behaviour shared by all Clos models
+    Subclasses build their tiers and call connect_devices for every internal link"""
+
+    def __init__(
+        self,
+        internal_supernet: str,
+        loopback_supernet: str,
+        external_networks: Dict = None,
+        reserved_internal_subnets: List[str] = None,
+        reserved_loopbacks: List[str] = None,
+        aggregate_external_networks: bool = False,
+    ) -> None:
+        self.links = LinkTable()
+        self.internal_subnets = SubnetAllocator(
+            supernet=internal_supernet,
+            new_prefix=31,
+            reserved=reserved_internal_subnets,
+            description="PTP subnets",
+        )
+        self.loopbacks = SubnetAllocator(
+            supernet=loopback_supernet,
+            new_prefix=32,
+            reserved=reserved_loopbacks,
+            description="loopback IPs",
+        )
+        self.external_networks = external_networks or {}
+        self.external_networks_index = index_external_networks(self.external_networks)
+        self.aggregate_external_networks = aggregate_external_networks
+
+    @property
+    @abstractmethod
+    def devices(self) -> List[Device]:
+        """Every device of the fabric"""
+
+    @property
+    @abstractmethod
+    def device_count(self) -> int:
+        """Number of devices, known without building them"""
+
+    @property
+    @abstractmethod
+    def edge_devices(self) -> List[Device]:
+        """Devices that may advertise external networks"""
+
+    @property
+    def connections(self) -> int:
+        """Number of internal links"""
+        return len(self.links)
+
+    @property
+    def unused_internal_subnets(self) -> int:
+        return self.internal_subnets.remaining
+
+    @property
+    def unused_loopbacks(self) -> int:
+        return self.loopbacks.remaining
+
+    def record_statistics(self) -> None:
+        """Publish the architecture stats as gauges so they end up in the run's metrics"""
+        metrics.set("model.devices", self.device_count)
+        metrics.set("model.connections", self.connections)
+        metrics.set("model.unused_internal_subnets", self.unused_internal_subnets)
+        metrics.set("model.unused_loopbacks", self.unused_loopbacks)
+
+    def allocate_ptp_subnet(self) -> LazyPrefix:
+        return self.internal_subnets.prefix(self.internal_subnets.allocate_block(1)[0])
+
+    def connect_device_pairs(self, pairs: Sequence[Tuple[Device, Device]]) -> None:
+        """Connect every (upper_device, lower_device) pair in order
+        The PTP subnets of all pairs are allocated as one block of integers"""
+        first_index = self.internal_subnets.allocated
+        subnets = self.internal_subnets.allocate_block(len(pairs))
+        for offset, (upper_device, lower_device) in enumerate(pairs):
+            self.connect_devices(
+                upper_device=upper_device,
+                lower_device=lower_device,
+                connection_subnet=self.internal_subnets.prefix(subnets[offset]),
+                subnet_index=first_index + offset,
+            )
+
+    def connect_devices(
+        self,
+        upper_device: Device,
+        lower_device: Device,
+        connection_subnet: LazyPrefix = None,
+        subnet_index: int = None,
+    ) -> None:
+        """Connect a southbound port on upper_device to a northbound port on lower_device
+        The next available PTP subnet is used unless one is passed with its allocator position"""
+        # Allocate next availbe interface on both devices
+        upper_interface = upper_device.allocate_interface(direction="southbound")
+        lower_interface = lower_device.allocate_interface(direction="northbound")
+
+        # Fetch next available PTP subnet
+        if connection_subnet is None:
+            subnet_index = self.internal_subnets.allocated
+            connection_subnet = self.allocate_ptp_subnet()
+
+        # The upper device takes the first address of the PTP subnet
+        configure_link_interface(
+            device=upper_device,
+            interface=upper_interface,
+            peer_hostname=lower_device.hostname,
+            peer_interface=lower_interface.interface,
+            subnet=connection_subnet,
+            host_index=0,
+        )
+        configure_link_interface(
+            device=lower_device,
+            interface=lower_interface,
+            peer_hostname=upper_device.hostname,
+            peer_interface=upper_interface.interface,
+            subnet=connection_subnet,
+            host_index=1,
+        )
+
+        # Record the link so it can be looked up without parsing descriptions
+        self.links.add(
+            device_a=upper_device.hostname,
+            port_a=upper_interface.port,
+            device_b=lower_device.hostname,
+            port_b=lower_interface.port,
+            subnet_index=subnet_index,
+        )
+
+    def peer_of(self, hostname: str, interface: str) -> Optional[Tuple[str, str]]:
+        """Return the hostname and interface on the other side of a device's interface
+        Eg. peer_of("t2-r5", "eth17") returns ("t1-r2", "eth4")"""
+        if not (interface.startswith("eth") and interface[3:].isdecimal()):
+            return None
+
+        peer = self.links.peer(hostname, int(interface[3:]))
+        if peer is None:
+            return None
+
+        return peer[0], f"eth{peer[1]}"
+
+    def link_subnet(self, link: Link):
+        return self.internal_subnets.network_at(link.subnet_index)
+
+    @timed("model.add_external_networks")
+    def add_external_networks(self):
+        for device in self.edge_devices:
+            self.add_device_external_networks(device)
+
+    def add_device_external_networks(self, device: Device) -> None:
+        networks = self.external_networks_index.get(device.hostname)
+        if not networks:
+            return
+
+        device.bgp.networks.extend(networks)
+        if self.aggregate_external_networks:
+            device.bgp.aggregated_networks = aggregate_networks(device.bgp.networks)
+
+    def render(
+        self,
+        output_dir: str,
+        renderer: FrrRenderer = None,
+        jobs: int = 1,
+        manifest: RenderManifest = None,
+        archive: ConfigArchive = None,
+    ) -> List[str]:
+        return render_devices(
+            devices=self.devices,
+            output_dir=output_dir,
+            renderer=renderer or FrrRenderer(),
+            jobs=jobs,
+            manifest=manifest,
+            archive=archive,
+        )
+
+
+class TwoTierClos(ClosArchitecture):
     """This class represents a Clos architecture with t1 and t2 layers"""
 
     def __init__(
@@ -149,105 +771,396 @@ class TwoTierClos:
         device_interface_count: int,
         internal_supernet: str,
         loopback_supernet: str,
-        external_networks: Dict,
+        external_networks: Dict = None,
+        reserved_internal_subnets: List[str] = None,
+        reserved_loopbacks: List[str] = None,
+        port_map: Dict[str, Dict[str, str]] = None,
+        aggregate_external_networks: bool = False,
+        bgp_peering: str = "full_mesh",
+        route_reflectors: int = None,
     ) -> None:
-        self.connections: int = 0
-        self.width = width
-        self.internal_subnets = list(
-            ip_network(internal_supernet).subnets(new_prefix=31)
+        super().__init__(
+            internal_supernet=internal_supernet,
+            loopback_supernet=loopback_supernet,
+            external_networks=external_networks,
+            reserved_internal_subnets=reserved_internal_subnets,
+            reserved_loopbacks=reserved_loopbacks,
+            aggregate_external_networks=aggregate_external_networks,
         )
-        self.loopbacks = list(ip_network(loopback_supernet).subnets(new_prefix=32))
+        self.width = width
+        self.device_interface_count = device_interface_count
+        self.port_map = port_map = port_map or {}
+        self.set_bgp_peering(bgp_peering=bgp_peering, route_reflectors=route_reflectors)
         self.t1 = ClosTier(
             tier_number=1,
             width=width,
             device_interface_count=device_interface_count,
-            loopback_subnets=self.loopbacks,
+            loopback_allocator=self.loopbacks,
+            port_map=port_map.get("t1"),
         )
         self.t2 = ClosTier(
             tier_number=2,
             width=width,
             device_interface_count=device_interface_count,
-            loopback_subnets=self.loopbacks,
+            loopback_allocator=self.loopbacks,
+            port_map=port_map.get("t2"),
         )
-        self.external_networks = external_networks
         self.add_internal_connections()
         self.add_bgp_peers()
         self.add_external_networks()
         self.show_architecture_statistics()
 
+    @property
+    def devices(self) -> List[Device]:
+        return self.t1.devices + self.t2.devices
+
+    @property
+    def edge_devices(self) -> List[Device]:
+        return self.t1.devices
+
+    @property
+    def device_count(self) -> int:
+        return self.width * 2
+
+    @property
+    def bgp_sessions(self) -> int:
+        if self.bgp_peering == "ebgp_unnumbered":
+            return self.width * self.width
+
+        return self.width * self.route_reflectors
+
+    def set_bgp_peering(self, bgp_peering: str, route_reflectors: int = None) -> None:
+        """Validate the BGP peering mode and how many t2 devices act as route reflectors
+        route_reflectors only applies to iBGP modes and defaults to every t2 device"""
+        if bgp_peering not in BGP_PEERING_MODES:
+            raise InvalidArchitecture(
+                f"BGP peering unsupported: {bgp_peering}. Please choose from: {list(BGP_PEERING_MODES)}"
+            )
+        if route_reflectors is not None:
+            if bgp_peering == "ebgp_unnumbered":
+                raise InvalidArchitecture(
+                    "route_reflectors cannot be used with ebgp_unnumbered peering"
+                )
+            if not 1 <= route_reflectors <= self.width:
+                raise InvalidArchitecture(
+                    f"route_reflectors must be between 1 and the Clos width {self.width}"
+                )
+
+        self.bgp_peering = bgp_peering
+        self.route_reflectors = route_reflectors or self.width
+        self.t1_dynamic_clients: Optional[BgpPeerGroup] = None
+        if bgp_peering != "dynamic":
+            return
+
+        # Dynamic neighbors are only accepted from t1 loopbacks, the first width positions
+        t1_loopbacks = (
+            ip_network(str(self.loopbacks.prefix_at(position)))
+            for position in range(self.width)
+        )
+        self.t1_dynamic_clients = BgpPeerGroup(
+            name="T1",
+            description="T1 Route-Reflector Clients",
+            route_reflector_client=True,
+            listen_ranges=[
+                str(network) for network in collapse_addresses(t1_loopbacks)
+            ],
+        )
+
+    def add_device_bgp_peers(
+        self, device: Device, tier: int, index: int, peer_router_ids: Sequence[str]
+    ) -> None:
+        """Peer the index-th device of a tier with the other tier according to the BGP peering mode
+        peer_router_ids lists the loopbacks of the other tier, in device order"""
+        if self.bgp_peering == "ebgp_unnumbered":
+            if tier == 1:
+                device.bgp.asn = EBGP_T1_ASN_BASE + index + 1
+            # Sessions run over the links facing the other tier
+            fabric_ports = device.ports["northbound" if tier == 1 else "southbound"]
+            device.bgp.add_interface_peers(
+                peer_group=T2_EBGP_PEERS if tier == 1 else T1_EBGP_PEERS,
+                interfaces=[
+                    interface.interface
+                    for interface in device.allocated_interfaces
+                    if interface.port in fabric_ports
+                ],
+            )
+        elif tier == 1:
+            # Leaves only peer with the route reflectors
+            device.bgp.add_peer_addresses(
+                peer_group=T2_PEERS,
+                addresses=peer_router_ids[: self.route_reflectors],
+            )
+        elif index >= self.route_reflectors:
+            # Spines that are not route reflectors forward on the OSPF underlay only, without a BGP stanza
+            return
+        elif self.bgp_peering == "dynamic":
+            device.bgp.add_dynamic_peers(
+                peer_group=self.t1_dynamic_clients, count=len(peer_router_ids)
+            )
+        else:
+            device.bgp.add_peer_addresses(
+                peer_group=T1_CLIENTS, addresses=peer_router_ids
+            )
+
+    def tier_ports(self, tier: str) -> Dict[str, Sequence[int]]:
+        return resolve_port_map(
+            interface_count=self.device_interface_count,
+            port_map=self.port_map.get(tier) or {},
+        )
+
+    def record_statistics(self) -> None:
+        super().record_statistics()
+        metrics.set("model.bgp_sessions", self.bgp_sessions)
+
     def show_architecture_statistics(self):
+        self.record_statistics()
         print()
-        print(f"#### Architecture Stats ####")
+        print("#### Architecture Stats ####")
         print(f"Clos Width: {self.width}")
         print(f"Total Internal Connections: {self.connections}")
-        print(f"Total Unused Internal Subnets: {len(self.internal_subnets)}")
-        print(f"Total Unused Loopbacks: {len(self.loopbacks)}")
+        print(f"Total Unused Internal Subnets: {self.unused_internal_subnets}")
+        print(f"Total Unused Loopbacks: {self.unused_loopbacks}")
         print(
-            f"Total Client Facing Ports: {len(self.t1.devices[0].southbound_interfaces) * self.width // 2}"
+            f"Total Client Facing Ports: {len(self.tier_ports('t1')['southbound']) * self.width // 2}"
         )
+        print(f"BGP Sessions: {self.bgp_sessions} ({self.bgp_peering})")
         print()
 
-    def allocate_ptp_subnet(self):
-        try:
-            return self.internal_subnets.pop(0)
-        except Exception:
-            raise InsufficientIpSubnets("Could not allocate all PTP subnets required")
-
+    @timed("model.add_internal_connections")
     def add_internal_connections(self) -> None:
         """Connects all t1 devices to all t2 devices"""
 
-        for t2_device in self.t2.devices:
-            for t1_device in self.t1.devices:
-                # Allocate next availbe interface on t1 and t2 devices
-                t2_interface = t2_device.next_available_interface(
-                    interfaces=t2_device.southbound_interfaces
-                )
-                t1_interface = t1_device.next_available_interface(
-                    interfaces=t1_device.northbound_interfaces
+        self.connect_device_pairs(
+            [
+                (t2_device, t1_device)
+                for t2_device in self.t2.devices
+                for t1_device in self.t1.devices
+            ]
+        )
+
+    @timed("model.add_bgp_peers")
+    def add_bgp_peers(self) -> None:
+        t1_router_ids = [device.router_id for device in self.t1.devices]
+        t2_router_ids = [device.router_id for device in self.t2.devices]
+
+        # Update T1 devices' BGP instances
+        for index, device in enumerate(self.t1.devices):
+            self.add_device_bgp_peers(
+                device=device, tier=1, index=index, peer_router_ids=t2_router_ids
+            )
+
+        # Update T2 devices' BGP instances
+        for index, device in enumerate(self.t2.devices):
+            self.add_device_bgp_peers(
+                device=device, tier=2, index=index, peer_router_ids=t1_router_ids
+            )
+
+
+class ClosPod:
+    """This class represents a pod of t1 leaves fully meshed with t2 spines"""
+
+    def __init__(self, name: str, t1: ClosTier, t2: ClosTier) -> None:
+        self.name = name
+        self.t1 = t1
+        self.t2 = t2
+
+
+class ThreeTierClos(ClosArchitecture):
+    """This class represents a multi-stage Clos architecture with pods and super-spines
+    Each pod meshes its t1 leaves with its t2 spines, spine N of every pod belongs to spine plane N
+    and connects to every t3 super-spine in that plane, so link count grows linearly with pods"""
+
+    def __init__(
+        self,
+        pods: int,
+        leaves_per_pod: int,
+        spines_per_pod: int,
+        super_spines_per_plane: int,
+        device_interface_count: int,
+        internal_supernet: str,
+        loopback_supernet: str,
+        external_networks: Dict = None,
+        reserved_internal_subnets: List[str] = None,
+        reserved_loopbacks: List[str] = None,
+        leaf_oversubscription: float = None,
+        aggregate_external_networks: bool = False,
+    ) -> None:
+        super().__init__(
+            internal_supernet=internal_supernet,
+            loopback_supernet=loopback_supernet,
+            external_networks=external_networks,
+            reserved_internal_subnets=reserved_internal_subnets,
+            reserved_loopbacks=reserved_loopbacks,
+            aggregate_external_networks=aggregate_external_networks,
+        )
+        self.pod_count = pods
+        self.leaves_per_pod = leaves_per_pod
+        self.spines_per_pod = spines_per_pod
+        self.super_spines_per_plane = super_spines_per_plane
+        self.device_interface_count = device_interface_count
+        self.leaf_client_ports = self.validate_port_budget(leaf_oversubscription)
+
+        port_maps = self.tier_port_maps()
+        self.pods: List[ClosPod] = [
+            ClosPod(
+                name=f"p{pod}",
+                t1=ClosTier(
+                    tier_number=1,
+                    width=leaves_per_pod,
+                    device_interface_count=device_interface_count,
+                    loopback_allocator=self.loopbacks,
+                    port_map=port_maps["t1"],
+                    group=f"p{pod}",
+                ),
+                t2=ClosTier(
+                    tier_number=2,
+                    width=spines_per_pod,
+                    device_interface_count=device_interface_count,
+                    loopback_allocator=self.loopbacks,
+                    port_map=port_maps["t2"],
+                    group=f"p{pod}",
+                ),
+            )
+            for pod in range(1, pods + 1)
+        ]
+        self.planes: List[ClosTier] = [
+            ClosTier(
+                tier_number=3,
+                width=super_spines_per_plane,
+                device_interface_count=device_interface_count,
+                loopback_allocator=self.loopbacks,
+                port_map=port_maps["t3"],
+                group=f"s{plane}",
+            )
+            for plane in range(1, spines_per_pod + 1)
+        ]
+        self.add_internal_connections()
+        self.add_bgp_peers()
+        self.add_external_networks()
+        self.show_architecture_statistics()
+
+    def validate_port_budget(self, leaf_oversubscription: float = None) -> int:
+        """Check every tier has enough ports for its fan-out
+        Return the number of client facing ports on each leaf"""
+        available_client_ports = self.device_interface_count - self.spines_per_pod
+        leaf_client_ports = available_client_ports
+        if leaf_oversubscription:
+            leaf_client_ports = int(self.spines_per_pod * leaf_oversubscription)
+
+        requirements = {
+            "t1 leaf": self.spines_per_pod + leaf_client_ports,
+            "t2 spine": self.leaves_per_pod + self.super_spines_per_plane,
+            "t3 super-spine": self.pod_count,
+        }
+        for tier, required_ports in requirements.items():
+            if required_ports > self.device_interface_count:
+                raise InvalidArchitecture(
+                    f"Each {tier} needs {required_ports} ports but devices only have {self.device_interface_count}"
                 )
 
-                # Update interface descriptions
-                t2_interface.description = f"{t2_device.hostname} {t2_interface.interface} -- {t1_interface.interface} {t1_device.hostname}"
-                t1_interface.description = f"{t1_device.hostname} {t1_interface.interface} -- {t2_interface.interface} {t2_device.hostname}"
+        return leaf_client_ports
 
-                # Fetch next available PTP subnet
-                connection_subnet = self.allocate_ptp_subnet()
+    def tier_port_maps(self) -> Dict[str, Dict[str, range]]:
+        """Leaves face spines on their first ports, spines face super-spines on their first ports"""
+        return {
+            "t1": {
+                "northbound": range(0, self.spines_per_pod),
+                "southbound": range(
+                    self.spines_per_pod, self.spines_per_pod + self.leaf_client_ports
+                ),
+            },
+            "t2": {
+                "northbound": range(0, self.super_spines_per_plane),
+                "southbound": range(
+                    self.super_spines_per_plane, self.device_interface_count
+                ),
+            },
+            "t3": {
+                "northbound": range(0, 0),
+                "southbound": range(0, self.device_interface_count),
+            },
+        }
 
-                # Update IP address on t1 and t2 interfaces
-                t2_interface.ip_address = f"{list(connection_subnet.hosts())[0]}/31"
-                t1_interface.ip_address = f"{list(connection_subnet.hosts())[1]}/31"
+    @property
+    def device_count(self) -> int:
+        return (
+            self.pod_count * (self.leaves_per_pod + self.spines_per_pod)
+            + self.spines_per_pod * self.super_spines_per_plane
+        )
 
-                # Trigger interface-level OSPF settings
-                t2_interface.ospf_enabled = True
-                t1_interface.ospf_enabled = True
+    @property
+    def devices(self) -> List[Device]:
+        devices = []
+        for pod in self.pods:
+            devices.extend(pod.t1.devices)
+        for pod in self.pods:
+            devices.extend(pod.t2.devices)
+        for plane in self.planes:
+            devices.extend(plane.devices)
 
-                # Advertise PTP subnet in OSPF
-                t2_device.ospf.networks.append(connection_subnet.with_prefixlen)
-                t1_device.ospf.networks.append(connection_subnet.with_prefixlen)
+        return devices
 
-                # Increment connection counter for internal links
-                self.connections += 1
+    @property
+    def edge_devices(self) -> List[Device]:
+        return [device for pod in self.pods for device in pod.t1.devices]
 
-    def add_bgp_peers(self) -> None:
-        t1_peers = [device.router_id for device in self.t1.devices]
-        t2_peers = [device.router_id for device in self.t2.devices]
+    def show_architecture_statistics(self):
+        self.record_statistics()
+        leaf_ratio = self.leaf_client_ports / self.spines_per_pod
+        spine_ratio = self.leaves_per_pod / self.super_spines_per_plane
+        print()
+        print("#### Architecture Stats ####")
+        print(f"Pods: {self.pod_count}")
+        print(f"Leaves / Spines per Pod: {self.leaves_per_pod} / {self.spines_per_pod}")
+        print(
+            f"Spine Planes / Super-Spines per Plane: {self.spines_per_pod} / {self.super_spines_per_plane}"
+        )
+        print(f"Total Devices: {self.device_count}")
+        print(f"Total Internal Connections: {self.connections}")
+        print(f"Total Unused Internal Subnets: {self.unused_internal_subnets}")
+        print(f"Total Unused Loopbacks: {self.unused_loopbacks}")
+        print(
+            f"Total Client Facing Ports: {self.leaf_client_ports * self.leaves_per_pod * self.pod_count}"
+        )
+        print(f"Leaf Oversubscription: {leaf_ratio:g}:1")
+        print(f"Spine Oversubscription: {spine_ratio:g}:1")
+        print()
 
-        # Update T1 devices' BGP instances
-        for device in self.t1.devices:
-            for peer in t2_peers:
-                device.bgp.neighbors.append({"ip_address": peer, "peer_group": "T2"})
+    @timed("model.add_internal_connections")
+    def add_internal_connections(self) -> None:
+        """Connects leaves to spines within each pod and spines to the super-spines of their plane"""
+        self.connect_device_pairs(
+            [
+                (t2_device, t1_device)
+                for pod in self.pods
+                for t2_device in pod.t2.devices
+                for t1_device in pod.t1.devices
+            ]
+        )
+        self.connect_device_pairs(
+            [
+                (t3_device, pod.t2.devices[plane])
+                for plane, super_spines in enumerate(self.planes)
+                for t3_device in super_spines.devices
+                for pod in self.pods
+            ]
+        )
 
-        # Update T2 devices' BGP instances
-        for device in self.t2.devices:
-            for peer in t1_peers:
-                device.bgp.neighbors.append({"ip_address": peer, "peer_group": "T1"})
+    @timed("model.add_bgp_peers")
+    def add_bgp_peers(self) -> None:
+        """Spines reflect routes for the leaves in their pod, super-spines reflect between spines"""
+        for plane, super_spines in enumerate(self.planes):
+            for pod in self.pods:
+                spine = pod.t2.devices[plane]
+                spine.bgp.add_peers(peer_group=T1_CLIENTS, devices=pod.t1.devices)
+                spine.bgp.add_peers(peer_group=T3_PEERS, devices=super_spines.devices)
 
-    def add_external_networks(self):
-        for network in self.external_networks:
-            for device in self.t1.devices:
-                if device.hostname in self.external_networks[network]:
-                    device.bgp.networks.append(network)
-
-    def render(self, output_dir: str) -> None:
-        for device in self.t1.devices + self.t2.devices:
-            generate_frr_configs(device=device, output_dir=output_dir)
+            for super_spine in super_spines.devices:
+                super_spine.bgp.add_peers(
+                    peer_group=T2_CLIENTS,
+                    devices=[pod.t2.devices[plane] for pod in self.pods],
+                )
+
+        for pod in self.pods:
+            for leaf in pod.t1.devices:
+                leaf.bgp.add_peers(peer_group=T2_PEERS, devices=pod.t2.devices)
@@ -0,0 +1,10 @@
+class InsufficientIpSubnets(Exception):
+    """This exception is raised when subnets have been exhausted from a given supernet"""
+
+
+class InsufficientInterfaces(Exception):
+    """This exception is raised when a Device has no free interfaces left in a given direction"""
+
+
+class InvalidArchitecture(Exception):
+    """This exception is raised when an unsupported architecture is defined in an input YAML"""
@@ -0,0 +1,229 @@
+from array import array
+from bisect import bisect_right
+from ipaddress import IPv6Address, ip_network
+from socket import inet_ntoa
+from typing import List, Optional, Sequence, Tuple
+
+from models.exceptions import InsufficientIpSubnets
+
+
+def format_address(value: int, version: int = 4) -> str:
+    if version == 4:
+        return inet_ntoa(value.to_bytes(4, "big"))
+
+    return str(IPv6Address(value))
+
+
+class LazyPrefix:
+    """This class is an address or network with its prefix length, kept as integers until it is formatted
+    str() returns the same text as the ipaddress object it stands for, eg. 10.0.0.1/31"""
+
+    __slots__ = ("value", "prefixlen", "version")
+
+    def __init__(self, value: int, prefixlen: int, version: int = 4) -> None:
+        self.value = value
+        self.prefixlen = prefixlen
+        self.version = version
+
+    def __str__(self) -> str:
+        return f"{format_address(self.value, self.version)}/{self.prefixlen}"
+
+    def __repr__(self) -> str:
+        return f"LazyPrefix('{self}')"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, LazyPrefix):
+            return NotImplemented
+        return (self.value, self.prefixlen, self.version) == (
+            other.value,
+            other.prefixlen,
+            other.version,
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.value, self.prefixlen, self.version))
+
+    @property
+    def address(self) -> str:
+        return format_address(self.value, self.version)
+
+    @property
+    def with_prefixlen(self) -> str:
+        return str(self)
+
+    def host(self, index: int) -> "LazyPrefix":
+        """Return the address at index within this network, keeping its prefix length
+        Eg. host(1) of 10.0.0.0/31 is 10.0.0.1/31"""
+        return LazyPrefix(self.value + index, self.prefixlen, self.version)
+
+
+class SubnetAllocator:
+    """This class allocates fixed-size subnets from a supernet using an integer cursor
+    Subnets are only instantiated as they are handed out, so memory use does not depend on supernet size"""
+
+    def __init__(
+        self,
+        supernet: str,
+        new_prefix: int,
+        reserved: Optional[List[str]] = None,
+        description: str = "subnets",
+    ) -> None:
+        self.supernet = ip_network(supernet)
+        if not self.supernet.prefixlen <= new_prefix <= self.supernet.max_prefixlen:
+            raise ValueError(
+                f"Prefix length /{new_prefix} is not valid for supernet {self.supernet}"
+            )
+
+        self.new_prefix = new_prefix
+        self.version = self.supernet.version
+        self.description = description
+        self.capacity = 2 ** (new_prefix - self.supernet.prefixlen)
+        self.__block_size = 2 ** (self.supernet.max_prefixlen - new_prefix)
+        self.__base = int(self.supernet.network_address)
+        self.__cursor = 0
+        self.__reserved: List[Tuple[int, int]] = []
+
+        for network in reserved or []:
+            self.reserve(network)
+
+    @property
+    def allocated(self) -> int:
+        """Number of subnets handed out so far, excluding reserved ranges"""
+        return self.__cursor - self.__reserved_count(0, self.__cursor)
+
+    @property
+    def remaining(self) -> int:
+        """Number of subnets still available for allocation"""
+        return (
+            self.capacity
+            - self.__cursor
+            - self.__reserved_count(self.__cursor, self.capacity)
+        )
+
+    def reserve(self, network: str) -> None:
+        """Exclude every subnet overlapping the given network from allocation"""
+        network = ip_network(network, strict=False)
+        if not network.overlaps(self.supernet):
+            return
+
+        first = max(int(network.network_address), self.__base) - self.__base
+        last = (
+            min(int(network.broadcast_address), int(self.supernet.broadcast_address))
+            - self.__base
+        )
+        start, end = first // self.__block_size, last // self.__block_size + 1
+        if start < self.__cursor:
+            raise ValueError(
+                f"Cannot reserve {network}, {self.description} have already been allocated from it"
+            )
+
+        # Keep reserved index ranges sorted and merged so lookups stay cheap
+        ranges = sorted(self.__reserved + [(start, end)])
+        merged = [ranges[0]]
+        for range_start, range_end in ranges[1:]:
+            if range_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+            else:
+                merged.append((range_start, range_end))
+        self.__reserved = merged
+
+    def allocate(self):
+        """Return the next available subnet and advance the cursor past it"""
+        index = self.__skip_reserved(self.__cursor)
+        if index >= self.capacity:
+            raise InsufficientIpSubnets(
+                f"Could not allocate all {self.description} required from {self.supernet}"
+            )
+
+        self.__cursor = index + 1
+        return self.__network(index)
+
+    def allocate_block(self, count: int) -> Sequence[int]:
+        """Allocate count subnets at once and return their network addresses as integers
+        Every run of subnets between reserved ranges is computed with a single range(),
+        the result matches calling allocate() count times"""
+        values = array("L") if self.version == 4 else []
+        index = self.__cursor
+        while len(values) < count:
+            index = self.__skip_reserved(index)
+            if index >= self.capacity:
+                raise InsufficientIpSubnets(
+                    f"Could not allocate all {self.description} required from {self.supernet}"
+                )
+
+            position = bisect_right(self.__reserved, (index, float("inf")))
+            end = min(
+                self.__reserved[position][0]
+                if position < len(self.__reserved)
+                else self.capacity,
+                index + count - len(values),
+            )
+            values.extend(
+                range(
+                    self.__base + index * self.__block_size,
+                    self.__base + end * self.__block_size,
+                    self.__block_size,
+                )
+            )
+            index = end
+
+        self.__cursor = index
+        return values
+
+    def prefix(self, value: int) -> LazyPrefix:
+        """Wrap a subnet returned by allocate_block() so it is formatted only when rendered"""
+        return LazyPrefix(value, self.new_prefix, self.version)
+
+    def prefix_at(self, position: int) -> LazyPrefix:
+        """Same as network_at() without building an ipaddress object"""
+        return self.prefix(self.__base + self.__index_at(position) * self.__block_size)
+
+    def network_at(self, position: int):
+        """Return the subnet that the allocator would hand out at the given position
+        Eg. position 0 is the first subnet returned by allocate() on a fresh allocator"""
+        return self.__network(self.__index_at(position))
+
+    def __index_at(self, position: int) -> int:
+        index = position
+        for start, end in self.__reserved:
+            if start > index:
+                break
+            index += end - start
+
+        if position < 0 or index >= self.capacity:
+            raise InsufficientIpSubnets(
+                f"Could not allocate all {self.description} required from {self.supernet}"
+            )
+
+        return index
+
+    def position_of(self, value: int) -> int:
+        """Return the position of the subnet whose network address is value, the inverse of prefix_at()
+        Raise ValueError for addresses that are not the start of an allocatable subnet"""
+        index, offset = divmod(value - self.__base, self.__block_size)
+        if (
+            offset
+            or not 0 <= index < self.capacity
+            or self.__skip_reserved(index) != index
+        ):
+            raise ValueError(
+                f"{format_address(value, self.version)} is not one of the {self.description}"
+            )
+
+        return index - self.__reserved_count(0, index)
+
+    def __network(self, index: int):
+        return ip_network((self.__base + index * self.__block_size, self.new_prefix))
+
+    def __skip_reserved(self, index: int) -> int:
+        position = bisect_right(self.__reserved, (index, float("inf"))) - 1
+        if position >= 0 and self.__reserved[position][1] > index:
+            return self.__reserved[position][1]
+
+        return index
+
+    def __reserved_count(self, start: int, end: int) -> int:
+        return sum(
+            max(0, min(range_end, end) - max(range_start, start))
+            for range_start, range_end in self.__reserved
+        )
@@ -0,0 +1,133 @@
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class Link(NamedTuple):
+    """One internal link, device_a is the upper device and takes the first address of the subnet"""
+
+    device_a: str
+    port_a: int
+    device_b: str
+    port_b: int
+    subnet_index: int
+
+
+class LinkTable:
+    """This class stores every internal link of a fabric as parallel integer arrays
+    Devices are stored as ids into a hostname list, each device also keeps a port to link index
+    and subnets map to the link using them, so peer, per-device and per-subnet lookups are constant time"""
+
+    __slots__ = (
+        "hostnames",
+        "device_a",
+        "port_a",
+        "device_b",
+        "port_b",
+        "subnet_index",
+        "_device_ids",
+        "_ports",
+        "_subnet_links",
+    )
+
+    def __init__(self) -> None:
+        self.hostnames: List[str] = []
+        self.device_a = array("L")
+        self.port_a = array("L")
+        self.device_b = array("L")
+        self.port_b = array("L")
+        self.subnet_index = array("L")
+        self._device_ids: Dict[str, int] = {}
+        # Per device, the link id connected to each port or -1 for unconnected ports
+        self._ports: List[array] = []
+        # Allocator position of a PTP subnet to the id of the first link using it
+        self._subnet_links: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.subnet_index)
+
+    def __getitem__(self, link_id: int) -> Link:
+        return Link(
+            device_a=self.hostnames[self.device_a[link_id]],
+            port_a=self.port_a[link_id],
+            device_b=self.hostnames[self.device_b[link_id]],
+            port_b=self.port_b[link_id],
+            subnet_index=self.subnet_index[link_id],
+        )
+
+    def __iter__(self) -> Iterator[Link]:
+        return (self[link_id] for link_id in range(len(self)))
+
+    def device_id(self, hostname: str) -> int:
+        """Return the id of a device, registering it on first use"""
+        device_id = self._device_ids.get(hostname)
+        if device_id is None:
+            device_id = self._device_ids[hostname] = len(self.hostnames)
+            self.hostnames.append(hostname)
+            self._ports.append(array("l"))
+
+        return device_id
+
+    def add(
+        self, device_a: str, port_a: int, device_b: str, port_b: int, subnet_index: int
+    ) -> int:
+        """Record a link and return its id"""
+        link_id = len(self)
+        ends = ((self.device_id(device_a), port_a), (self.device_id(device_b), port_b))
+        for device_id, port in ends:
+            ports = self._ports[device_id]
+            if port < len(ports) and ports[port] != -1:
+                raise ValueError(
+                    f"Port eth{port} on {self.hostnames[device_id]} is already connected"
+                )
+            if port >= len(ports):
+                ports.extend([-1] * (port + 1 - len(ports)))
+            ports[port] = link_id
+
+        self.device_a.append(ends[0][0])
+        self.port_a.append(port_a)
+        self.device_b.append(ends[1][0])
+        self.port_b.append(port_b)
+        self.subnet_index.append(subnet_index)
+        self._subnet_links.setdefault(subnet_index, link_id)
+
+        return link_id
+
+    def link_ids(self, hostname: str) -> List[int]:
+        """Ids of the links connected to a device, ordered by port"""
+        device_id = self._device_ids.get(hostname)
+        if device_id is None:
+            return []
+
+        return [link_id for link_id in self._ports[device_id] if link_id != -1]
+
+    def degree(self, hostname: str) -> int:
+        return len(self.link_ids(hostname))
+
+    def link_at_port(self, hostname: str, port: int) -> Optional[Link]:
+        device_id = self._device_ids.get(hostname)
+        if device_id is None:
+            return None
+
+        ports = self._ports[device_id]
+        if port >= len(ports) or ports[port] == -1:
+            return None
+
+        return self[ports[port]]
+
+    def peer(self, hostname: str, port: int) -> Optional[Tuple[str, int]]:
+        """Return the hostname and port on the other side of a device's port"""
+        link = self.link_at_port(hostname, port)
+        if link is None:
+            return None
+        if link.device_a == hostname and link.port_a == port:
+            return link.device_b, link.port_b
+
+        return link.device_a, link.port_a
+
+    def link_for_subnet(self, subnet_index: int) -> Optional[Link]:
+        """Return the link using the PTP subnet at the given allocator position"""
+        link_id = self._subnet_links.get(subnet_index)
+        if link_id is None:
+            return None
+
+        return self[link_id]
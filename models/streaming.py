@@ -0,0 +1,369 @@
+from typing import Dict, Iterator, List, Sequence, Tuple
+from models.clos import (
+    T1_CLIENTS,
+    T2_CLIENTS,
+    T2_PEERS,
+    T3_PEERS,
+    BgpPeerGroup,
+    ClosArchitecture,
+    Device,
+    ThreeTierClos,
+    TwoTierClos,
+    configure_link_interface,
+)
+from models.exceptions import InsufficientInterfaces
+from models.ip_allocator import LazyPrefix
+from instrumentation.metrics import timed
+
+
+# (direction, peer hostname, peer port, PTP subnet, host index) for one end of a link
+LinkEnd = Tuple[str, str, int, LazyPrefix, int]
+
+
+@timed("model.build_device")
+def build_device(
+    hostname: str,
+    interface_count: int,
+    loopback: LazyPrefix,
+    port_map: Dict,
+    links: Sequence[LinkEnd],
+    peers: Sequence[Tuple[BgpPeerGroup, List[str]]],
+) -> Device:
+    """Build a single fully configured Device from its precomputed links and BGP peers
+    Links must be listed in the order the device allocates its ports"""
+    device = Device(
+        hostname=hostname,
+        interface_count=interface_count,
+        loopback=loopback,
+        port_map=port_map,
+    )
+    for direction, peer_hostname, peer_port, subnet, host_index in links:
+        configure_link_interface(
+            device=device,
+            interface=device.allocate_interface(direction=direction),
+            peer_hostname=peer_hostname,
+            peer_interface=f"eth{peer_port}",
+            subnet=subnet,
+            host_index=host_index,
+        )
+
+    for peer_group, addresses in peers:
+        device.bgp.add_peer_addresses(peer_group=peer_group, addresses=addresses)
+
+    return device
+
+
+class StreamingArchitecture(ClosArchitecture):
+    """This class holds the behaviour shared by streaming Clos models
+    Devices are built one at a time from their position in the fabric and discarded after rendering,
+    so memory use does not grow with the size of the fabric"""
+
+    device_total: int = 0
+    link_total: int = 0
+
+    def reserve_positions(self, device_total: int, connections: int) -> None:
+        """Check both supernets can hold the whole fabric before anything is rendered"""
+        self.device_total = device_total
+        self.link_total = connections
+        if connections:
+            self.internal_subnets.network_at(connections - 1)
+        self.loopbacks.network_at(device_total - 1)
+
+    @property
+    def connections(self) -> int:
+        """Links are not recorded in a LinkTable, the count follows from the fabric's shape"""
+        return self.link_total
+
+    @property
+    def unused_internal_subnets(self) -> int:
+        return self.internal_subnets.remaining - self.connections
+
+    @property
+    def unused_loopbacks(self) -> int:
+        return self.loopbacks.remaining - self.device_total
+
+    def router_id_at(self, position: int) -> str:
+        return self.loopbacks.prefix_at(position).address
+
+
+class StreamingTwoTierClos(StreamingArchitecture, TwoTierClos):
+    """This class represents a TwoTierClos whose devices are generated on demand
+    t1-r(i+1) uses loopback i, t2-r(j+1) uses loopback width + j and their link uses PTP subnet j * width + i"""
+
+    def __init__(
+        self,
+        width: int,
+        device_interface_count: int,
+        internal_supernet: str,
+        loopback_supernet: str,
+        external_networks: Dict = None,
+        reserved_internal_subnets: List[str] = None,
+        reserved_loopbacks: List[str] = None,
+        port_map: Dict[str, Dict[str, str]] = None,
+        aggregate_external_networks: bool = False,
+        bgp_peering: str = "full_mesh",
+        route_reflectors: int = None,
+    ) -> None:
+        ClosArchitecture.__init__(
+            self,
+            internal_supernet=internal_supernet,
+            loopback_supernet=loopback_supernet,
+            external_networks=external_networks,
+            reserved_internal_subnets=reserved_internal_subnets,
+            reserved_loopbacks=reserved_loopbacks,
+            aggregate_external_networks=aggregate_external_networks,
+        )
+        self.width = width
+        self.device_interface_count = device_interface_count
+        self.port_map = port_map or {}
+        self.set_bgp_peering(bgp_peering=bgp_peering, route_reflectors=route_reflectors)
+        self.t1_ports = self.tier_ports("t1")
+        self.t2_ports = self.tier_ports("t2")
+
+        # Fail the same way TwoTierClos does when a tier runs out of ports
+        if len(self.t2_ports["southbound"]) < width:
+            raise InsufficientInterfaces(
+                "Could not allocate a southbound interface on t2-r1"
+            )
+        if len(self.t1_ports["northbound"]) < width:
+            raise InsufficientInterfaces(
+                "Could not allocate a northbound interface on t1-r1"
+            )
+
+        self.reserve_positions(device_total=2 * width, connections=width * width)
+        self.show_architecture_statistics()
+
+    @property
+    def edge_devices(self) -> Iterator[Device]:
+        """Generate the t1 devices, they are the first width positions"""
+        width = self.width
+        t2_router_ids = [self.router_id_at(width + j) for j in range(width)]
+
+        for i in range(width):
+            hostname = f"t1-r{i + 1}"
+            device = build_device(
+                hostname=hostname,
+                interface_count=self.device_interface_count,
+                loopback=self.loopbacks.prefix_at(i),
+                port_map=self.port_map.get("t1"),
+                links=[
+                    (
+                        "northbound",
+                        f"t2-r{j + 1}",
+                        self.t2_ports["southbound"][i],
+                        self.internal_subnets.prefix_at(j * width + i),
+                        1,
+                    )
+                    for j in range(width)
+                ],
+                peers=[],
+            )
+            self.add_device_bgp_peers(
+                device=device, tier=1, index=i, peer_router_ids=t2_router_ids
+            )
+            self.add_device_external_networks(device)
+            yield device
+
+    @property
+    def devices(self) -> Iterator[Device]:
+        width = self.width
+        t1_router_ids = [self.router_id_at(i) for i in range(width)]
+        yield from self.edge_devices
+
+        for j in range(width):
+            device = build_device(
+                hostname=f"t2-r{j + 1}",
+                interface_count=self.device_interface_count,
+                loopback=self.loopbacks.prefix_at(width + j),
+                port_map=self.port_map.get("t2"),
+                links=[
+                    (
+                        "southbound",
+                        f"t1-r{i + 1}",
+                        self.t1_ports["northbound"][j],
+                        self.internal_subnets.prefix_at(j * width + i),
+                        0,
+                    )
+                    for i in range(width)
+                ],
+                peers=[],
+            )
+            self.add_device_bgp_peers(
+                device=device, tier=2, index=j, peer_router_ids=t1_router_ids
+            )
+            yield device
+
+
+class StreamingThreeTierClos(StreamingArchitecture, ThreeTierClos):
+    """This class represents a ThreeTierClos whose devices are generated on demand
+    Loopbacks and PTP subnets are numbered in the same order ThreeTierClos allocates them:
+    pod by pod (leaves then spines) followed by the spine planes"""
+
+    def __init__(
+        self,
+        pods: int,
+        leaves_per_pod: int,
+        spines_per_pod: int,
+        super_spines_per_plane: int,
+        device_interface_count: int,
+        internal_supernet: str,
+        loopback_supernet: str,
+        external_networks: Dict = None,
+        reserved_internal_subnets: List[str] = None,
+        reserved_loopbacks: List[str] = None,
+        leaf_oversubscription: float = None,
+        aggregate_external_networks: bool = False,
+    ) -> None:
+        ClosArchitecture.__init__(
+            self,
+            internal_supernet=internal_supernet,
+            loopback_supernet=loopback_supernet,
+            external_networks=external_networks,
+            reserved_internal_subnets=reserved_internal_subnets,
+            reserved_loopbacks=reserved_loopbacks,
+            aggregate_external_networks=aggregate_external_networks,
+        )
+        self.pod_count = pods
+        self.leaves_per_pod = leaves_per_pod
+        self.spines_per_pod = spines_per_pod
+        self.super_spines_per_plane = super_spines_per_plane
+        self.device_interface_count = device_interface_count
+        self.leaf_client_ports = self.validate_port_budget(leaf_oversubscription)
+        self.port_maps = self.tier_port_maps()
+
+        pod_links = pods * spines_per_pod * leaves_per_pod
+        plane_links = spines_per_pod * super_spines_per_plane * pods
+        self.reserve_positions(
+            device_total=self.device_count, connections=pod_links + plane_links
+        )
+        self.show_architecture_statistics()
+
+    def leaf_position(self, pod: int, leaf: int) -> int:
+        return pod * (self.leaves_per_pod + self.spines_per_pod) + leaf
+
+    def spine_position(self, pod: int, spine: int) -> int:
+        return self.leaf_position(pod, self.leaves_per_pod + spine)
+
+    def super_spine_position(self, plane: int, super_spine: int) -> int:
+        return (
+            self.leaf_position(self.pod_count, 0)
+            + plane * self.super_spines_per_plane
+            + super_spine
+        )
+
+    def pod_link(self, pod: int, spine: int, leaf: int) -> LazyPrefix:
+        index = (pod * self.spines_per_pod + spine) * self.leaves_per_pod + leaf
+        return self.internal_subnets.prefix_at(index)
+
+    def plane_link(self, plane: int, super_spine: int, pod: int) -> LazyPrefix:
+        index = (
+            self.pod_count * self.spines_per_pod * self.leaves_per_pod
+            + (plane * self.super_spines_per_plane + super_spine) * self.pod_count
+            + pod
+        )
+        return self.internal_subnets.prefix_at(index)
+
+    @property
+    def edge_devices(self) -> Iterator[Device]:
+        """Generate the t1 devices pod by pod, they come before any spine"""
+        leaves = range(self.leaves_per_pod)
+        spines = range(self.spines_per_pod)
+        t1_ports, t2_ports = self.port_maps["t1"], self.port_maps["t2"]
+
+        for pod in range(self.pod_count):
+            spine_ids = [self.router_id_at(self.spine_position(pod, j)) for j in spines]
+            for i in leaves:
+                hostname = f"t1-p{pod + 1}-r{i + 1}"
+                device = build_device(
+                    hostname=hostname,
+                    interface_count=self.device_interface_count,
+                    loopback=self.loopbacks.prefix_at(self.leaf_position(pod, i)),
+                    port_map=t1_ports,
+                    links=[
+                        (
+                            "northbound",
+                            f"t2-p{pod + 1}-r{j + 1}",
+                            t2_ports["southbound"][i],
+                            self.pod_link(pod, j, i),
+                            1,
+                        )
+                        for j in spines
+                    ],
+                    peers=[(T2_PEERS, spine_ids)],
+                )
+                self.add_device_external_networks(device)
+                yield device
+
+    @property
+    def devices(self) -> Iterator[Device]:
+        leaves = range(self.leaves_per_pod)
+        spines = range(self.spines_per_pod)
+        super_spines = range(self.super_spines_per_plane)
+        pods = range(self.pod_count)
+        t1_ports, t2_ports, t3_ports = (
+            self.port_maps["t1"],
+            self.port_maps["t2"],
+            self.port_maps["t3"],
+        )
+        yield from self.edge_devices
+
+        for pod in pods:
+            leaf_ids = [self.router_id_at(self.leaf_position(pod, i)) for i in leaves]
+            for j in spines:
+                yield build_device(
+                    hostname=f"t2-p{pod + 1}-r{j + 1}",
+                    interface_count=self.device_interface_count,
+                    loopback=self.loopbacks.prefix_at(self.spine_position(pod, j)),
+                    port_map=t2_ports,
+                    links=[
+                        (
+                            "southbound",
+                            f"t1-p{pod + 1}-r{i + 1}",
+                            t1_ports["northbound"][j],
+                            self.pod_link(pod, j, i),
+                            0,
+                        )
+                        for i in leaves
+                    ]
+                    + [
+                        (
+                            "northbound",
+                            f"t3-s{j + 1}-r{k + 1}",
+                            t3_ports["southbound"][pod],
+                            self.plane_link(j, k, pod),
+                            1,
+                        )
+                        for k in super_spines
+                    ],
+                    peers=[
+                        (T1_CLIENTS, leaf_ids),
+                        (
+                            T3_PEERS,
+                            [
+                                self.router_id_at(self.super_spine_position(j, k))
+                                for k in super_spines
+                            ],
+                        ),
+                    ],
+                )
+
+        for j in spines:
+            spine_ids = [self.router_id_at(self.spine_position(p, j)) for p in pods]
+            for k in super_spines:
+                yield build_device(
+                    hostname=f"t3-s{j + 1}-r{k + 1}",
+                    interface_count=self.device_interface_count,
+                    loopback=self.loopbacks.prefix_at(self.super_spine_position(j, k)),
+                    port_map=t3_ports,
+                    links=[
+                        (
+                            "southbound",
+                            f"t2-p{pod + 1}-r{j + 1}",
+                            t2_ports["northbound"][k],
+                            self.plane_link(j, k, pod),
+                            0,
+                        )
+                        for pod in pods
+                    ],
+                    peers=[(T2_CLIENTS, spine_ids)],
+                )
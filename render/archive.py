@@ -0,0 +1,180 @@
+import io
+import json
+import os
+import tarfile
+import zipfile
+from threading import Lock
+from time import time
+from typing import Dict, List, Optional, Tuple
+from render.manifest import MANIFEST_VERSION, config_digest
+
+
+ARCHIVE_FORMATS = ("tar", "zip")
+ARCHIVE_MANIFEST = "manifest.json"
+
+
+def archive_format(path: str) -> Optional[str]:
+    """Return the archive format of a path based on its extension, None for directories"""
+    if path.endswith(".zip"):
+        return "zip"
+    if path.endswith((".tar", ".tar.gz", ".tgz")):
+        return "tar"
+
+    return None
+
+
+def archive_path(output: str, output_format: str) -> str:
+    """Add the format's extension to an archive path if it is missing"""
+    if archive_format(output) == output_format:
+        return output
+
+    return f"{output.rstrip(os.sep)}.{output_format}"
+
+
+def read_archive_manifest(path: str) -> Dict:
+    """Return the manifest stored in a config archive, or an empty one if it cannot be read"""
+    try:
+        with ConfigBundle(path) as bundle:
+            return bundle.manifest
+    except (OSError, KeyError, ValueError, tarfile.TarError, zipfile.BadZipFile):
+        return {}
+
+
+class ConfigArchive:
+    """This class writes every generated config of a fabric into a single tar or zip archive
+    A manifest member records the sha256 of every file and the devices whose configs changed
+    compared to the archive previously written to the same path"""
+
+    def __init__(
+        self, path: str, output_format: str = "tar", force: bool = False
+    ) -> None:
+        if output_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format {output_format}")
+
+        self.path = path
+        self.format = output_format
+        # With force, every device is reported as changed
+        previous = {} if force else read_archive_manifest(path)
+        self.previous: Dict[str, str] = (
+            previous.get("files", {})
+            if previous.get("version") == MANIFEST_VERSION
+            else {}
+        )
+        self.current: Dict[str, str] = {}
+        self.changed_files: List[str] = []
+        self.changed_devices: List[str] = []
+
+        # Members are written to a temporary file that replaces the archive on close
+        self.__temporary_path = f"{path}.{os.getpid()}.tmp"
+        if output_format == "tar":
+            compressed = path.endswith((".gz", ".tgz"))
+            self.__archive = tarfile.open(
+                self.__temporary_path, mode="w:gz" if compressed else "w"
+            )
+        else:
+            self.__archive = zipfile.ZipFile(
+                self.__temporary_path, mode="w", compression=zipfile.ZIP_DEFLATED
+            )
+
+    def __enter__(self) -> "ConfigArchive":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type:
+            self.discard()
+        else:
+            self.close()
+
+    def add(self, filename: str, config: str) -> bool:
+        """Add a config as a member named after filename's basename
+        Return True if its content differs from the previous archive"""
+        name = os.path.basename(filename)
+        data = config.encode("utf-8")
+        self.__write(name, data)
+
+        digest = config_digest(config)
+        self.current[name] = digest
+        changed = self.previous.get(name) != digest
+        if changed:
+            self.changed_files.append(name)
+
+        return changed
+
+    def close(self) -> None:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "files": self.current,
+            "changed_devices": self.changed_devices,
+        }
+        self.__write(
+            ARCHIVE_MANIFEST,
+            json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"),
+        )
+        self.__archive.close()
+        os.replace(self.__temporary_path, self.path)
+
+    def discard(self) -> None:
+        self.__archive.close()
+        os.remove(self.__temporary_path)
+
+    def __write(self, name: str, data: bytes) -> None:
+        if self.format == "tar":
+            member = tarfile.TarInfo(name=name)
+            member.size = len(data)
+            member.mode = 0o640
+            member.mtime = int(time())
+            self.__archive.addfile(member, io.BytesIO(data))
+        else:
+            self.__archive.writestr(name, data)
+
+
+class ConfigCollector:
+    """This class keeps rendered configs in memory so they can be added to a ConfigArchive later
+    Worker processes use it as they cannot write to the parent's archive"""
+
+    def __init__(self) -> None:
+        self.files: List[Tuple[str, str]] = []
+
+    def add(self, filename: str, config: str) -> bool:
+        self.files.append((os.path.basename(filename), config))
+
+        return True
+
+
+class ConfigBundle:
+    """This class reads device configs from an archive written by ConfigArchive
+    Members are indexed once when the archive is opened, reads are safe from multiple threads"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.format = archive_format(path)
+        if self.format == "zip":
+            self.__archive = zipfile.ZipFile(path, mode="r")
+            self.__members = {name: name for name in self.__archive.namelist()}
+        else:
+            self.__archive = tarfile.open(path, mode="r")
+            self.__members = {
+                member.name: member for member in self.__archive.getmembers()
+            }
+        self.__lock = Lock()
+        self.manifest: Dict = json.loads(self.read(ARCHIVE_MANIFEST))
+
+    def __enter__(self) -> "ConfigBundle":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.__members
+
+    def read(self, filename: str) -> bytes:
+        member = self.__members[filename]
+        with self.__lock:
+            if self.format == "zip":
+                return self.__archive.read(member)
+
+            return self.__archive.extractfile(member).read()
+
+    def close(self) -> None:
+        self.__archive.close()
@@ -1,121 +1,411 @@
+import io
 import os
-from jinja2 import Template
-
-
-def write_config_to_file(config: str, filename: str) -> None:
-    print(f"Writing configurations to {filename}")
-    with open(os.path.join(filename), "w") as f:
-        f.write(config)
-
-
-def generate_zebra_config(device, output_dir) -> str:
-    template = """hostname {{ device.hostname}}
-{% for interface in device.interfaces %}
-{%- if interface.allocated %}
-interface {{ interface.interface }}
-  ip address {{ interface.ip_address }}
-  description {{ interface.description }}
-{% if interface.ospf_enabled %}
-  ip ospf network point-to-point
-  ip ospf hello-interval 1
-  ip ospf dead-interval 4
-  ip ospf cost 10
-{% endif %}
-{% endif %}
-{%- endfor %}
-"""
-
-    jinja_template = Template(template)
-    config = jinja_template.render(device=device)
-    filename = os.path.join(output_dir, f"{device.hostname}_zebra.conf")
-    write_config_to_file(config=config, filename=filename)
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import islice, repeat
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from render.archive import ConfigArchive, ConfigCollector
+from render.manifest import RenderManifest, config_digest
+from instrumentation.metrics import metrics, timed
 
-    return config
 
+DEFAULT_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+RENDER_BATCH_PER_JOB = 64
+
+
+class FrrRenderer:
+    """This class owns a single Jinja2 Environment with precompiled FRR templates
+    One instance can be reused to render every device in a fabric"""
+
+    # frr.conf.j2 includes the daemon templates, so overriding one of them also changes frr.conf
+    TEMPLATES = {
+        "zebra": "zebra.conf.j2",
+        "ospfd": "ospfd.conf.j2",
+        "bgpd": "bgpd.conf.j2",
+        "frr": "frr.conf.j2",
+    }
+
+    def __init__(
+        self,
+        template_dir: str = None,
+        bytecode_cache_dir: str = None,
+        verbose: bool = False,
+        split_configs: bool = False,
+    ) -> None:
+        self.template_dir = template_dir
+        self.bytecode_cache_dir = bytecode_cache_dir
+        # Print a line for every file written
+        self.verbose = verbose
+        # Also write a config file per daemon next to the integrated frr.conf
+        self.split_configs = split_configs
+
+        # Templates in template_dir take precedence over the bundled defaults
+        search_path = [DEFAULT_TEMPLATE_DIR]
+        if template_dir:
+            search_path.insert(0, template_dir)
+
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(directory=bytecode_cache_dir)
+
+        self.environment = Environment(
+            loader=FileSystemLoader(search_path),
+            bytecode_cache=bytecode_cache,
+            auto_reload=False,
+        )
+        self.templates = {
+            daemon: self.environment.get_template(name)
+            for daemon, name in self.TEMPLATES.items()
+        }
+
+    @property
+    def options(self) -> Dict:
+        """Constructor arguments, used to build an identical renderer in worker processes"""
+        return {
+            "template_dir": self.template_dir,
+            "bytecode_cache_dir": self.bytecode_cache_dir,
+            "verbose": self.verbose,
+            "split_configs": self.split_configs,
+        }
+
+    def render(self, daemon: str, device) -> str:
+        with metrics.phase(f"render.{daemon}"):
+            return self.templates[daemon].render(device=device)
+
+
+_default_renderer: Optional[FrrRenderer] = None
+
+
+def default_renderer() -> FrrRenderer:
+    """Return a module-wide renderer so templates are compiled once per process"""
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = FrrRenderer()
+
+    return _default_renderer
+
+
+def build_render_context(device) -> SimpleNamespace:
+    """Snapshot only the Device attributes used by the FRR templates
+    The result is small and picklable, so it can be shipped to worker processes"""
+    return SimpleNamespace(
+        hostname=device.hostname,
+        router_id=device.router_id,
+        allocated_interfaces=[
+            SimpleNamespace(
+                interface=interface.interface,
+                ip_address=str(interface.ip_address),
+                description=interface.description,
+                allocated=interface.allocated,
+                ospf_enabled=interface.ospf_enabled,
+            )
+            for interface in device.allocated_interfaces
+        ],
+        ospf=SimpleNamespace(
+            networks=[str(network) for network in device.ospf.networks]
+        ),
+        bgp=SimpleNamespace(
+            asn=device.bgp.asn,
+            neighbors=[dict(neighbor) for neighbor in device.bgp.neighbors],
+            networks=list(device.bgp.networks),
+            export_networks=list(device.bgp.export_networks),
+            dynamic_peers=device.bgp.dynamic_peers,
+            peer_groups=[
+                SimpleNamespace(
+                    name=group.name,
+                    description=group.description,
+                    route_reflector_client=group.route_reflector_client,
+                    export_prefix_list=group.export_prefix_list,
+                    remote_as=group.remote_as,
+                    update_source=group.update_source,
+                    listen_ranges=list(group.listen_ranges),
+                )
+                for group in device.bgp.peer_groups
+            ],
+        ),
+    )
+
+
+def write_config_to_file(
+    config: str,
+    filename: str,
+    manifest: RenderManifest = None,
+    verbose: bool = False,
+    archive: ConfigArchive = None,
+) -> bool:
+    """Write config to filename, skipping the write if the manifest shows it is unchanged
+    With an archive, the config is added to it as a member named after filename instead
+    Return True if the file was written"""
+    with metrics.phase("render.write"):
+        if archive is not None:
+            if verbose:
+                print(f"Adding {os.path.basename(filename)} to configuration archive")
+            metrics.count("render.files_archived")
+            return archive.add(filename=filename, config=config)
+
+        digest = config_digest(config)
+        if manifest and manifest.is_current(filename, digest):
+            manifest.record(filename, digest, written=False)
+            metrics.count("render.files_unchanged")
+            return False
+
+        if verbose:
+            print(f"Writing configurations to {filename}")
+        with open(os.path.join(filename), "w") as f:
+            f.write(config)
+
+        if manifest:
+            manifest.record(filename, digest, written=True)
+        metrics.count("render.files_written")
 
-def generate_ospfd_config(device, output_dir) -> str:
-    template = """router ospf
-  max-metric router-lsa on-startup 60
-{% for network in device.ospf.networks %}
-  network {{ network }} area 0
-{%- endfor %}
+    return True
 
-"""
 
-    jinja_template = Template(template)
-    config = jinja_template.render(device=device)
+def generate_zebra_config(
+    device,
+    output_dir,
+    renderer: FrrRenderer = None,
+    manifest: RenderManifest = None,
+    archive: ConfigArchive = None,
+) -> str:
+    renderer = renderer or default_renderer()
+    config = renderer.render("zebra", device)
+    filename = os.path.join(output_dir, f"{device.hostname}_zebra.conf")
+    write_config_to_file(
+        config=config,
+        filename=filename,
+        manifest=manifest,
+        verbose=renderer.verbose,
+        archive=archive,
+    )
+
+    return config
+
+
+def generate_ospfd_config(
+    device,
+    output_dir,
+    renderer: FrrRenderer = None,
+    manifest: RenderManifest = None,
+    archive: ConfigArchive = None,
+) -> str:
+    renderer = renderer or default_renderer()
+    config = renderer.render("ospfd", device)
     filename = os.path.join(output_dir, f"{device.hostname}_ospfd.conf")
-    write_config_to_file(config=config, filename=filename)
+    write_config_to_file(
+        config=config,
+        filename=filename,
+        manifest=manifest,
+        verbose=renderer.verbose,
+        archive=archive,
+    )
 
     return config
 
 
-def generate_bgpd_config(device, output_dir) -> str:
-    template = """ip prefix-list ANY permit 0.0.0.0/0 le 32
-{%- if 't1' in device.hostname -%}
-{%- set sequence_number = namespace(value=10) -%}
-{% for network in device.bgp.networks %}
-ip prefix-list EXTERNAL-NETWORKS seq {{ sequence_number.value }} permit {{ network }} le 24
-{%- set sequence_number.value = sequence_number.value + 10 -%}
-{%- endfor %}
-ip prefix-list EXTERNAL-NETWORKS seq 1000 deny any
-route-map RM-T2-OUT permit 10
- match ip address prefix-list EXTERNAL-NETWORKS
-route-map RM-T2-IN permit 10
- match ip address prefix-list ANY
-{% elif 't2' in device.hostname %}
-route-map RM-T1-OUT permit 10
- match ip address prefix-list ANY
-route-map RM-T1-IN permit 10
- match ip address prefix-list ANY
-{% endif %}
-router bgp {{ device.bgp.asn}}
-  bgp router-id {{device.router_id}}
-{% if 't1' in device.hostname %}
-  neighbor T2 peer-group
-  neighbor T2 update-source lo
-  neighbor T2 remote-as 65000
-  neighbor T2 description T2 Route-Reflector Peers
-  neighbor T2 soft-reconfiguration inbound
-  neighbor T2 route-map RM-T2-IN in
-  neighbor T2 route-map RM-T2-OUT out
-{% elif 't2' in device.hostname %}
-  neighbor T1 peer-group
-  neighbor T1 update-source lo
-  neighbor T1 remote-as 65000
-  neighbor T1 description T1 Route-Reflector Clients
-  neighbor T1 soft-reconfiguration inbound
-  neighbor T1 route-reflector-client
-  neighbor T1 route-map RM-T1-IN in
-  neighbor T1 route-map RM-T1-OUT out
-{% endif %}
-{% for neighbor in device.bgp.neighbors %}
-  neighbor {{ neighbor['ip_address'] }} peer-group {{ neighbor['peer_group'] }}
-{%- endfor %}
-{% for network in device.bgp.networks %}
-  network {{ network }}
-{%- endfor %}
-"""
-
-    jinja_template = Template(template)
-    config = jinja_template.render(device=device)
+def generate_bgpd_config(
+    device,
+    output_dir,
+    renderer: FrrRenderer = None,
+    manifest: RenderManifest = None,
+    archive: ConfigArchive = None,
+) -> str:
+    renderer = renderer or default_renderer()
+    config = renderer.render("bgpd", device)
     filename = os.path.join(output_dir, f"{device.hostname}_bgpd.conf")
-    write_config_to_file(config=config, filename=filename)
+    write_config_to_file(
+        config=config,
+        filename=filename,
+        manifest=manifest,
+        verbose=renderer.verbose,
+        archive=archive,
+    )
 
     return config
 
 
 def integrate_frr_config(
-    device, output_dir: str, zebra_config: str, ospfd_config: str, bgpd_config: str
+    device,
+    output_dir: str,
+    zebra_config: str,
+    ospfd_config: str,
+    bgpd_config: str,
+    manifest: RenderManifest = None,
+    verbose: bool = False,
+    archive: ConfigArchive = None,
 ) -> None:
     """Combine Zebra, ospfd and bpgd configs into an integrated FRR config file"""
     filename = os.path.join(output_dir, f"{device.hostname}_frr.conf")
     config = "\n".join([zebra_config, ospfd_config, bgpd_config])
-    write_config_to_file(filename=filename, config=config)
+    write_config_to_file(
+        filename=filename,
+        config=config,
+        manifest=manifest,
+        verbose=verbose,
+        archive=archive,
+    )
+
+
+def generate_frr_configs(
+    device,
+    output_dir,
+    renderer: FrrRenderer = None,
+    manifest: RenderManifest = None,
+    archive: ConfigArchive = None,
+) -> bool:
+    """Render and write all FRR configs for a device
+    By default only the integrated frr.conf is rendered, in a single template pass
+    Return True if any of the device's files changed"""
+    renderer = renderer or default_renderer()
+    # An archive tracks changes itself, a ConfigCollector leaves it to the parent process
+    tracker = archive if isinstance(archive, ConfigArchive) else manifest
+    changed_before = len(tracker.changed_files) if tracker else 0
+    if renderer.split_configs:
+        zebra_config = generate_zebra_config(
+            device, output_dir, renderer, manifest, archive
+        )
+        ospfd_config = generate_ospfd_config(
+            device, output_dir, renderer, manifest, archive
+        )
+        bgpd_config = generate_bgpd_config(
+            device, output_dir, renderer, manifest, archive
+        )
+        integrate_frr_config(
+            device,
+            output_dir,
+            zebra_config,
+            ospfd_config,
+            bgpd_config,
+            manifest,
+            verbose=renderer.verbose,
+            archive=archive,
+        )
+    else:
+        write_config_to_file(
+            config=renderer.render("frr", device),
+            filename=os.path.join(output_dir, f"{device.hostname}_frr.conf"),
+            manifest=manifest,
+            verbose=renderer.verbose,
+            archive=archive,
+        )
+    metrics.count("render.devices")
+
+    if not tracker:
+        return True
+
+    changed = len(tracker.changed_files) > changed_before
+    if changed:
+        tracker.changed_devices.append(device.hostname)
+
+    return changed
+
+
+_worker_renderer: Optional[FrrRenderer] = None
+_worker_manifest_entries: Optional[Dict[str, Dict]] = None
+
+
+def _initialize_worker(
+    renderer_options: Dict, manifest_entries: Dict[str, Dict]
+) -> None:
+    global _worker_renderer, _worker_manifest_entries
+    _worker_renderer = FrrRenderer(**renderer_options)
+    _worker_manifest_entries = manifest_entries
+
+
+def _render_in_worker(
+    context: SimpleNamespace, output_dir: str, collect: bool
+) -> Tuple[
+    str, Optional[Dict[str, Dict]], bool, Dict[str, Dict], List[Tuple[str, str]]
+]:
+    """Render one device inside a worker process
+    Output and metrics are captured and returned so the parent can merge them in device order
+    With collect, configs are returned for the parent to archive instead of being written
+    """
+    metrics.clear()
+    manifest = None
+    if _worker_manifest_entries is not None:
+        manifest = RenderManifest(output_dir, entries=_worker_manifest_entries)
+    collector = ConfigCollector() if collect else None
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        changed = generate_frr_configs(
+            context, output_dir, _worker_renderer, manifest, collector
+        )
+
+    return (
+        output.getvalue(),
+        manifest.current if manifest else None,
+        changed,
+        metrics.as_dict(),
+        collector.files if collector else [],
+    )
+
+
+@timed("render.total")
+def render_devices(
+    devices: Iterable,
+    output_dir: str,
+    renderer: FrrRenderer = None,
+    jobs: int = 1,
+    manifest: RenderManifest = None,
+    archive: ConfigArchive = None,
+) -> List[str]:
+    """Render FRR configs for every device, fanning out over a process pool when jobs > 1
+    Configs are written to output_dir, or added to archive when one is given
+    Return the hostnames of devices whose configs changed"""
+    renderer = renderer or default_renderer()
+    changed_devices = []
+    if jobs <= 1:
+        for device in devices:
+            if generate_frr_configs(device, output_dir, renderer, manifest, archive):
+                changed_devices.append(device.hostname)
+    else:
+        # Contexts are built in bounded batches so a streamed model is never fully materialized
+        batch_size = jobs * RENDER_BATCH_PER_JOB
+        devices = iter(devices)
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_initialize_worker,
+            initargs=(renderer.options, manifest.previous if manifest else None),
+        ) as pool:
+            while True:
+                contexts: List[SimpleNamespace] = [
+                    build_render_context(device)
+                    for device in islice(devices, batch_size)
+                ]
+                if not contexts:
+                    break
+
+                results = pool.map(
+                    _render_in_worker,
+                    contexts,
+                    repeat(output_dir),
+                    repeat(archive is not None),
+                    chunksize=max(1, len(contexts) // (jobs * 4)),
+                )
+                for context, (output, entries, changed, snapshot, files) in zip(
+                    contexts, results
+                ):
+                    print(output, end="")
+                    metrics.merge(snapshot)
+                    if archive:
+                        changes = [archive.add(name, config) for name, config in files]
+                        changed = any(changes)
+                        if changed:
+                            archive.changed_devices.append(context.hostname)
+                    if manifest:
+                        manifest.merge(
+                            entries,
+                            changed_device=context.hostname if changed else None,
+                        )
+                    if changed:
+                        changed_devices.append(context.hostname)
 
+    if manifest:
+        manifest.save()
 
-def generate_frr_configs(device, output_dir):
-    zebra_config = generate_zebra_config(device, output_dir)
-    ospfd_config = generate_ospfd_config(device, output_dir)
-    bgpd_config = generate_bgpd_config(device, output_dir)
-    integrate_frr_config(device, output_dir, zebra_config, ospfd_config, bgpd_config)
+    return changed_devices
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+
+MANIFEST_FILENAME = ".closbuilder_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def config_digest(config: str) -> str:
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+class RenderManifest:
+    """This class tracks a content hash for every config file written to an output directory
+    Files whose rendered content and on-disk state match the previous run are not rewritten"""
+
+    def __init__(self, output_dir: str, entries: Dict[str, Dict] = None) -> None:
+        self.output_dir = output_dir
+        self.previous: Dict[str, Dict] = entries if entries is not None else self.load()
+        self.current: Dict[str, Dict] = {}
+        # Files rewritten because their content changed
+        self.changed_files: List[str] = []
+        self.changed_devices: List[str] = []
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.output_dir, MANIFEST_FILENAME)
+
+    def load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+
+        return manifest.get("files", {})
+
+    def is_current(self, filename: str, digest: str) -> bool:
+        """A file is current if its hash is unchanged and nobody touched it since the last run"""
+        entry = self.previous.get(os.path.basename(filename))
+        if not entry or entry["sha256"] != digest:
+            return False
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+
+        return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+    def record(self, filename: str, digest: str, written: bool) -> None:
+        stat = os.stat(filename)
+        self.current[os.path.basename(filename)] = {
+            "sha256": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if written:
+            self.changed_files.append(filename)
+
+    def merge(self, entries: Dict[str, Dict], changed_device: str = None) -> None:
+        """Merge entries recorded by another manifest, eg. one used in a worker process"""
+        self.current.update(entries)
+        if changed_device:
+            self.changed_devices.append(changed_device)
+
+    def save(self) -> None:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "files": self.current,
+            "changed_devices": self.changed_devices,
+        }
+        with open(self.path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
@@ -0,0 +1,24 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from models.clos import TwoTierClos
+
+
+@pytest.fixture
+def small_fabric():
+    """Return a factory for a 2-wide TwoTierClos, keyword arguments override its parameters"""
+
+    def build(**parameters) -> TwoTierClos:
+        parameters = {
+            "width": 2,
+            "device_interface_count": 4,
+            "internal_supernet": "10.0.0.0/24",
+            "loopback_supernet": "172.16.0.0/24",
+            **parameters,
+        }
+        with redirect_stdout(io.StringIO()):
+            return TwoTierClos(**parameters)
+
+    return build
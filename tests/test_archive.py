@@ -0,0 +1,122 @@
+import io
+import os
+import tarfile
+import zipfile
+from contextlib import redirect_stdout
+
+import pytest
+
+from models.clos import TwoTierClos
+from render.archive import (
+    ARCHIVE_MANIFEST,
+    ConfigArchive,
+    ConfigBundle,
+    ConfigCollector,
+    read_archive_manifest,
+)
+from render.manifest import config_digest
+
+
+HOSTNAMES = ["t1-r1", "t1-r2", "t2-r1", "t2-r2"]
+FILENAMES = [f"{hostname}_frr.conf" for hostname in HOSTNAMES]
+
+
+def archive(model: TwoTierClos, path: str, jobs: int = 1, force: bool = False):
+    output_format = "zip" if path.endswith(".zip") else "tar"
+    with ConfigArchive(
+        path, output_format=output_format, force=force
+    ) as config_archive:
+        with redirect_stdout(io.StringIO()):
+            changed = model.render(output_dir="", jobs=jobs, archive=config_archive)
+    return config_archive, changed
+
+
+def loose_files(model: TwoTierClos, output_dir: str) -> dict:
+    with redirect_stdout(io.StringIO()):
+        model.render(output_dir=output_dir)
+    files = {}
+    for filename in FILENAMES:
+        with open(os.path.join(output_dir, filename), "rb") as f:
+            files[filename] = f.read()
+    return files
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize("name", ["configs.tar", "configs.tar.gz", "configs.zip"])
+def test_archive_round_trip(tmp_path, small_fabric, name, jobs):
+    path = str(tmp_path / name)
+    config_archive, changed = archive(small_fabric(), path, jobs=jobs)
+    assert sorted(changed) == HOSTNAMES
+    assert sorted(config_archive.changed_devices) == HOSTNAMES
+    assert not os.path.exists(f"{path}.{os.getpid()}.tmp")
+
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(path) as zip_file:
+            assert sorted(zip_file.namelist()) == sorted(FILENAMES + [ARCHIVE_MANIFEST])
+    else:
+        with tarfile.open(path) as tar:
+            members = tar.getmembers()
+            assert sorted(member.name for member in members) == sorted(
+                FILENAMES + [ARCHIVE_MANIFEST]
+            )
+            assert {member.mode for member in members} == {0o640}
+
+    expected = loose_files(small_fabric(), str(tmp_path))
+    with ConfigBundle(path) as bundle:
+        assert all(filename in bundle for filename in FILENAMES)
+        assert {filename: bundle.read(filename) for filename in FILENAMES} == expected
+        assert bundle.manifest["files"] == {
+            filename: config_digest(config.decode("utf-8"))
+            for filename, config in expected.items()
+        }
+        assert sorted(bundle.manifest["changed_devices"]) == HOSTNAMES
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize("name", ["configs.tar", "configs.zip"])
+def test_unchanged_rerun_reports_nothing_changed(tmp_path, small_fabric, name, jobs):
+    path = str(tmp_path / name)
+    archive(small_fabric(), path, jobs=jobs)
+
+    config_archive, changed = archive(small_fabric(), path, jobs=jobs)
+    assert changed == []
+    assert config_archive.changed_files == []
+    assert read_archive_manifest(path)["changed_devices"] == []
+
+    model = small_fabric(external_networks={"192.168.1.0/24": ["t1-r2"]})
+    config_archive, changed = archive(model, path, jobs=jobs)
+    assert changed == ["t1-r2"]
+    assert config_archive.changed_files == ["t1-r2_frr.conf"]
+
+
+@pytest.mark.parametrize("name", ["configs.tar", "configs.zip"])
+def test_force_rewrites_everything(tmp_path, small_fabric, name):
+    path = str(tmp_path / name)
+    archive(small_fabric(), path)
+
+    config_archive, changed = archive(small_fabric(), path, force=True)
+    assert sorted(changed) == HOSTNAMES
+    assert sorted(config_archive.changed_files) == FILENAMES
+
+
+def test_failed_render_keeps_the_previous_archive(tmp_path, small_fabric):
+    path = str(tmp_path / "configs.tar")
+    archive(small_fabric(), path)
+    with open(path, "rb") as f:
+        previous = f.read()
+
+    with pytest.raises(RuntimeError):
+        with ConfigArchive(path) as config_archive:
+            config_archive.add("t1-r1_frr.conf", "partial\n")
+            raise RuntimeError("render failed")
+
+    with open(path, "rb") as f:
+        assert f.read() == previous
+    assert os.listdir(str(tmp_path)) == ["configs.tar"]
+
+
+def test_collector_keeps_basenames_in_order():
+    collector = ConfigCollector()
+    assert collector.add("/tmp/out/t1-r1_frr.conf", "a\n")
+    assert collector.add("t1-r2_frr.conf", "b\n")
+    assert collector.files == [("t1-r1_frr.conf", "a\n"), ("t1-r2_frr.conf", "b\n")]
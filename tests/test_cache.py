@@ -0,0 +1,87 @@
+import io
+import os
+import pickle
+import shutil
+from contextlib import redirect_stdout
+
+from generate_configurations import build_model
+from models import cache as model_cache
+from models.cache import MODEL_SOURCES, ModelCache, model_cache_key
+from render.frr_render import build_render_context, default_renderer
+
+
+NETWORK_DETAILS = {
+    "architecture": "TwoTierClos",
+    "width": 2,
+    "device_interface_count": 4,
+    "internal_supernet": "10.0.0.0/24",
+    "loopback_supernet": "172.16.0.0/24",
+    "external_networks": {"192.168.1.0/24": ["t1-r1"]},
+}
+
+
+def build(cache_dir: str, **overrides):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        model = build_model(
+            network_details={**NETWORK_DETAILS, **overrides}, cache_dir=cache_dir
+        )
+    return model, "Loaded model from" in output.getvalue()
+
+
+def render_all(model) -> dict:
+    renderer = default_renderer()
+    return {
+        device.hostname: renderer.render("frr", build_render_context(device))
+        for device in model.devices
+    }
+
+
+def test_cached_model_round_trips(tmp_path):
+    cache_dir = str(tmp_path)
+    model, loaded = build(cache_dir)
+    assert not loaded
+    assert len(os.listdir(cache_dir)) == 1
+
+    cached, loaded = build(cache_dir)
+    assert loaded
+    assert cached is not model
+    assert list(cached.links) == list(model.links)
+    assert render_all(cached) == render_all(model)
+
+
+def test_changed_parameters_are_rebuilt(tmp_path):
+    cache_dir = str(tmp_path)
+    build(cache_dir)
+
+    model, loaded = build(cache_dir, external_networks={"192.168.2.0/24": ["t1-r2"]})
+    assert not loaded
+    assert len(os.listdir(cache_dir)) == 2
+    assert build(cache_dir, external_networks={"192.168.2.0/24": ["t1-r2"]})[1]
+
+
+def test_changed_model_source_invalidates_the_key(tmp_path, monkeypatch):
+    sources = tmp_path / "models"
+    sources.mkdir()
+    for source in MODEL_SOURCES:
+        shutil.copy(
+            os.path.join(os.path.dirname(model_cache.__file__), source), sources
+        )
+    monkeypatch.setattr(model_cache, "__file__", str(sources / "cache.py"))
+
+    parameters = {"width": 2}
+    key = model_cache_key(architecture="TwoTierClos", parameters=parameters)
+    assert model_cache_key(architecture="TwoTierClos", parameters=parameters) == key
+
+    with open(sources / "links.py", "a") as f:
+        f.write("\n# changed\n")
+    assert model_cache_key(architecture="TwoTierClos", parameters=parameters) != key
+
+
+def test_snapshot_with_foreign_globals_is_not_loaded(tmp_path):
+    cache = ModelCache(cache_dir=str(tmp_path))
+    with open(cache.path(key="evil"), "wb") as f:
+        pickle.dump(shutil.rmtree, f)
+
+    assert cache.load(key="evil") is None
+    assert cache.load(key="missing") is None
@@ -0,0 +1,155 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from generate_configurations import build_model
+from models import exceptions
+from models.clos import (
+    ClosArchitecture,
+    aggregate_networks,
+    index_external_networks,
+)
+from render.frr_render import default_renderer
+
+
+def test_architecture_requires_devices():
+    class Incomplete(ClosArchitecture):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(internal_supernet="10.0.0.0/24", loopback_supernet="10.1.0.0/24")
+
+
+def test_architecture_requires_device_count():
+    class Uncounted(ClosArchitecture):
+        devices = edge_devices = []
+
+    with pytest.raises(TypeError):
+        Uncounted(internal_supernet="10.0.0.0/24", loopback_supernet="10.1.0.0/24")
+
+
+def build(**overrides):
+    network_details = {
+        "architecture": "TwoTierClos",
+        "width": 4,
+        "device_interface_count": 8,
+        "internal_supernet": "10.0.0.0/24",
+        "loopback_supernet": "10.255.255.0/28",
+    }
+    network_details.update(overrides)
+    with redirect_stdout(io.StringIO()):
+        return build_model(network_details=network_details)
+
+
+def render(model, hostname: str) -> str:
+    device = next(device for device in model.devices if device.hostname == hostname)
+    return default_renderer().render("frr", device)
+
+
+def test_dynamic_listen_range_only_covers_t1_loopbacks():
+    model = build(bgp_peering="dynamic", reserved_loopbacks=["10.255.255.1/32"])
+    config = render(model, "t2-r1")
+
+    assert "bgp listen range 10.255.255.0/32 peer-group T1" in config
+    assert "bgp listen range 10.255.255.2/31 peer-group T1" in config
+    assert "bgp listen range 10.255.255.4/32 peer-group T1" in config
+    assert config.count("bgp listen range") == 3
+
+
+def test_unnumbered_links_send_router_advertisements():
+    config = render(build(bgp_peering="ebgp_unnumbered"), "t1-r1")
+    assert config.count("no ipv6 nd suppress-ra") == 4
+    assert config.count("ipv6 nd ra-interval 10") == 4
+
+    assert "ipv6 nd" not in render(build(), "t1-r1")
+
+
+def test_exceptions_are_still_importable_from_clos():
+    from models.clos import InsufficientIpSubnets, InvalidArchitecture
+
+    assert InsufficientIpSubnets is exceptions.InsufficientIpSubnets
+    assert InvalidArchitecture is exceptions.InvalidArchitecture
+
+
+@pytest.mark.parametrize(
+    "networks,aggregated",
+    [
+        (["192.168.1.0/24", "192.168.0.0/24"], ["192.168.0.0/23"]),
+        (["192.168.1.0/24", "192.168.2.0/24"], ["192.168.1.0/24", "192.168.2.0/24"]),
+        (["10.0.0.0/24", "10.0.2.0/24"], ["10.0.0.0/24", "10.0.2.0/24"]),
+        (["192.168.1.7/24", "192.168.1.128/25"], ["192.168.1.0/24"]),
+        (
+            ["2001:db8:1::/48", "10.0.0.0/8", "2001:db8::/48"],
+            ["10.0.0.0/8", "2001:db8::/47"],
+        ),
+    ],
+    ids=["adjacent", "unaligned", "gap", "host_bits", "dual_stack"],
+)
+def test_aggregate_networks(networks, aggregated):
+    assert aggregate_networks(networks) == aggregated
+
+
+def test_index_external_networks_keeps_input_order():
+    index = index_external_networks(
+        {
+            "192.168.2.0/24": ["t1-r2", "t1-r1", "t1-r2"],
+            "192.168.1.0/24": ["t1-r1"],
+        }
+    )
+    assert index == {
+        "t1-r2": ["192.168.2.0/24"],
+        "t1-r1": ["192.168.2.0/24", "192.168.1.0/24"],
+    }
+
+
+def test_only_the_export_prefix_list_is_aggregated():
+    external_networks = {
+        "192.168.0.0/24": ["t1-r1"],
+        "192.168.1.0/24": ["t1-r1", "t1-r2"],
+        "192.168.3.0/24": ["t1-r1"],
+    }
+    config = render(
+        build(aggregate_external_networks=True, external_networks=external_networks),
+        "t1-r1",
+    )
+    prefix_list = [
+        line for line in config.splitlines() if "EXTERNAL-NETWORKS seq" in line
+    ]
+    networks = [
+        line for line in config.splitlines() if line.startswith("  network 192")
+    ]
+
+    assert prefix_list == [
+        "ip prefix-list EXTERNAL-NETWORKS seq 10 permit 192.168.0.0/23 le 24",
+        "ip prefix-list EXTERNAL-NETWORKS seq 20 permit 192.168.3.0/24 le 24",
+        "ip prefix-list EXTERNAL-NETWORKS seq 1000 deny any",
+    ]
+    assert networks == [
+        "  network 192.168.0.0/24",
+        "  network 192.168.1.0/24",
+        "  network 192.168.3.0/24",
+    ]
+
+    config = render(build(external_networks=external_networks), "t1-r1")
+    assert "permit 192.168.1.0/24 le 24" in config
+    assert "192.168.0.0/23" not in config
+
+
+@pytest.mark.parametrize("bgp_peering", ["full_mesh", "dynamic"])
+def test_spines_without_peers_have_no_bgp_stanza(bgp_peering):
+    model = build(bgp_peering=bgp_peering, route_reflectors=2)
+
+    assert "router bgp 65000" in render(model, "t2-r2")
+    config = render(model, "t2-r3")
+    assert "bgp" not in config
+    assert "prefix-list" not in config
+    assert config.endswith("network 10.0.0.22/31 area 0\n\n")
+
+
+def test_listen_ranges_are_only_built_for_dynamic_peering():
+    assert build().t1_dynamic_clients is None
+    assert build(bgp_peering="ebgp_unnumbered").t1_dynamic_clients is None
+    assert build(bgp_peering="dynamic").t1_dynamic_clients.listen_ranges == (
+        "10.255.255.0/30",
+    )
@@ -0,0 +1,74 @@
+import io
+import os
+from contextlib import redirect_stdout
+
+import pytest
+
+from deploy.config_diff import diff_configs, number_prefix_lists, parse_stanzas
+from generate_configurations import build_model, parse_input_yaml
+from render.frr_render import build_render_context, default_renderer
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+EXAMPLE = os.path.join(
+    os.path.dirname(__file__), "..", "examples", "TwoTierClos_8w.yaml"
+)
+
+
+@pytest.fixture(scope="module")
+def generated() -> str:
+    with redirect_stdout(io.StringIO()):
+        model = build_model(network_details=parse_input_yaml(filename=EXAMPLE))
+    device = next(device for device in model.devices if device.hostname == "t1-r1")
+    return default_renderer().render("frr", build_render_context(device))
+
+
+@pytest.fixture(scope="module")
+def running() -> str:
+    with open(os.path.join(FIXTURES, "t1-r1_running.conf"), "r") as f:
+        return f.read()
+
+
+def test_running_config_matches_rendered_config(running, generated):
+    assert not diff_configs(running=running, generated=generated)
+
+
+def test_changed_neighbor_is_detected(running, generated):
+    running = running.replace(
+        "neighbor 10.255.255.15 peer-group T2", "neighbor 10.255.255.7 peer-group T2"
+    )
+    delta = diff_configs(running=running, generated=generated)
+    assert delta.changed == ["router bgp 65000"]
+    assert not delta.added and not delta.removed
+
+
+def test_missing_stanza_is_added(running, generated):
+    running = running.replace(
+        "route-map RM-T2-IN permit 10", "route-map RM-T2-IN deny 10"
+    )
+    delta = diff_configs(running=running, generated=generated)
+    assert delta.added == ["route-map RM-T2-IN permit 10"]
+    assert delta.removed == ["route-map RM-T2-IN deny 10"]
+
+
+def test_prefix_lists_are_numbered_like_frr():
+    assert number_prefix_lists(
+        [
+            "ip prefix-list A permit 10.0.0.0/8",
+            "ip prefix-list A permit 11.0.0.0/8",
+            "ip prefix-list B seq 12 permit any",
+            "ip prefix-list B deny any",
+            "ipv6 prefix-list A permit ::/0",
+        ]
+    ) == [
+        "ip prefix-list A seq 5 permit 10.0.0.0/8",
+        "ip prefix-list A seq 10 permit 11.0.0.0/8",
+        "ip prefix-list B seq 12 permit any",
+        "ip prefix-list B seq 15 deny any",
+        "ipv6 prefix-list A seq 5 permit ::/0",
+    ]
+
+
+def test_default_stanzas_are_ignored():
+    stanzas = parse_stanzas("line vty\n exec-timeout 0 0\n!\nend\nhostname r1\n")
+    assert stanzas == {"hostname r1": set()}
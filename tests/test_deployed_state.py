@@ -0,0 +1,70 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from deploy.fake_docker import FakeDockerClient
+from deploy.state import DeployedState, deployed_state_path
+from deploy.transport import DockerTransport
+from deploy_gns import config_digests, deploy_config
+from models.clos import TwoTierClos
+from render.manifest import RenderManifest
+
+
+def generate(model: TwoTierClos, output_dir: str) -> None:
+    manifest = RenderManifest(output_dir)
+    model.render(output_dir=output_dir, manifest=manifest)
+
+
+def pending(config_dir: str, routers) -> list:
+    state = DeployedState(path=deployed_state_path(config_dir))
+    digests = config_digests(routers=routers, config_dir=config_dir)
+    return sorted(
+        router for router in routers if not state.is_deployed(router, digests[router])
+    )
+
+
+def deploy(config_dir: str, routers) -> None:
+    client = FakeDockerClient(routers=routers)
+    deploy_config(
+        router_container_map=client.router_container_map,
+        transport=DockerTransport(clients={"fake": client}),
+        config_dir=config_dir,
+        wave_size="100%",
+        deployed_state=DeployedState(path=deployed_state_path(config_dir)),
+    )
+
+
+@pytest.fixture
+def quiet():
+    with redirect_stdout(io.StringIO()):
+        yield
+
+
+def test_devices_stay_pending_until_deployed(tmp_path, quiet, small_fabric):
+    config_dir = str(tmp_path)
+    model = small_fabric()
+    routers = [device.hostname for device in model.devices]
+    generate(model, config_dir)
+    assert pending(config_dir, routers) == sorted(routers)
+
+    changed = small_fabric(external_networks={"192.168.1.0/24": ["t1-r1"]})
+    generate(changed, config_dir)
+    deploy(config_dir, ["t1-r2"])
+
+    # A second generation with nothing new must not forget undeployed devices
+    generate(changed, config_dir)
+    assert pending(config_dir, routers) == ["t1-r1", "t2-r1", "t2-r2"]
+
+    deploy(config_dir, ["t1-r1", "t2-r1", "t2-r2"])
+    assert pending(config_dir, routers) == []
+
+    generate(small_fabric(), config_dir)
+    assert pending(config_dir, routers) == ["t1-r1"]
+
+
+def test_state_of_an_archive_is_kept_next_to_it(tmp_path):
+    archive = tmp_path / "configs.tar"
+    archive.write_bytes(b"")
+    assert deployed_state_path(str(archive)) == f"{archive}.deployed.json"
+    assert deployed_state_path(str(tmp_path)).startswith(str(tmp_path))
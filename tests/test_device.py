@@ -0,0 +1,67 @@
+import pytest
+
+from models.clos import Device, Interface
+from models.exceptions import InsufficientInterfaces
+from models.ip_allocator import LazyPrefix
+
+
+def make_device(interface_count: int = 4) -> Device:
+    return Device(
+        hostname="t1-r1",
+        interface_count=interface_count,
+        loopback=LazyPrefix(0x0A000001, 32),
+    )
+
+
+def test_released_port_is_allocated_again():
+    device = make_device()
+    interface = device.allocate_interface(direction="southbound")
+    interface.ip_address = "10.1.0.0/31"
+    device.release_interface(interface.interface)
+
+    assert not interface.allocated and interface.ip_address == ""
+    assert device.allocate_interface(direction="southbound") == interface
+
+
+def test_loopback_is_never_released():
+    device = make_device()
+    with pytest.raises(ValueError):
+        device.release_interface("lo")
+
+    assert device.interfaces[-1].allocated
+    assert str(device.interfaces[-1].ip_address) == "10.0.0.1/32"
+
+
+def test_next_available_interface_uses_the_pool_of_its_list():
+    device = make_device()
+    assert device.next_available_interface(device.southbound_interfaces).port == 2
+    assert device.next_available_interface(device.northbound_interfaces).port == 0
+    device.next_available_interface(device.northbound_interfaces)
+    with pytest.raises(InsufficientInterfaces):
+        device.next_available_interface(device.northbound_interfaces)
+
+
+@pytest.mark.parametrize("name", ["eth", "ethX", "eth-1", "eth4", "lo0", "swp1"])
+def test_unknown_interface_names_raise_key_error(name):
+    device = make_device()
+    with pytest.raises(KeyError):
+        device.interfaces.index_of(name)
+
+
+def test_interfaces_are_looked_up_by_name():
+    device = make_device()
+    interface = device.allocate_interface(direction="southbound")
+
+    assert device.get_interface(interface.interface) == interface
+    assert device.get_interface("lo").ip_address == device.interfaces[-1].ip_address
+    with pytest.raises(KeyError):
+        device.get_interface("eth9")
+
+
+def test_deprecated_interface_still_works():
+    device = make_device()
+    assert isinstance(device.get_interface("eth0"), Interface)
+
+    with pytest.warns(DeprecationWarning):
+        interface = Interface(interface="eth0", ip_address="10.0.0.0/31")
+    assert interface.ip_address == "10.0.0.0/31" and not interface.allocated
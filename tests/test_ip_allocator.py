@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from models.exceptions import InsufficientIpSubnets
+from models.ip_allocator import SubnetAllocator
+
+
+ALLOCATORS = [
+    ("10.0.0.0/24", 31, []),
+    ("10.0.0.0/24", 31, ["10.0.0.0/28", "10.0.0.64/30", "10.0.0.66/31"]),
+    ("10.255.255.0/26", 32, ["10.255.255.3/32", "10.255.255.16/29"]),
+    ("10.0.0.0/24", 31, ["10.0.0.250/31", "10.0.0.200/29"]),
+    ("fd00::/120", 127, ["fd00::10/124"]),
+]
+
+
+@pytest.mark.parametrize("supernet,new_prefix,reserved", ALLOCATORS)
+def test_allocate_block_matches_allocate(supernet, new_prefix, reserved):
+    expected = SubnetAllocator(supernet, new_prefix, reserved=reserved)
+    blocks = SubnetAllocator(supernet, new_prefix, reserved=reserved)
+    randomizer = random.Random(supernet + str(reserved))
+
+    while expected.remaining:
+        count = min(randomizer.randint(1, 20), expected.remaining)
+        networks = [str(expected.allocate()) for _ in range(count)]
+        values = blocks.allocate_block(count)
+        assert [str(blocks.prefix(value)) for value in values] == networks
+        assert blocks.allocated == expected.allocated
+        assert blocks.remaining == expected.remaining
+
+    with pytest.raises(InsufficientIpSubnets):
+        blocks.allocate_block(1)
+
+
+@pytest.mark.parametrize("supernet,new_prefix,reserved", ALLOCATORS)
+def test_prefix_at_matches_allocate(supernet, new_prefix, reserved):
+    allocator = SubnetAllocator(supernet, new_prefix, reserved=reserved)
+    positions = SubnetAllocator(supernet, new_prefix, reserved=reserved)
+
+    for position in range(allocator.remaining):
+        network = allocator.allocate()
+        assert str(positions.prefix_at(position)) == str(network)
+        assert positions.network_at(position) == network
+
+    with pytest.raises(InsufficientIpSubnets):
+        positions.prefix_at(allocator.allocated)
@@ -0,0 +1,56 @@
+from models.links import Link, LinkTable
+from validation.validator import FabricValidator, ValidationIssue
+
+
+def test_links_are_found_by_subnet():
+    links = LinkTable()
+    links.add("t2-r1", 2, "t1-r1", 0, subnet_index=0)
+    links.add("t2-r1", 3, "t1-r2", 0, subnet_index=5)
+
+    assert links.link_for_subnet(5) == Link("t2-r1", 3, "t1-r2", 0, 5)
+    assert links.link_for_subnet(0).device_b == "t1-r1"
+    assert links.link_for_subnet(1) is None
+
+
+def test_subnet_positions_follow_the_allocator(small_fabric):
+    model = small_fabric(reserved_internal_subnets=["10.0.0.2/31"])
+    for link in model.links:
+        subnet = model.link_subnet(link)
+        position = model.internal_subnets.position_of(int(subnet.network_address))
+        assert model.links.link_for_subnet(position) == link
+
+
+def test_subnet_used_by_other_interfaces_is_reported(small_fabric):
+    model = small_fabric()
+    t1_r1, t1_r2 = model.devices[0], model.devices[1]
+    t1_r1.interfaces[0].ip_address = "10.0.0.3/31"
+    t1_r2.interfaces[0].ip_address = "10.0.0.1/31"
+
+    issues = FabricValidator(model).validate_model()
+    assert [issue for issue in issues if issue.check == "duplicate_ip"] == [
+        ValidationIssue(
+            "duplicate_ip",
+            "t1-r1",
+            "10.0.0.2/31 belongs to t2-r1 eth3 -- eth0 t1-r2 "
+            "but is shared by t1-r1 eth0, t2-r1 eth3",
+        ),
+        ValidationIssue(
+            "duplicate_ip",
+            "t1-r2",
+            "10.0.0.0/31 belongs to t2-r1 eth2 -- eth0 t1-r1 "
+            "but is shared by t1-r2 eth0, t2-r1 eth2",
+        ),
+    ]
+
+
+def test_subnet_allocated_to_two_links_is_reported(small_fabric):
+    model = small_fabric()
+    model.links.add("t2-r1", 0, "t1-r1", 2, subnet_index=0)
+
+    issues = FabricValidator(model).validate_model()
+    assert (
+        ValidationIssue(
+            "duplicate_ip", "t2-r1", "10.0.0.0/31 is allocated to more than one link"
+        )
+        in issues
+    )
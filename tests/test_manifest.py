@@ -0,0 +1,39 @@
+import io
+import os
+from contextlib import redirect_stdout
+
+import pytest
+
+from models.clos import TwoTierClos
+from render.manifest import RenderManifest
+
+
+def generate(model: TwoTierClos, output_dir: str, jobs: int = 1) -> RenderManifest:
+    manifest = RenderManifest(output_dir)
+    with redirect_stdout(io.StringIO()):
+        model.render(output_dir=output_dir, jobs=jobs, manifest=manifest)
+    return manifest
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_unchanged_configs_are_not_rewritten(tmp_path, jobs, small_fabric):
+    output_dir = str(tmp_path)
+    first = generate(small_fabric(), output_dir, jobs=jobs)
+    assert sorted(first.changed_devices) == ["t1-r1", "t1-r2", "t2-r1", "t2-r2"]
+
+    assert generate(small_fabric(), output_dir, jobs=jobs).changed_devices == []
+
+    model = small_fabric(external_networks={"192.168.1.0/24": ["t1-r2"]})
+    assert generate(model, output_dir, jobs=jobs).changed_devices == ["t1-r2"]
+
+
+def test_edited_config_is_rewritten(tmp_path, small_fabric):
+    output_dir = str(tmp_path)
+    generate(small_fabric(), output_dir)
+    path = os.path.join(output_dir, "t2-r1_frr.conf")
+    with open(path, "a") as f:
+        f.write("! edited by hand\n")
+
+    assert generate(small_fabric(), output_dir).changed_devices == ["t2-r1"]
+    with open(path, "r") as f:
+        assert "edited by hand" not in f.read()
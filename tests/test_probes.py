@@ -0,0 +1,136 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from deploy.fake_docker import FakeDockerClient
+from deploy.probes import (
+    ConvergenceProbe,
+    ConvergenceTimeout,
+    expected_counts_from_config,
+    expected_neighbor_counts,
+)
+from models.clos import TwoTierClos
+
+
+def ospf_neighbors(*states):
+    return {
+        "neighbors": {
+            f"10.0.0.{index}": [{"state": state, "retransmitCounter": 0}]
+            for index, state in enumerate(states)
+        }
+    }
+
+
+def bgp_summary(*states):
+    return {
+        "ipv4Unicast": {
+            "peers": {
+                f"172.16.0.{index}": {"state": state}
+                for index, state in enumerate(states)
+            }
+        }
+    }
+
+
+@pytest.fixture
+def container():
+    return FakeDockerClient().add_router("t2-r1")
+
+
+def probe(**kwargs) -> ConvergenceProbe:
+    return ConvergenceProbe(
+        timeout=0.05, initial_interval=0.01, max_interval=0.01, **kwargs
+    )
+
+
+def test_device_without_bgp_peers_converges(container):
+    container.responses["show ip ospf neighbor json"] = ospf_neighbors("Full/-")
+    container.responses["show bgp summary json"] = {}
+    with redirect_stdout(io.StringIO()):
+        probe().wait_for_convergence(router="t2-r1", container=container)
+
+
+def ospf_areas(**flags):
+    return {
+        "routerId": "172.16.0.2",
+        "areas": {"0.0.0.0": {"areaIfTotalCounter": 4, **flags}},
+    }
+
+
+def test_startup_max_metric_must_clear(container):
+    container.responses["show ip ospf neighbor json"] = ospf_neighbors("Full/-")
+    container.responses["show bgp summary json"] = bgp_summary("Established")
+    container.responses["show ip ospf json"] = ospf_areas(
+        originStubMaxDistRouterLsa=True
+    )
+    with pytest.raises(ConvergenceTimeout):
+        probe().wait_for_convergence(router="t2-r1", container=container)
+
+    # A drained device keeps its administrative max-metric, it does not block convergence
+    container.responses["show ip ospf json"] = ospf_areas(
+        originStubMaxDistRouterLsa=True, indefiniteActiveAdmin=True
+    )
+    with redirect_stdout(io.StringIO()):
+        probe().wait_for_convergence(router="t2-r1", container=container)
+
+    container.responses["show ip ospf json"] = ospf_areas()
+    with redirect_stdout(io.StringIO()):
+        probe().wait_for_convergence(router="t2-r1", container=container)
+
+
+def test_expected_counts_must_be_reached(container):
+    container.responses["show ip ospf neighbor json"] = ospf_neighbors("Full/-")
+    container.responses["show bgp summary json"] = bgp_summary("Established")
+    with pytest.raises(ConvergenceTimeout):
+        probe(expected_counts={"t2-r1": (1, 2)}).wait_for_convergence(
+            router="t2-r1", container=container
+        )
+
+
+def test_expected_counts_from_config():
+    config = "\n".join(
+        [
+            "interface eth0",
+            "  ip ospf network point-to-point",
+            "interface eth1",
+            "  ip ospf network point-to-point",
+            "router bgp 65000",
+            "  neighbor T1 peer-group",
+            "  neighbor T1 remote-as 65000",
+            "  bgp listen range 172.16.0.0/30 peer-group T1",
+            "  neighbor 172.16.0.8 peer-group T2",
+            "  neighbor eth1 interface peer-group T3",
+        ]
+    )
+    assert expected_counts_from_config(config) == (2, 2)
+
+
+def test_model_counts_take_precedence():
+    bgp_probe = probe(expected_counts={"t2-r1": (8, 8)})
+    bgp_probe.expect(router="t2-r1", counts=(1, 1))
+    bgp_probe.expect(router="t2-r2", counts=(1, 1))
+    assert bgp_probe.expected_counts == {"t2-r1": (8, 8), "t2-r2": (1, 1)}
+
+
+def test_non_reflector_expects_no_sessions():
+    with redirect_stdout(io.StringIO()):
+        model = TwoTierClos(
+            width=4,
+            device_interface_count=8,
+            internal_supernet="10.0.0.0/24",
+            loopback_supernet="172.16.0.0/24",
+            route_reflectors=2,
+        )
+    counts = expected_neighbor_counts(model)
+    assert counts["t2-r4"] == (4, 0)
+    assert counts["t2-r1"] == (4, 4)
+
+
+def test_drain_holds_after_flooding(container):
+    container.responses["show ip ospf neighbor json"] = ospf_neighbors("Full/-")
+    with redirect_stdout(io.StringIO()):
+        elapsed = probe(drain_hold=0.05).wait_for_drain(
+            router="t2-r1", container=container
+        )
+    assert elapsed >= 0.05
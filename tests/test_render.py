@@ -0,0 +1,75 @@
+import io
+import os
+from contextlib import redirect_stdout
+
+import pytest
+
+from render.frr_render import FrrRenderer, default_renderer
+
+
+HOSTNAMES = ["t1-r1", "t1-r2", "t2-r1", "t2-r2"]
+
+
+def render_to(model, output_dir: str, renderer: FrrRenderer, jobs: int = 1) -> dict:
+    os.makedirs(output_dir, exist_ok=True)
+    with redirect_stdout(io.StringIO()):
+        model.render(output_dir=output_dir, renderer=renderer, jobs=jobs)
+    files = {}
+    for filename in sorted(os.listdir(output_dir)):
+        with open(os.path.join(output_dir, filename), "r") as f:
+            files[filename] = f.read()
+    return files
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_template_dir_overrides_a_daemon_template_in_frr_conf(
+    tmp_path, small_fabric, jobs
+):
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir()
+    (template_dir / "bgpd.conf.j2").write_text(
+        "! custom bgpd for {{ device.hostname }} as {{ device.bgp.asn }}\n"
+    )
+    model = small_fabric()
+    renderer = FrrRenderer(template_dir=str(template_dir))
+
+    files = render_to(model, str(tmp_path / "output"), renderer, jobs=jobs)
+    assert sorted(files) == [f"{hostname}_frr.conf" for hostname in HOSTNAMES]
+    for device in model.devices:
+        config = files[f"{device.hostname}_frr.conf"]
+        assert config.endswith(f"\n! custom bgpd for {device.hostname} as 65000")
+        assert "router bgp" not in config
+        # Templates missing from template_dir fall back to the bundled ones
+        assert config.startswith(default_renderer().render("zebra", device))
+        assert "router ospf" in config
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize(
+    "parameters",
+    [
+        {},
+        {"bgp_peering": "dynamic", "route_reflectors": 1},
+        {"bgp_peering": "ebgp_unnumbered"},
+    ],
+    ids=["full_mesh", "dynamic", "ebgp_unnumbered"],
+)
+def test_split_configs_concatenate_to_the_single_pass_frr_conf(
+    tmp_path, small_fabric, parameters, jobs
+):
+    model = small_fabric(external_networks={"192.168.1.0/24": ["t1-r1"]}, **parameters)
+    single = render_to(model, str(tmp_path / "single"), FrrRenderer(), jobs=jobs)
+    split = render_to(
+        model, str(tmp_path / "split"), FrrRenderer(split_configs=True), jobs=jobs
+    )
+
+    assert len(split) == 4 * len(HOSTNAMES)
+    for hostname in HOSTNAMES:
+        daemons = [
+            split.pop(f"{hostname}_{daemon}.conf")
+            for daemon in ("zebra", "ospfd", "bgpd")
+        ]
+        frr_conf = single[f"{hostname}_frr.conf"]
+        assert "\n".join(daemons) == frr_conf
+        assert split.pop(f"{hostname}_frr.conf") == frr_conf
+    assert split == {}
@@ -0,0 +1,130 @@
+import pytest
+
+from deploy.fake_docker import FakeDockerClient
+from deploy.probes import ConvergenceTimeout
+from deploy.rollout import RolloutAborted, RolloutScheduler, plan_waves, router_pod
+from deploy.transport import DockerTransport
+from deploy_gns import deploy_config
+
+
+ROUTERS = [f"t1-p{pod}-r{leaf}" for pod in (1, 2) for leaf in (1, 2, 3)]
+
+
+class StubProbe:
+    """Converges after every restart, the wave check fails for the routers in unconverged"""
+
+    def __init__(self, unconverged=()) -> None:
+        self.unconverged = set(unconverged)
+        self.checked = []
+
+    def expect(self, router, counts) -> None:
+        pass
+
+    def wait_for_convergence(self, router, container, phase="routing") -> float:
+        if phase == "wave":
+            self.checked.append(router)
+            if router in self.unconverged:
+                raise ConvergenceTimeout(f"{router} did not converge")
+        return 0
+
+    def report(self) -> None:
+        pass
+
+
+def test_waves_respect_max_per_pod():
+    waves = plan_waves(routers=ROUTERS, wave_size="4", max_per_pod=1)
+    assert waves[0] == ["t1-p1-r1", "t1-p2-r1"]
+    assert all(len(wave) <= 2 for wave in waves)
+
+    waves = plan_waves(routers=ROUTERS, wave_size="4", max_per_pod=2)
+    assert waves[0] == ["t1-p1-r1", "t1-p1-r2", "t1-p2-r1", "t1-p2-r2"]
+
+
+def test_waves_rotate_over_pods():
+    routers = [f"t1-p{pod}-r{leaf}" for pod in (1, 2, 3) for leaf in (1, 2)]
+    assert plan_waves(routers=routers, wave_size="2", max_per_pod=1) == [
+        ["t1-p1-r1", "t1-p2-r1"],
+        ["t1-p1-r2", "t1-p3-r1"],
+        ["t1-p2-r2", "t1-p3-r2"],
+    ]
+
+
+def test_large_tier_is_planned_in_one_pass():
+    routers = [f"t1-p{pod}-r{leaf}" for pod in range(200) for leaf in range(100)]
+    waves = plan_waves(routers=routers, wave_size="1%", max_per_pod=1)
+
+    assert sorted(router for wave in waves for router in wave) == sorted(routers)
+    assert len(waves) == 100
+    for wave in waves:
+        assert len({router_pod(router) for router in wave}) == len(wave) == 200
+
+
+def test_full_tier_wave_is_rejected():
+    with pytest.raises(ValueError):
+        plan_waves(routers=["t1-r1", "t1-r2"], wave_size="100%", allow_full_tier=False)
+
+
+def test_scheduler_stops_when_a_wave_does_not_converge():
+    deployed = []
+    scheduler = RolloutScheduler(
+        waves=[["t1-r1"], ["t1-r2"]],
+        deploy_router=deployed.append,
+        convergence_gate=lambda wave: False,
+    )
+    with pytest.raises(RolloutAborted):
+        scheduler.run()
+    assert deployed == ["t1-r1"]
+
+
+def test_scheduler_stops_after_max_failures():
+    def deploy(router):
+        raise RuntimeError("unreachable")
+
+    scheduler = RolloutScheduler(
+        waves=[["t1-r1"], ["t1-r2"]], deploy_router=deploy, max_failures=0
+    )
+    with pytest.raises(RolloutAborted):
+        scheduler.run()
+    assert list(scheduler.failed) == ["t1-r1"]
+
+
+@pytest.fixture
+def fabric(tmp_path):
+    client = FakeDockerClient(routers=ROUTERS)
+    for router in ROUTERS:
+        (tmp_path / f"{router}_frr.conf").write_text(f"hostname {router}\n")
+    transport = DockerTransport(clients={"fake": client})
+    return client, transport, str(tmp_path)
+
+
+def test_wave_gate_probes_every_router(fabric):
+    client, transport, config_dir = fabric
+    probe = StubProbe()
+    deploy_config(
+        router_container_map=client.router_container_map,
+        transport=transport,
+        config_dir=config_dir,
+        wave_size="2",
+        max_per_pod=2,
+        probe=probe,
+    )
+    assert sorted(probe.checked) == sorted(ROUTERS)
+
+
+def test_unconverged_wave_aborts_before_next_wave(fabric):
+    client, transport, config_dir = fabric
+    probe = StubProbe(unconverged=["t1-p1-r1"])
+    with pytest.raises(RolloutAborted):
+        deploy_config(
+            router_container_map=client.router_container_map,
+            transport=transport,
+            config_dir=config_dir,
+            wave_size="2",
+            max_per_pod=2,
+            probe=probe,
+        )
+    assert probe.checked == ["t1-p1-r1", "t1-p1-r2"]
+    staged = [
+        router for router in ROUTERS if client.containers.get(f"fake-{router}").files
+    ]
+    assert staged == ["t1-p1-r1", "t1-p1-r2"]
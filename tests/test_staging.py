@@ -0,0 +1,84 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+from deploy.fake_docker import FakeContainer, FakeDockerClient, FakeExecResult
+from deploy.rollout import RolloutAborted
+from deploy.transport import DockerTransport
+from deploy_gns import ConfigStagingFailed, deploy_config, stage_frr_configs
+
+
+def stage(container: FakeContainer, initial_push: bool = False) -> None:
+    with redirect_stdout(io.StringIO()):
+        stage_frr_configs(
+            router="t1-r1",
+            frr_config=b"hostname t1-r1\n",
+            container_client=container,
+            initial_push=initial_push,
+        )
+
+
+def test_configs_are_staged_in_one_archive_and_moved_in_place():
+    container = FakeContainer(container_id="fake-t1-r1", name="t1-r1")
+    stage(container)
+
+    assert container.files == {"/tmp/closbuilder/frr.conf": b"hostname t1-r1\n"}
+    assert container.modes == {"/tmp/closbuilder/frr.conf": 0o640}
+    assert container.commands == [
+        [
+            "sh",
+            "-c",
+            "{ mv /etc/frr/frr.conf /etc/frr/frr.conf.backup || true; } && "
+            "mv /tmp/closbuilder/frr.conf /etc/frr/frr.conf && "
+            "chown frr:frr /etc/frr/frr.conf",
+        ]
+    ]
+
+
+def test_initial_push_also_stages_an_empty_vtysh_conf():
+    container = FakeContainer(container_id="fake-t1-r1", name="t1-r1")
+    stage(container, initial_push=True)
+
+    assert container.files == {
+        "/tmp/closbuilder/frr.conf": b"hostname t1-r1\n",
+        "/tmp/closbuilder/vtysh.conf": b"",
+    }
+    assert set(container.modes.values()) == {0o640}
+    command = container.commands[-1][-1]
+    assert command.startswith("{ mv /etc/frr/frr.conf /etc/frr/frr.conf.backup")
+    assert command.endswith(
+        "mv /tmp/closbuilder/vtysh.conf /etc/frr/vtysh.conf && "
+        "chown frr:frr /etc/frr/vtysh.conf"
+    )
+
+
+def test_failed_staging_command_is_reported():
+    container = FakeContainer(container_id="fake-t1-r1", name="t1-r1")
+    container.responses["chown frr:frr"] = FakeExecResult(1, b"mv: permission denied")
+
+    with pytest.raises(
+        ConfigStagingFailed, match="t1-r1 failed: mv: permission denied"
+    ):
+        stage(container)
+
+
+def test_failed_staging_fails_the_router_in_a_rollout(tmp_path):
+    client = FakeDockerClient(routers=["t1-r1", "t1-r2"])
+    for router in ("t1-r1", "t1-r2"):
+        (tmp_path / f"{router}_frr.conf").write_text(f"hostname {router}\n")
+    failing = client.containers.get("fake-t1-r1")
+    failing.responses["chown frr:frr"] = FakeExecResult(1, b"disk full")
+
+    output = io.StringIO()
+    with redirect_stdout(output), pytest.raises(RolloutAborted, match="t1-r1"):
+        deploy_config(
+            router_container_map=client.router_container_map,
+            transport=DockerTransport(clients={"fake": client}),
+            config_dir=str(tmp_path),
+        )
+    assert "Deployment to t1-r1 FAILED: Staging configs on t1-r1 failed: disk full" in (
+        output.getvalue()
+    )
+    # The restart is never issued after a failed staging
+    assert ["sh", "-c", "service frr restart"] not in failing.commands
@@ -0,0 +1,66 @@
+import io
+import os
+from contextlib import redirect_stdout
+
+import pytest
+
+from generate_configurations import build_model, parse_input_yaml
+from render.frr_render import build_render_context, default_renderer
+
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+
+def example(name: str, **overrides) -> dict:
+    network_details = parse_input_yaml(filename=os.path.join(EXAMPLES, name))
+    network_details.update(overrides)
+    return network_details
+
+
+def render_all(devices) -> dict:
+    renderer = default_renderer()
+    return {
+        device.hostname: renderer.render("frr", build_render_context(device))
+        for device in devices
+    }
+
+
+def build_both(network_details: dict):
+    with redirect_stdout(io.StringIO()):
+        model = build_model(network_details=dict(network_details))
+        streaming = build_model(network_details=dict(network_details), streaming=True)
+    return model, streaming
+
+
+@pytest.mark.parametrize(
+    "network_details",
+    [
+        example("TwoTierClos_8w.yaml"),
+        example("TwoTierClos_8w.yaml", bgp_peering="dynamic", route_reflectors=2),
+        example("TwoTierClos_8w.yaml", bgp_peering="ebgp_unnumbered"),
+        example(
+            "TwoTierClos_8w.yaml",
+            internal_supernet="10.0.0.0/24",
+            loopback_supernet="10.255.255.0/27",
+            reserved_internal_subnets=["10.0.0.8/30"],
+            reserved_loopbacks=["10.255.255.2/31"],
+        ),
+        example("ThreeTierClos_4p.yaml"),
+    ],
+    ids=["full_mesh", "dynamic", "ebgp_unnumbered", "reserved", "three_tier"],
+)
+def test_streaming_model_renders_like_its_in_memory_twin(network_details):
+    model, streaming = build_both(network_details)
+
+    assert streaming.device_count == model.device_count
+    assert streaming.connections == model.connections
+    assert streaming.unused_internal_subnets == model.unused_internal_subnets
+    assert streaming.unused_loopbacks == model.unused_loopbacks
+    assert render_all(streaming.devices) == render_all(model.devices)
+
+
+@pytest.mark.parametrize("name", ["TwoTierClos_8w.yaml", "ThreeTierClos_4p.yaml"])
+def test_streaming_edge_devices_match_in_memory_twin(name):
+    model, streaming = build_both(example(name))
+
+    assert render_all(streaming.edge_devices) == render_all(model.edge_devices)
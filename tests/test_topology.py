@@ -0,0 +1,113 @@
+import io
+import json
+import os
+from contextlib import redirect_stdout
+
+import pytest
+
+from deploy.topology import JsonStream, load_topology, read_topology
+from generate_configurations import build_model, parse_input_yaml
+from validation.validator import FabricValidator
+
+
+EXAMPLE = os.path.join(
+    os.path.dirname(__file__), "..", "examples", "TwoTierClos_8w.yaml"
+)
+
+
+@pytest.fixture(scope="module")
+def model():
+    with redirect_stdout(io.StringIO()):
+        return build_model(network_details=parse_input_yaml(filename=EXAMPLE))
+
+
+def gns_project(model, links=None) -> dict:
+    """A GNS3 project running every device of the model, cabled as the model by default"""
+    nodes = [
+        {
+            "compute_id": "vm" if index % 2 else "local",
+            "name": device.hostname,
+            "node_id": f"node-{device.hostname}",
+            "node_type": "docker",
+            "properties": {
+                "container_id": f"container-{device.hostname}",
+                "image": "frrouting/frr:v8.4.1",
+                "extra_hosts": "x" * 100,
+            },
+        }
+        for index, device in enumerate(model.devices)
+    ]
+    nodes.append({"name": "sw1", "node_id": "sw1", "node_type": "ethernet_switch"})
+    if links is None:
+        links = [
+            ((link.device_a, link.port_a), (link.device_b, link.port_b))
+            for link in model.links
+        ]
+    return {
+        "name": "lab",
+        "revision": 9,
+        "topology": {
+            "computes": [{"compute_id": "vm", "host": "10.0.0.4"}],
+            "drawings": [{"drawing_id": "1", "svg": "<svg>" + "y" * 500 + "</svg>"}],
+            "links": [
+                {
+                    "link_id": f"link-{index}",
+                    "nodes": [
+                        {"node_id": f"node-{name}", "adapter_number": port}
+                        for name, port in ends
+                    ],
+                }
+                for index, ends in enumerate(links)
+            ],
+            "nodes": nodes,
+        },
+        "type": "topology",
+        "version": "2.2.0",
+    }
+
+
+def write_project(tmp_path, project: dict) -> str:
+    path = tmp_path / "lab.gns3"
+    path.write_text(json.dumps(project, indent=4))
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "document",
+    ['{"a": [1, 2.5e3, -7], "b": {"c": "d\\"}"}, "e": []}', "[]", '{"n": 12345}'],
+)
+def test_json_stream_decodes_across_chunk_boundaries(document):
+    stream = JsonStream(io.StringIO(document), chunk_size=1)
+    assert stream.decode() == json.loads(document)
+
+
+def test_read_topology_with_one_character_chunks(tmp_path, model):
+    path = write_project(tmp_path, gns_project(model))
+    topology = read_topology(path, chunk_size=1)
+
+    assert topology.nodes == read_topology(path).nodes
+    assert topology.router_computes["t1-r2"] == "vm"
+    assert topology.compute_hosts == {"vm": "10.0.0.4"}
+    assert topology.peer("t1-r1", "eth0") == ("t2-r1", "eth16")
+    assert "sw1" not in topology.routers
+    assert len(topology.links) == len(model.links)
+
+
+def test_topology_cabled_as_the_model_passes(tmp_path, model):
+    topology = load_topology(write_project(tmp_path, gns_project(model)))
+    assert FabricValidator(model).check_topology(topology) == []
+
+
+def test_miswired_topology_is_reported(tmp_path, model):
+    links = [
+        ((link.device_a, link.port_a), (link.device_b, link.port_b))
+        for link in model.links
+    ]
+    # Swap the t1 ends of the first two links
+    (a0, b0), (a1, b1) = links[0], links[1]
+    links[0], links[1] = (a0, b1), (a1, b0)
+    topology = read_topology(write_project(tmp_path, gns_project(model, links)))
+
+    issues = FabricValidator(model).check_topology(topology)
+    assert issues
+    assert all(issue.check == "wiring" for issue in issues)
@@ -0,0 +1,37 @@
+import pytest
+
+from deploy.fake_docker import FakeDockerClient
+from deploy.transport import DockerTransport
+
+
+def fabric(router_computes):
+    daemons = {
+        "tcp://10.0.0.1:2375": FakeDockerClient(),
+        "tcp://10.0.0.2:2375": FakeDockerClient(),
+    }
+    transport = DockerTransport.from_urls(
+        docker_clients=list(daemons),
+        router_computes=router_computes,
+        compute_hosts={"local": "10.0.0.1", "vm": "10.0.0.2", "other": "10.0.0.3"},
+        client_factory=lambda url, pool_size: daemons[url],
+    )
+    return transport, daemons
+
+
+def test_routers_use_the_daemon_of_their_compute():
+    transport, _ = fabric({"t1-r1": "local", "t2-r1": "vm"})
+    assert transport.endpoint_for("t1-r1") == "tcp://10.0.0.1:2375"
+    assert transport.endpoint_for("t2-r1") == "tcp://10.0.0.2:2375"
+
+
+def test_unmatched_compute_only_fails_its_routers():
+    transport, daemons = fabric({"t1-r1": "local", "t1-r2": "other"})
+    with pytest.raises(ValueError, match="other"):
+        transport.endpoint_for("t1-r2")
+
+    container = daemons["tcp://10.0.0.1:2375"].add_router("t1-r1")
+    handles, failed = transport.connect(
+        router_container_map={"t1-r1": container.id, "t1-r2": "fake-t1-r2"}
+    )
+    assert list(handles) == ["t1-r1"]
+    assert failed == ["t1-r2"]
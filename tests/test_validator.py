@@ -0,0 +1,125 @@
+import io
+import os
+from contextlib import redirect_stdout
+
+import pytest
+
+from render.archive import ConfigArchive, ConfigBundle
+from validation.validator import FabricValidator, ValidationIssue
+
+
+def edit_config(config_dir: str, hostname: str, old: str, new: str) -> None:
+    path = os.path.join(config_dir, f"{hostname}_frr.conf")
+    with open(path, "r") as f:
+        config = f.read()
+    assert old in config
+    with open(path, "w") as f:
+        f.write(config.replace(old, new))
+
+
+def test_built_model_has_no_issues(small_fabric):
+    assert FabricValidator(small_fabric()).validate_model() == []
+
+
+def test_duplicate_address_is_reported(small_fabric):
+    model = small_fabric()
+    t2_r2 = model.devices[3]
+    t2_r2.interfaces[2].ip_address = "10.0.0.1/31"
+
+    assert FabricValidator(model).validate_model() == [
+        ValidationIssue(
+            "duplicate_ip", "t2-r2", "10.0.0.1 on eth2 is also assigned to t1-r1 eth0"
+        ),
+        ValidationIssue(
+            "duplicate_ip",
+            "t1-r1",
+            "10.0.0.0/31 is shared by t1-r1 eth0, t2-r1 eth2, t2-r2 eth2",
+        ),
+        ValidationIssue(
+            "ptp_mismatch",
+            "t2-r2",
+            "eth2 address 10.0.0.1/31 is not in link subnet 10.0.0.4/31",
+        ),
+    ]
+
+
+def test_asymmetric_peer_is_reported(small_fabric):
+    model = small_fabric()
+    t2_r1 = model.devices[2]
+    t2_r1.bgp.neighbors.remove({"ip_address": "172.16.0.0", "peer_group": "T1"})
+
+    assert FabricValidator(model).validate_model() == [
+        ValidationIssue(
+            "bgp_neighbor", "t1-r1", "t2-r1 does not peer back with 172.16.0.0"
+        ),
+    ]
+
+
+def test_missing_neighbor_is_reported(small_fabric):
+    model = small_fabric()
+    t1_r2 = model.devices[1]
+    t1_r2.bgp.neighbors.append({"ip_address": "172.16.0.9", "peer_group": "T2"})
+    t1_r2.bgp.neighbors.append({"ip_address": "172.16.0.1", "peer_group": "T3"})
+
+    assert FabricValidator(model).validate_model() == [
+        ValidationIssue(
+            "bgp_neighbor",
+            "t1-r2",
+            "neighbor 172.16.0.9 is not the loopback of any device",
+        ),
+        ValidationIssue("bgp_neighbor", "t1-r2", "peer group T3 is not defined"),
+        ValidationIssue(
+            "bgp_neighbor", "t1-r2", "neighbor 172.16.0.1 is its own loopback"
+        ),
+    ]
+
+
+@pytest.mark.parametrize("bundled", [False, True], ids=["directory", "archive"])
+def test_rendered_configs_are_compared_with_the_model(tmp_path, small_fabric, bundled):
+    model = small_fabric()
+    config_dir = str(tmp_path)
+    with redirect_stdout(io.StringIO()):
+        model.render(output_dir=config_dir)
+    assert FabricValidator(model).validate_configs(config_dir=config_dir) == []
+
+    # A duplicated address, a dropped and an unknown neighbor, and a missing file
+    edit_config(config_dir, "t1-r2", "ip address 10.0.0.3/31", "ip address 10.0.0.1/31")
+    edit_config(config_dir, "t1-r1", "  neighbor 172.16.0.3 peer-group T2\n", "")
+    edit_config(
+        config_dir,
+        "t2-r1",
+        "  neighbor 172.16.0.1 peer-group T1\n",
+        "  neighbor 172.16.0.1 peer-group T1\n  neighbor 172.16.0.9 peer-group T1\n",
+    )
+    os.remove(os.path.join(config_dir, "t2-r2_frr.conf"))
+
+    if bundled:
+        path = str(tmp_path / "configs.tar")
+        with ConfigArchive(path) as archive:
+            for filename in sorted(os.listdir(config_dir)):
+                if filename.endswith("_frr.conf"):
+                    with open(os.path.join(config_dir, filename), "r") as f:
+                        archive.add(filename, f.read())
+        with ConfigBundle(path) as bundle:
+            issues = FabricValidator(model).validate_configs(config_bundle=bundle)
+    else:
+        issues = FabricValidator(model).validate_configs(config_dir=config_dir)
+
+    assert issues == [
+        ValidationIssue(
+            "rendered_config",
+            "t1-r1",
+            "neighbor 172.16.0.3 in T2 is in the model but not configured",
+        ),
+        ValidationIssue(
+            "rendered_config",
+            "t1-r2",
+            "eth0 has address 10.0.0.1/31, the model expects 10.0.0.3/31",
+        ),
+        ValidationIssue(
+            "rendered_config",
+            "t2-r1",
+            "neighbor 172.16.0.9 in T1 is configured but not in the model",
+        ),
+        ValidationIssue("rendered_config", "t2-r2", "t2-r2_frr.conf is missing"),
+    ]
@@ -0,0 +1,494 @@
+import os
+from ipaddress import ip_address, ip_interface, ip_network
+from socket import AF_INET, AF_INET6, inet_pton
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from instrumentation.metrics import metrics, timed
+from models.links import Link
+from render.archive import ConfigBundle
+
+
+# (IP version, integer address, prefix length)
+Address = Tuple[int, int, int]
+
+
+def parse_address(text: str) -> Address:
+    """Parse "address/prefix" without building ipaddress objects, which dominate validation time"""
+    address, _, prefixlen = text.partition("/")
+    if ":" in address:
+        return (
+            6,
+            int.from_bytes(inet_pton(AF_INET6, address), "big"),
+            int(prefixlen or 128),
+        )
+
+    return 4, int.from_bytes(inet_pton(AF_INET, address), "big"), int(prefixlen or 32)
+
+
+def network_of(address: Address) -> int:
+    version, ip, prefixlen = address
+    host_bits = (32 if version == 4 else 128) - prefixlen
+    return ip >> host_bits << host_bits
+
+
+class ValidationIssue(NamedTuple):
+    """One problem found by a FabricValidator check"""
+
+    check: str
+    hostname: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"[{self.check}] {self.hostname}: {self.message}"
+
+
+class FabricValidator:
+    """This class statically checks a fabric model and its rendered configs before deployment
+    Addresses, loopbacks and BGP sessions are indexed in hash maps and subnets in a sorted interval list,
+    so every check is close to linear in the size of the fabric"""
+
+    def __init__(self, model) -> None:
+        self.model = model
+        self.devices = {device.hostname: device for device in model.devices}
+        self.loopbacks: Dict[str, str] = {
+            device.router_id: hostname for hostname, device in self.devices.items()
+        }
+        self.issues: List[ValidationIssue] = []
+
+    def add_issue(self, check: str, hostname: str, message: str) -> None:
+        self.issues.append(ValidationIssue(check, hostname, message))
+
+    @timed("validate.model")
+    def validate_model(self) -> List[ValidationIssue]:
+        self.index_addresses()
+        self.check_addresses()
+        self.check_links()
+        self.check_bgp_neighbors()
+        self.check_external_networks()
+
+        return self.issues
+
+    def index_addresses(self) -> None:
+        """Parse every interface address once into integers shared by the address and link checks"""
+        self.addresses: Dict[Tuple[str, str], Address] = {}
+        for hostname, device in self.devices.items():
+            for interface in device.allocated_interfaces:
+                if not interface.ip_address:
+                    continue
+                try:
+                    self.addresses[(hostname, interface.interface)] = parse_address(
+                        str(interface.ip_address)
+                    )
+                except (OSError, ValueError):
+                    self.add_issue(
+                        "invalid_ip",
+                        hostname,
+                        f"{interface.interface} has invalid address {interface.ip_address}",
+                    )
+
+    def link_for_network(self, version: int, network: int) -> Optional[Link]:
+        """Return the link a PTP subnet was allocated to, None for any other subnet"""
+        internal_subnets = self.model.internal_subnets
+        if version != internal_subnets.version:
+            return None
+        try:
+            position = internal_subnets.position_of(network)
+        except ValueError:
+            return None
+
+        return self.model.links.link_for_subnet(position)
+
+    def check_addresses(self) -> None:
+        """Every interface address is unique and no two subnets overlap
+        A /31 is shared by exactly the two ends of its link"""
+        owners: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        subnets: Dict[Tuple[int, int, int], List[Tuple[str, str]]] = {}
+        for name, address in self.addresses.items():
+            version, ip, prefixlen = address
+            owner = owners.setdefault((version, ip), name)
+            if owner != name:
+                self.add_issue(
+                    "duplicate_ip",
+                    name[0],
+                    f"{ip_address(ip)} on {name[1]} is also assigned to {' '.join(owner)}",
+                )
+            subnets.setdefault((version, network_of(address), prefixlen), []).append(
+                name
+            )
+
+        for (version, network, prefixlen), names in subnets.items():
+            if len(names) > 2 or (len(names) == 2 and prefixlen != 31):
+                self.add_issue(
+                    "duplicate_ip",
+                    names[0][0],
+                    f"{ip_address(network)}/{prefixlen} is shared by "
+                    f"{', '.join(' '.join(name) for name in names)}",
+                )
+            elif len(names) == 2:
+                link = self.link_for_network(version, network)
+                ends = link and {
+                    (link.device_a, f"eth{link.port_a}"),
+                    (link.device_b, f"eth{link.port_b}"),
+                }
+                if ends and set(names) != ends:
+                    self.add_issue(
+                        "duplicate_ip",
+                        names[0][0],
+                        f"{ip_address(network)}/{prefixlen} belongs to "
+                        f"{link.device_a} eth{link.port_a} -- eth{link.port_b} {link.device_b} "
+                        f"but is shared by {', '.join(' '.join(name) for name in names)}",
+                    )
+
+        # External networks may overlap each other but never an address used inside the fabric
+        intervals: List[Tuple[int, int, int, str]] = [
+            (network, network | (2 ** (32 - prefixlen) - 1), prefixlen, names[0][0])
+            for (version, network, prefixlen), names in subnets.items()
+            if version == 4
+        ]
+        for network in self.model.external_networks:
+            try:
+                subnet = ip_network(network, strict=False)
+            except ValueError:
+                continue
+            if subnet.version == 4:
+                intervals.append(
+                    (
+                        int(subnet.network_address),
+                        int(subnet.broadcast_address),
+                        subnet.prefixlen,
+                        "",
+                    )
+                )
+
+        intervals.sort()
+        furthest = None
+        for interval in intervals:
+            if furthest and interval[0] <= furthest[1] and (interval[3] or furthest[3]):
+                self.add_issue(
+                    "overlapping_subnets",
+                    interval[3] or furthest[3],
+                    f"{ip_address(interval[0])}/{interval[2]} overlaps "
+                    f"{ip_address(furthest[0])}/{furthest[2]}",
+                )
+            if furthest is None or interval[1] > furthest[1]:
+                furthest = interval
+
+    def check_links(self) -> None:
+        """Both ends of every link reference each other and sit in the link's /31
+        Interfaces with a PTP address but no link are reported as asymmetric"""
+        links = self.model.links
+        linked_ports: Set[Tuple[str, int]] = set()
+        for link in links:
+            device_a = self.devices.get(link.device_a)
+            device_b = self.devices.get(link.device_b)
+            if device_a is None or device_b is None:
+                missing = link.device_b if device_a else link.device_a
+                self.add_issue(
+                    "asymmetric_link", missing, "is linked but not part of the model"
+                )
+                continue
+
+            subnet = self.model.link_subnet(link)
+            network = int(subnet.network_address)
+            if links.link_for_subnet(link.subnet_index) != link:
+                self.add_issue(
+                    "duplicate_ip",
+                    link.device_a,
+                    f"{subnet} is allocated to more than one link",
+                )
+            ends = (
+                (device_a, link.port_a, device_b, link.port_b),
+                (device_b, link.port_b, device_a, link.port_a),
+            )
+            addresses = []
+            for device, port, peer, peer_port in ends:
+                linked_ports.add((device.hostname, port))
+                interface = device.interfaces[port]
+                if links.peer(device.hostname, port) != (peer.hostname, peer_port):
+                    self.add_issue(
+                        "asymmetric_link",
+                        device.hostname,
+                        f"eth{port} does not lead back to {peer.hostname} eth{peer_port}",
+                    )
+                expected = (
+                    f"{device.hostname} eth{port} -- eth{peer_port} {peer.hostname}"
+                )
+                if not interface.allocated or interface.description != expected:
+                    self.add_issue(
+                        "asymmetric_link",
+                        device.hostname,
+                        f"eth{port} is not configured towards {peer.hostname} eth{peer_port}",
+                    )
+
+                address = self.addresses.get((device.hostname, f"eth{port}"))
+                if (
+                    address is None
+                    or address[2] != 31
+                    or network_of(address) != network
+                ):
+                    self.add_issue(
+                        "ptp_mismatch",
+                        device.hostname,
+                        f"eth{port} address {interface.ip_address} is not in link subnet {subnet}",
+                    )
+                else:
+                    addresses.append(address[1])
+
+            if len(addresses) == 2 and addresses[0] == addresses[1]:
+                self.add_issue(
+                    "ptp_mismatch",
+                    link.device_a,
+                    f"both ends of {subnet} use {ip_address(addresses[0])}",
+                )
+
+        for hostname, device in self.devices.items():
+            for interface in device.allocated_interfaces:
+                if interface.interface == "lo" or not interface.ospf_enabled:
+                    continue
+                if (hostname, interface.port) not in linked_ports:
+                    self.add_issue(
+                        "asymmetric_link",
+                        hostname,
+                        f"{interface.interface} is configured but not linked to any device",
+                    )
+
+    def check_bgp_neighbors(self) -> None:
+        """Every neighbor is another device's loopback or a linked interface,
+        uses a peer group defined on the device and is reciprocated by the peer"""
+        sessions: Set[Tuple[str, str]] = set()
+        interface_sessions: Set[Tuple[str, str]] = set()
+        for hostname, device in self.devices.items():
+            for neighbor in device.bgp.neighbors:
+                if "interface" in neighbor:
+                    interface_sessions.add((hostname, neighbor["interface"]))
+                else:
+                    sessions.add((hostname, neighbor["ip_address"]))
+
+        for hostname, device in self.devices.items():
+            groups = {group.name for group in device.bgp.peer_groups}
+            for neighbor in device.bgp.neighbors:
+                if neighbor["peer_group"] not in groups:
+                    self.add_issue(
+                        "bgp_neighbor",
+                        hostname,
+                        f"peer group {neighbor['peer_group']} is not defined",
+                    )
+
+                if "interface" in neighbor:
+                    peer = self.model.peer_of(hostname, neighbor["interface"])
+                    if peer is None:
+                        self.add_issue(
+                            "bgp_neighbor",
+                            hostname,
+                            f"unnumbered neighbor {neighbor['interface']} is not a linked interface",
+                        )
+                    elif peer not in interface_sessions:
+                        self.add_issue(
+                            "bgp_neighbor",
+                            hostname,
+                            f"{peer[0]} does not peer back over {peer[1]}",
+                        )
+                    continue
+
+                address = neighbor["ip_address"]
+                peer = self.loopbacks.get(address)
+                if peer is None:
+                    self.add_issue(
+                        "bgp_neighbor",
+                        hostname,
+                        f"neighbor {address} is not the loopback of any device",
+                    )
+                elif peer == hostname:
+                    self.add_issue(
+                        "bgp_neighbor",
+                        hostname,
+                        f"neighbor {address} is its own loopback",
+                    )
+                elif (peer, device.router_id) not in sessions and not self.listens_for(
+                    peer, device.router_id
+                ):
+                    self.add_issue(
+                        "bgp_neighbor",
+                        hostname,
+                        f"{peer} does not peer back with {device.router_id}",
+                    )
+
+    def listens_for(self, hostname: str, address: str) -> bool:
+        """Return True if the device accepts dynamic neighbors from address"""
+        device = self.devices[hostname]
+        return any(
+            ip_interface(address).ip in ip_network(listen_range)
+            for group in device.bgp.peer_groups
+            for listen_range in group.listen_ranges
+        )
+
+    def check_external_networks(self) -> None:
+        """External networks are valid prefixes assigned to existing edge devices"""
+        edge_devices = {device.hostname for device in self.model.edge_devices}
+        for network, hostnames in self.model.external_networks.items():
+            try:
+                ip_network(network)
+            except ValueError as e:
+                self.add_issue("external_network", network, str(e))
+
+            for hostname in hostnames:
+                if hostname not in self.devices:
+                    self.add_issue(
+                        "external_network",
+                        hostname,
+                        f"{network} is assigned to a device that does not exist",
+                    )
+                elif hostname not in edge_devices:
+                    self.add_issue(
+                        "external_network",
+                        hostname,
+                        f"{network} is assigned to a device that is not an edge device",
+                    )
+
+    @timed("validate.topology")
+    def check_topology(self, topology) -> List[ValidationIssue]:
+        """Compare the routers and wiring of a GNS3 project with the model
+        Every device must run as an FRR node and every internal link must be cabled port to port"""
+        routers = topology.routers
+        for hostname in self.devices:
+            if hostname not in routers:
+                self.add_issue("wiring", hostname, "has no FRR node in GNS3")
+        for name in routers:
+            if name not in self.devices:
+                self.add_issue("wiring", name, "runs in GNS3 but is not in the model")
+        for interface in topology.conflicts:
+            self.add_issue("wiring", interface[0], f"{interface[1]} is cabled twice")
+
+        links = self.model.links
+        for link in links:
+            if link.device_a not in routers or link.device_b not in routers:
+                continue
+            end_a = (link.device_a, f"eth{link.port_a}")
+            end_b = (link.device_b, f"eth{link.port_b}")
+            cabled_a = topology.peer(*end_a)
+            cabled_b = topology.peer(*end_b)
+            if cabled_a == end_b and cabled_b == end_a:
+                continue
+            if cabled_a is None and cabled_b is None:
+                self.add_issue(
+                    "wiring",
+                    link.device_a,
+                    f"{end_a[1]} -- {end_b[1]} {end_b[0]} is not cabled in GNS3",
+                )
+                continue
+            for end, cabled, peer in (
+                (end_a, cabled_a, end_b),
+                (end_b, cabled_b, end_a),
+            ):
+                if cabled != peer:
+                    found = f"{cabled[0]} {cabled[1]}" if cabled else "nothing"
+                    self.add_issue(
+                        "wiring",
+                        end[0],
+                        f"{end[1]} is cabled to {found} instead of {peer[0]} {peer[1]}",
+                    )
+
+        # Cables between two devices on ports the model leaves unconnected
+        for end_a, end_b in topology.links:
+            if end_a[0] not in self.devices or end_b[0] not in self.devices:
+                continue
+            ports = [
+                int(interface[3:])
+                for _, interface in (end_a, end_b)
+                if interface.startswith("eth") and interface[3:].isdigit()
+            ]
+            if len(ports) == 2 and not (
+                links.peer(end_a[0], ports[0]) or links.peer(end_b[0], ports[1])
+            ):
+                self.add_issue(
+                    "wiring",
+                    end_a[0],
+                    f"{end_a[1]} -- {end_b[1]} {end_b[0]} is cabled but not in the model",
+                )
+
+        return self.issues
+
+    @timed("validate.configs")
+    def validate_configs(
+        self, config_dir: str = None, config_bundle: ConfigBundle = None
+    ) -> List[ValidationIssue]:
+        """Compare every rendered frr.conf with the model
+        Interface addresses and BGP neighbors must match exactly"""
+        for hostname, device in self.devices.items():
+            filename = f"{hostname}_frr.conf"
+            try:
+                if config_bundle:
+                    config = config_bundle.read(filename).decode("utf-8")
+                else:
+                    with open(os.path.join(config_dir, filename), "r") as f:
+                        config = f.read()
+            except (OSError, KeyError):
+                self.add_issue("rendered_config", hostname, f"{filename} is missing")
+                continue
+
+            addresses, neighbors = parse_rendered_config(config)
+            expected_addresses = {
+                interface.interface: str(interface.ip_address)
+                for interface in device.allocated_interfaces
+            }
+            for interface in sorted(addresses.keys() | expected_addresses.keys()):
+                if addresses.get(interface) != expected_addresses.get(interface):
+                    self.add_issue(
+                        "rendered_config",
+                        hostname,
+                        f"{interface} has address {addresses.get(interface)}, "
+                        f"the model expects {expected_addresses.get(interface)}",
+                    )
+
+            expected_neighbors = {
+                (
+                    neighbor.get("interface") or neighbor["ip_address"],
+                    neighbor["peer_group"],
+                )
+                for neighbor in device.bgp.neighbors
+            }
+            for neighbor, peer_group in sorted(neighbors - expected_neighbors):
+                self.add_issue(
+                    "rendered_config",
+                    hostname,
+                    f"neighbor {neighbor} in {peer_group} is configured but not in the model",
+                )
+            for neighbor, peer_group in sorted(expected_neighbors - neighbors):
+                self.add_issue(
+                    "rendered_config",
+                    hostname,
+                    f"neighbor {neighbor} in {peer_group} is in the model but not configured",
+                )
+
+        return self.issues
+
+    def report(self) -> None:
+        metrics.count("validation.issues", len(self.issues))
+        print()
+        print("#### Validation ####")
+        for issue in self.issues:
+            print(issue)
+        print(f"{len(self.issues)} issues found on {len(self.devices)} devices")
+        print()
+
+
+def parse_rendered_config(config: str) -> Tuple[Dict[str, str], Set[Tuple[str, str]]]:
+    """Extract interface addresses and BGP neighbor to peer group assignments from a frr.conf"""
+    addresses: Dict[str, str] = {}
+    neighbors: Set[Tuple[str, str]] = set()
+    interface = None
+    for line in config.splitlines():
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == "interface" and len(words) == 2:
+            interface = words[1]
+        elif words[:2] == ["ip", "address"] and interface:
+            addresses[interface] = words[2]
+        elif words[0] == "neighbor" and words[-2:-1] == ["peer-group"]:
+            # "neighbor <address> peer-group <group>" or "neighbor <if> interface peer-group <group>"
+            neighbors.add((words[1], words[-1]))
+        elif not line.startswith(" "):
+            interface = None
+
+    return addresses, neighbors